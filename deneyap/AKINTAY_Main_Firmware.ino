@@ -282,11 +282,69 @@ void parseSerialLine(const String& line) {
   }
 }
 
+// Binary command frame (sim/command_protocol.py), 8 bytes:
+// 0xA5, seq, surge, sway, heave, yaw (int8; CMD frames put SPEED in byte 2),
+// mode ('V' or F/L/R/S), CRC-8 (poly 0x07) over bytes 1..6.
+// ASCII lines are 7-bit, so 0xA5 always starts a frame.
+static const uint8_t FRAME_SYNC = 0xA5;
+static const int FRAME_LEN = 8;
+
+static uint8_t crc8(const uint8_t* data, int len) {
+  uint8_t c = 0;
+  for (int i = 0; i < len; i++) {
+    c ^= data[i];
+    for (int b = 0; b < 8; b++) c = (c & 0x80) ? (uint8_t)((c << 1) ^ 0x07) : (uint8_t)(c << 1);
+  }
+  return c;
+}
+
+static inline int clamp100(int v) {
+  return v < -100 ? -100 : (v > 100 ? 100 : v);
+}
+
+bool applyFrame(const uint8_t* f) {
+  if (crc8(f + 1, FRAME_LEN - 2) != f[FRAME_LEN - 1]) return false;
+  char mode = (char)f[6];
+  if (mode == 'V') {
+    velSurge = clamp100((int8_t)f[2]);
+    velSway  = clamp100((int8_t)f[3]);
+    velHeave = clamp100((int8_t)f[4]);
+    velYaw   = clamp100((int8_t)f[5]);
+  } else if (mode == 'F' || mode == 'L' || mode == 'R' || mode == 'S') {
+    int spd = (int8_t)f[2];
+    visionCmd = mode;
+    visionSpeed = spd < 0 ? 0 : (spd > 100 ? 100 : spd);
+  } else {
+    return false;
+  }
+  lastCmdMs = millis();
+  return true;
+}
+
 void readSerialNonBlocking() {
   static String buf;
+  static uint8_t frame[FRAME_LEN];
+  static int frameLen = 0;
   while (Serial.available() > 0) {
     char ch = (char)Serial.read();
-    if (ch == '\n' || ch == '\r') {
+    if (frameLen > 0) {
+      frame[frameLen++] = (uint8_t)ch;
+      if (frameLen < FRAME_LEN) continue;
+      frameLen = 0;
+      if (!applyFrame(frame)) {
+        // bad CRC: resync at the next sync byte inside the rejected frame
+        for (int i = 1; i < FRAME_LEN; i++) {
+          if (frame[i] == FRAME_SYNC) {
+            for (int j = i; j < FRAME_LEN; j++) frame[frameLen++] = frame[j];
+            break;
+          }
+        }
+      }
+      continue;
+    }
+    if ((uint8_t)ch == FRAME_SYNC) {
+      frame[frameLen++] = FRAME_SYNC;
+    } else if (ch == '\n' || ch == '\r') {
       if (buf.length() > 0) {
         parseSerialLine(buf);
         buf = "";
@@ -1,59 +1,510 @@
-from picamera2 import Picamera2
-import serial
+"""Raspberry Pi camera operator: PHOTO/VIDEO commands from the Deneyap/ESP32 over serial.
+
+Usage:
+  python3 serial_cam_operator.py [--port /dev/ttyUSB0] [--baud 115200] [--out media] [--keep_h264]
+  python3 serial_cam_operator.py --pretrigger 10 [--ring_mb 48] [--burst 5] [--fps 30]
+
+The serial reader blocks in select() (or in a timed read where the port has no
+file descriptor) and never spins. Commands go to worker threads so none
+of them holds up the next line:
+  camera  PHOTO grabs a frame (capture_request), VIDEO starts/stops the H.264 encoder
+  files   JPEG save of grabbed frames (hands the camera buffer back when done)
+  remux   ffmpeg remux to mp4 and h264 cleanup; seconds per video, so photos
+          never queue behind it
+
+Every job is logged when queued and when finished (queue wait and run time) and
+acknowledged on the serial line (`PHOTO_OK <file>`, `VIDEO_OK START`,
+`VIDEO_OK <file.mp4>`, `*_ERR <reason>`; --no_ack turns that off).
+`STATUS` prints queue depths and job counts.
+
+--pretrigger N keeps the H.264 encoder running from start-up into an in-memory
+ring of the last N seconds (trimmed to whole GOPs, capped at --ring_mb).
+VIDEO then writes the ring from its oldest keyframe and keeps appending, so the
+file starts N s before the button press. PHOTO decodes the last --burst frames
+before the trigger from the same ring (ffmpeg on the file worker) instead of
+a separate capture. Memory stays under 2 x --ring_mb: the ring plus the
+backlog of frames waiting for the disk during a recording (frames beyond it
+are dropped and counted).
+"""
+import argparse
+import itertools
+import os
+import queue
+import select
 import subprocess
+import threading
 import time
+from collections import deque
 
-camera = Picamera2()
-camera.start()
-time.sleep(1)
+import serial
+
+try:
+    from picamera2.outputs import Output
+except ImportError:
+    Output = object  # picamera2 only exists on the Pi; RingOutput just needs the encoder-facing methods
 
-ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
 
-recording = False
-video_filename_h264 = ""
-video_filename_mp4 = ""
+class Job:
+    _ids = itertools.count(1)
 
-try:
-    print("Deneyap'tan komut bekleniyor...")
+    def __init__(self, name, fn, args):
+        self.id = next(Job._ids)
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.state = "sırada"
+        self.t_queued = time.monotonic()
+        self.seconds = 0.0
+        self.error = None
+
+
+class Worker(threading.Thread):
+    """Runs submitted jobs one at a time in submit order; the caller never waits for them."""
+
+    def __init__(self, name, status):
+        super().__init__(name=name, daemon=True)
+        self.jobs = queue.Queue()
+        self.status = status
+
+    def submit(self, name, fn, *args):
+        job = Job(name, fn, args)
+        self.status.queued(self, job)
+        self.jobs.put(job)
+        return job
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            job.state = "çalışıyor"
+            t0 = time.monotonic()
+            try:
+                job.fn(*job.args)
+                job.state = "bitti"
+            except Exception as e:
+                job.state = "hata"
+                job.error = e
+            job.seconds = time.monotonic() - t0
+            self.status.finished(self, job)
+            self.jobs.task_done()
+
+    def stop(self):
+        """Finish what is queued, then exit."""
+        self.jobs.put(None)
+        self.join()
+
+
+class Status:
+    """Job log and counters, shared by the workers."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+        self.workers = []
 
+    def queued(self, worker, job):
+        print(f"[{worker.name} #{job.id}] {job.name} sırada ({worker.jobs.qsize()} bekliyor)", flush=True)
+
+    def finished(self, worker, job):
+        with self.lock:
+            if job.error is None:
+                self.done += 1
+            else:
+                self.failed += 1
+        wait = time.monotonic() - job.t_queued - job.seconds
+        msg = f"[{worker.name} #{job.id}] {job.name} {job.state} {job.seconds:.2f} s (sırada {wait:.2f} s)"
+        if job.error is not None:
+            msg += f": {job.error}"
+        print(msg, flush=True)
+
+    def summary(self):
+        depth = "  ".join(f"{w.name} {w.jobs.qsize()}" for w in self.workers)
+        return f"Durum: kuyruk {depth}  bitti {self.done}  hata {self.failed}"
+
+
+def read_lines(ser, timeout=1.0):
+    """Yields complete lines; between them the thread sleeps in select() (or a timed read)."""
+    buf = bytearray()
+    try:
+        ser.fileno()
+        selectable = True
+    except Exception:
+        selectable = False  # e.g. Windows: rely on the port's read timeout instead
     while True:
-        if ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8').strip()
-            print(f"Gelen komut: {line}")
-
-            if line == "PHOTO":
-                timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-                filename = f"photo_{timestamp}.jpg"
-                camera.capture_file(filename)
-                print(f"📸 Fotoğraf çekildi: {filename}")
-
-            elif line == "VIDEO":
-                timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-                if not recording:
-                    video_filename_h264 = f"video_{timestamp}.h264"
-                    video_filename_mp4 = f"video_{timestamp}.mp4"
-                    camera.start_recording(video_filename_h264)
-                    recording = True
-                    print("🎥 Video kaydı BAŞLADI")
+        if selectable and not select.select([ser], [], [], timeout)[0]:
+            continue
+        data = ser.read(ser.in_waiting or 1)
+        if not data:
+            continue
+        buf += data
+        while True:
+            i = buf.find(b"\n")
+            if i < 0:
+                break
+            line = buf[:i].decode("utf-8", errors="ignore").strip()
+            del buf[:i + 1]
+            if line:
+                yield line
+        if len(buf) > 256:
+            buf.clear()  # no newline in sight: noise on the line
+
+
+class EncodedRing:
+    """At least the last `seconds` of encoded frames (whole GOPs), never more than `max_bytes`.
+
+    The ring always starts at a keyframe. The oldest GOP goes once the next
+    one alone covers `seconds`, or whenever the byte cap is exceeded.
+    """
+
+    def __init__(self, seconds, max_bytes):
+        self.span = int(seconds * 1e6)  # µs, encoder timestamps
+        self.max_bytes = max_bytes
+        self.frames = deque()  # (timestamp µs, keyframe, bytes)
+        self.keys = deque()  # timestamps of the keyframes in `frames`
+        self.bytes = 0
+        self.trimmed = 0
+
+    def append(self, data, keyframe, t):
+        if not self.frames and not keyframe:
+            return  # nothing decodes before the first keyframe
+        self.frames.append((t, keyframe, data))
+        self.bytes += len(data)
+        if keyframe:
+            self.keys.append(t)
+        while self.frames and (self.bytes > self.max_bytes or (len(self.keys) > 1 and t - self.keys[1] >= self.span)):
+            self._drop_gop()
+
+    def _drop_gop(self):
+        # drop the oldest keyframe and the frames that depend on it
+        self.keys.popleft()
+        while True:
+            self.bytes -= len(self.frames.popleft()[2])
+            self.trimmed += 1
+            if not self.frames or self.frames[0][1]:
+                return
+
+    def snapshot(self, last=None):
+        """(frames from a keyframe to the newest, how many leading ones precede the last `last`)."""
+        frames = list(self.frames)
+        if last is None or last >= len(frames):
+            return frames, 0
+        k = len(frames) - last
+        while k > 0 and not frames[k][1]:
+            k -= 1
+        return frames[k:], len(frames) - last - k
+
+    def seconds(self):
+        return (self.frames[-1][0] - self.frames[0][0]) / 1e6 if self.frames else 0.0
+
+
+class FileRecording:
+    """Per-recording state shared by RingOutput and its writer thread.
+
+    Kept per recording so a writer still draining the previous file never
+    touches the byte count of the next one.
+    """
+
+    def __init__(self, backlog):
+        self.backlog = deque(backlog)  # ring contents at the trigger; popped as written
+        self.frames = deque()  # frames queued since; None ends the file
+        self.bytes = 0  # size of `frames`
+        self.ready = threading.Event()
+
+
+class RingOutput(Output):
+    """Picamera2 encoder output: feeds an EncodedRing; while recording also streams frames to a file.
+
+    The encoder thread only appends under a lock. The file is written by a
+    thread of its own: first the ring contents, then the frames queued since.
+    """
+
+    def __init__(self, seconds, max_bytes, fps=30):
+        super().__init__()
+        self.ring = EncodedRing(seconds, max_bytes)
+        self.max_bytes = max_bytes
+        self.fps = fps
+        self.lock = threading.Lock()
+        self.rec = None  # FileRecording while recording
+        self.dropped = 0
+        self.writer = None
+        self.t_frame = 0
+
+    @property
+    def recording_file(self):
+        return self.writer is not None
+
+    def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+        data = bytes(frame)  # the encoder reuses its buffer
+        if timestamp is None:
+            self.t_frame += int(1e6 / self.fps)
+            timestamp = self.t_frame
+        with self.lock:
+            self.ring.append(data, keyframe, timestamp)
+            rec = self.rec
+            if rec is not None:
+                if rec.bytes + len(data) > self.max_bytes:
+                    self.dropped += 1  # the disk has fallen too far behind
                 else:
-                    camera.stop_recording()
-                    recording = False
-                    print("⏹️ Video kaydı DURDU, mp4'e dönüştürülüyor...")
-                    subprocess.run([
-                        "ffmpeg", "-y", "-i", video_filename_h264,
-                        "-c:v", "copy", video_filename_mp4
-                    ])
-                    print(f"✅ MP4 oluşturuldu: {video_filename_mp4}")
-
-except KeyboardInterrupt:
-    if recording:
-        camera.stop_recording()
-        subprocess.run([
-            "ffmpeg", "-y", "-i", video_filename_h264,
-            "-c:v", "copy", video_filename_mp4
-        ])
-        print(f"Acil çıkışta MP4 oluşturuldu: {video_filename_mp4}")
-
-    camera.close()
-    ser.close()
-    print("Program sonlandırıldı.")
+                    rec.frames.append(data)
+                    rec.bytes += len(data)
+                    rec.ready.set()
+
+    def snapshot(self, last=None):
+        with self.lock:
+            return self.ring.snapshot(last)
+
+    def start_file(self, path):
+        with self.lock:
+            rec = self.rec = FileRecording(f[2] for f in self.ring.frames)
+        self.writer = threading.Thread(target=self._write_file, args=(path, rec), daemon=True)
+        self.writer.start()
+
+    def stop_file(self):
+        """Stops appending; returns the writer thread (join it before using the file)."""
+        writer = self.writer
+        with self.lock:
+            self.rec.frames.append(None)
+            self.rec.ready.set()
+            self.rec = None
+        self.writer = None
+        return writer
+
+    def _write_file(self, path, rec):
+        with open(path, "wb") as f:
+            # pop as we go so frames the ring has since dropped are freed
+            while rec.backlog:
+                f.write(rec.backlog.popleft())
+            while True:
+                rec.ready.wait()
+                with self.lock:
+                    chunk = list(rec.frames)
+                    rec.frames.clear()
+                    rec.bytes -= sum(len(d) for d in chunk if d is not None)
+                    rec.ready.clear()
+                for data in chunk:
+                    if data is None:
+                        return
+                    f.write(data)
+
+    def summary(self):
+        with self.lock:
+            return (f"halka {self.ring.seconds():.1f} s {self.ring.bytes / 1e6:.1f} MB ({len(self.ring.frames)} kare)  "
+                    f"kırpılan {self.ring.trimmed}  düşen {self.dropped}")
+
+
+class CameraOperator:
+    """PHOTO/VIDEO handling; camera work runs on `camera_worker`, disk work on `file_worker`/`remux_worker`."""
+
+    def __init__(self, camera, ser, out_dir=".", keep_h264=False, ack=True, bitrate=10000000, ring=None, burst=5):
+        self.camera = camera
+        self.ser = ser
+        self.out_dir = out_dir
+        self.keep_h264 = keep_h264
+        self.ack_enabled = ack
+        self.bitrate = bitrate
+        self.ser_lock = threading.Lock()
+        self.status = Status()
+        self.camera_worker = Worker("kamera", self.status)
+        self.file_worker = Worker("dosya", self.status)
+        self.remux_worker = Worker("remux", self.status)
+        self.status.workers = [self.camera_worker, self.file_worker, self.remux_worker]
+        for w in self.status.workers:
+            w.start()
+        self.encoder = None  # set while recording (or for good with a ring)
+        self.video_h264 = ""
+        self.ring = ring  # RingOutput: pre-trigger mode
+        self.burst = burst
+
+    def start_ring(self):
+        """Pre-trigger mode: run the encoder into the ring from now on."""
+        from picamera2.encoders import H264Encoder
+        # a keyframe (with SPS/PPS) every second, so a flushed ring or a burst decodes on its own
+        self.encoder = H264Encoder(bitrate=self.bitrate, repeat=True, iperiod=self.ring.fps)
+        self.camera.start_encoder(self.encoder, self.ring)
+
+    def ack(self, text):
+        if not self.ack_enabled:
+            return
+        with self.ser_lock:
+            try:
+                self.ser.write((text + "\n").encode("utf-8"))
+            except Exception:
+                pass
+
+    def _path(self, prefix, ext):
+        # milliseconds too: queued commands can now land in the same second
+        now = time.time()
+        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        return os.path.join(self.out_dir, f"{prefix}_{timestamp}.{ext}")
+
+    def handle(self, line):
+        """Dispatch one command line; returns immediately."""
+        if line == "PHOTO":
+            self.camera_worker.submit("PHOTO", self._photo)
+        elif line == "VIDEO":
+            self.camera_worker.submit("VIDEO", self._video_toggle)
+        elif line == "STATUS":
+            print(self.status.summary(), flush=True)
+            if self.ring is not None:
+                print(self.ring.summary(), flush=True)
+
+    # camera worker
+
+    def _photo(self):
+        if self.ring is not None:
+            frames, skip = self.ring.snapshot(self.burst)
+            if not frames:
+                self.ack("PHOTO_ERR ring empty")
+                raise RuntimeError("halka boş")
+            self.file_worker.submit("burst jpg", self._save_burst, frames, skip, self._path("photo", "jpg"))
+            return
+        filename = self._path("photo", "jpg")
+        try:
+            request = self.camera.capture_request()
+        except Exception as e:
+            self.ack(f"PHOTO_ERR {e}")
+            raise
+        self.file_worker.submit("jpg kaydet", self._save_photo, request, filename)
+
+    def _video_toggle(self):
+        if self.ring is not None:
+            if self.ring.recording_file:
+                self.stop_video()
+                return
+            self.video_h264 = self._path("video", "h264")
+            self.ring.start_file(self.video_h264)
+            print(f"🎥 Video kaydı BAŞLADI (son {self.ring.ring.seconds():.1f} s dahil)", flush=True)
+            self.ack("VIDEO_OK START")
+            return
+        if self.encoder is None:
+            from picamera2.encoders import H264Encoder
+            self.video_h264 = self._path("video", "h264")
+            self.encoder = H264Encoder(bitrate=self.bitrate)
+            try:
+                self.camera.start_encoder(self.encoder, self.video_h264)
+            except Exception as e:
+                self.encoder = None
+                self.ack(f"VIDEO_ERR {e}")
+                raise
+            print("🎥 Video kaydı BAŞLADI", flush=True)
+            self.ack("VIDEO_OK START")
+        else:
+            self.stop_video()
+
+    def stop_video(self):
+        writer = None
+        if self.ring is not None:
+            if not self.ring.recording_file:
+                return
+            writer = self.ring.stop_file()
+        elif self.encoder is None:
+            return
+        else:
+            self.camera.stop_encoder()
+            self.encoder = None
+        print("⏹️ Video kaydı DURDU, mp4'e dönüştürülüyor...", flush=True)
+        self.remux_worker.submit("mp4 remux", self._remux, self.video_h264, writer)
+
+    # file and remux workers
+
+    def _save_photo(self, request, filename):
+        try:
+            request.save("main", filename)
+        except Exception as e:
+            self.ack(f"PHOTO_ERR {e}")
+            raise
+        finally:
+            request.release()  # give the buffer back to the camera
+        print(f"📸 Fotoğraf çekildi: {filename}", flush=True)
+        self.ack(f"PHOTO_OK {filename}")
+
+    def _save_burst(self, frames, skip, filename):
+        # decode from the keyframe, keep the frames after the first `skip`
+        pattern = filename[:-len(".jpg")] + "_%02d.jpg"
+        res = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "h264", "-i", "pipe:0",
+                              "-vf", f"select=gte(n\\,{skip})", "-vsync", "0", "-q:v", "2", pattern],
+                             input=b"".join(f[2] for f in frames), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if res.returncode != 0:
+            self.ack(f"PHOTO_ERR ffmpeg {res.returncode}")
+            raise RuntimeError(f"ffmpeg çıkış kodu {res.returncode}: {res.stderr.decode(errors='ignore').strip()}")
+        n = len(frames) - skip
+        print(f"📸 {n} kare kaydedildi: {pattern}", flush=True)
+        self.ack(f"PHOTO_OK {pattern} {n}")
+
+    def _remux(self, h264, writer=None):
+        if writer is not None:
+            writer.join()  # the ring's file writer still flushing
+        mp4 = h264[:-len(".h264")] + ".mp4"
+        res = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", h264, "-c:v", "copy", mp4],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if res.returncode != 0:
+            self.ack(f"VIDEO_ERR ffmpeg {res.returncode}")
+            raise RuntimeError(f"ffmpeg çıkış kodu {res.returncode}: {res.stderr.decode(errors='ignore').strip()}")
+        if not self.keep_h264:
+            os.remove(h264)
+        print(f"✅ MP4 oluşturuldu: {mp4}", flush=True)
+        self.ack(f"VIDEO_OK {mp4}")
+
+    def close(self):
+        """Stop a running recording and let the queued jobs (remux included) finish."""
+        self.camera_worker.stop()
+        self.stop_video()
+        if self.ring is not None and self.encoder is not None:
+            self.camera.stop_encoder()
+            self.encoder = None
+        self.file_worker.stop()
+        self.remux_worker.stop()
+        print(self.status.summary(), flush=True)
+        if self.ring is not None:
+            print(self.ring.summary(), flush=True)
+
+
+def main():
+    p = argparse.ArgumentParser(description="AKINTAY RPi camera operator (PHOTO/VIDEO over serial)")
+    p.add_argument("--port", default="/dev/ttyUSB0", help="Serial port from the Deneyap/ESP32")
+    p.add_argument("--baud", type=int, default=115200)
+    p.add_argument("--out", default=".", help="Directory for photos and videos")
+    p.add_argument("--keep_h264", action="store_true", help="Keep the .h264 file after the mp4 remux")
+    p.add_argument("--bitrate", type=int, default=10000000, help="H.264 bitrate (bit/s)")
+    p.add_argument("--no_ack", action="store_true", help="Do not write PHOTO_OK/VIDEO_OK/*_ERR back on the serial line")
+    p.add_argument("--pretrigger", type=float, default=0.0,
+                   help="Keep the last N seconds encoded in memory; VIDEO starts that far back, PHOTO reads from it (0 = off)")
+    p.add_argument("--ring_mb", type=float, default=48.0, help="Ring memory cap in MB (the disk backlog gets the same cap)")
+    p.add_argument("--burst", type=int, default=5, help="--pretrigger: frames saved per PHOTO (the last ones before it)")
+    p.add_argument("--fps", type=int, default=30, help="--pretrigger: camera frame rate (keyframe interval)")
+    args = p.parse_args()
+
+    from picamera2 import Picamera2
+
+    os.makedirs(args.out, exist_ok=True)
+    camera = Picamera2()
+    camera.start()
+    time.sleep(1)
+
+    ser = serial.Serial(args.port, args.baud, timeout=1)
+    ring = None
+    if args.pretrigger > 0:
+        ring = RingOutput(args.pretrigger, int(args.ring_mb * 1e6), args.fps)
+    operator = CameraOperator(camera, ser, args.out, args.keep_h264, not args.no_ack, args.bitrate, ring, args.burst)
+    if ring is not None:
+        camera.set_controls({"FrameRate": args.fps})
+        operator.start_ring()
+
+    try:
+        print("Deneyap'tan komut bekleniyor...")
+        for line in read_lines(ser):
+            print(f"Gelen komut: {line}", flush=True)
+            operator.handle(line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        operator.close()
+        camera.close()
+        ser.close()
+        print("Program sonlandırıldı.")
+
+
+if __name__ == "__main__":
+    main()
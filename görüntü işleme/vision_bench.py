@@ -0,0 +1,241 @@
+"""Offline benchmark for the vision_control detection pipeline.
+
+Usage:
+  python vision_bench.py kayit.avi --out base.json
+  python vision_bench.py kareler/ --scale 0.5 --refine 16 --out half.json
+  python vision_bench.py --compare base.json half.json
+  python vision_bench.py kayit.avi --detectors contour,external,blob --out h2h.json
+
+Runs vision_control's own `detect` on every frame of a video file, an image
+directory (sorted by name) or a single image. Serial output is stubbed: the
+decided commands go through the same change-or-keepalive `CommandOutput` on
+the media timeline (frame index / fps) and are recorded instead of written.
+
+The JSON result holds the config, the summary (end-to-end fps, per-stage
+mean/p50/p95/max ms and share of the total), every command line that would
+have been sent, and one record per frame: index, name, media time, cmd, cx and
+stage ms. Decoding is timed separately and is not part of the pipeline fps.
+With --detectors every frame goes through each detector (the order rotates per
+frame) and the file holds {"runs": [...]}; each run is compared to the first.
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from vision_control import DETECTORS, STAGES, CommandOutput, detect
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+
+class RecordingSerial:
+    """Stands in for serial.Serial: keeps what would have been written, with the media time."""
+
+    def __init__(self):
+        self.lines = []
+        self.now = 0.0
+
+    def write(self, data):
+        self.lines.append((self.now, data.decode("ascii").strip()))
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def iter_frames(source, fps):
+    """Yield (name, t, frame) from a video file, an image directory or one image."""
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTS))
+        for i, name in enumerate(names):
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield name, i / fps, frame
+        return
+    if source.lower().endswith(IMAGE_EXTS):
+        frame = cv2.imread(source)
+        if frame is not None:
+            yield os.path.basename(source), 0.0, frame
+        return
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open {source}")
+    vfps = cap.get(cv2.CAP_PROP_FPS) or fps
+    i = 0
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield str(i), i / vfps, frame
+            i += 1
+    finally:
+        cap.release()
+
+
+def percentiles(ms):
+    ms = np.asarray(ms, dtype=float)
+    if not len(ms):
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    return {"mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)), "max_ms": float(ms.max())}
+
+
+class Run:
+    """One detector's pass over the frames: per-stage timings, decisions and the recorded sends."""
+
+    def __init__(self, detector, args):
+        self.detector = detector
+        self.fn = DETECTORS[detector]
+        self.args = args
+        self.ser = RecordingSerial()
+        self.out = CommandOutput(self.ser, args.speed, None, None, args.keepalive_ms)
+        self.frames = []
+        self.stage_ms = {name: [] for name in STAGES}
+        self.total_ms = []
+
+    def step(self, k, name, t, frame):
+        args = self.args
+        times = {}
+        t0 = time.perf_counter()
+        cmd, cx = detect(frame, args.center_tol, args.scale, args.refine, times, self.fn)
+        dt = (time.perf_counter() - t0) * 1000.0
+        self.ser.now = t
+        self.out.update(cmd, t)
+        rec = {"i": k, "name": name, "t": round(t, 4), "cmd": cmd,
+               "cx": None if cx is None else round(float(cx), 2), "ms": round(dt, 3),
+               "stages": {s: round(v * 1000.0, 3) for s, v in times.items()}}
+        self.frames.append(rec)
+        if k >= args.warmup:
+            self.total_ms.append(dt)
+            for s in STAGES:
+                self.stage_ms[s].append(times.get(s, 0.0) * 1000.0)
+        return rec
+
+    def result(self, decode):
+        frames = self.frames
+        total = sum(self.total_ms)
+        stages = {}
+        for s in STAGES:
+            if any(self.stage_ms[s]):
+                stages[s] = percentiles(self.stage_ms[s])
+                stages[s]["share_pct"] = 100.0 * sum(self.stage_ms[s]) / total if total else 0.0
+        counts = {c: sum(f["cmd"] == c for f in frames) for c in "FLRS"}
+        summary = {
+            "frames": len(frames), "timed_frames": len(self.total_ms),
+            "fps": 1000.0 * len(self.total_ms) / total if total else 0.0,
+            "pipeline": percentiles(self.total_ms), "decode": percentiles(decode), "cmd_counts": counts,
+            "sends": len(self.ser.lines), "cmd_changes": sum(a["cmd"] != b["cmd"] for a, b in zip(frames, frames[1:])),
+        }
+        config = {k: getattr(self.args, k)
+                  for k in ("source", "scale", "refine", "center_tol", "speed", "keepalive_ms", "warmup")}
+        config["detector"] = self.detector
+        return {"config": config, "summary": summary, "stages": stages,
+                "commands": [{"t": round(t, 4), "line": line} for t, line in self.ser.lines], "frames": frames}
+
+
+def run(args, detectors):
+    """Feed every frame to each detector in turn (order rotated per frame); returns one result per detector."""
+    runs = [Run(d, args) for d in detectors]
+    decode = []
+    t_read = time.perf_counter()
+    for k, (name, t, frame) in enumerate(iter_frames(args.source, args.fps)):
+        if args.max_frames and k >= args.max_frames:
+            break
+        decode.append((time.perf_counter() - t_read) * 1000.0)
+        r = k % len(runs)
+        for run_ in runs[r:] + runs[:r]:
+            rec = run_.step(k, name, t, frame)
+            if args.verbose:
+                print(f"{k:6d} {name:>12} {run_.detector:>8} {rec['cmd']} cx {rec['cx']} {rec['ms']:7.2f} ms")
+        t_read = time.perf_counter()
+    return [run_.result(decode) for run_ in runs]
+
+
+def print_result(res):
+    s = res["summary"]
+    print(f"{res['config']['source']}: {s['frames']} frames, detector {res['config']['detector']}, "
+          f"scale {res['config']['scale']}, refine {res['config']['refine']}")
+    print(f"pipeline {s['fps']:.1f} fps  mean {s['pipeline']['mean_ms']:.2f} p95 {s['pipeline']['p95_ms']:.2f} ms  "
+          f"(decode mean {s['decode']['mean_ms']:.2f} ms, not included)")
+    print(f"{'stage':<13} {'mean':>7} {'p50':>7} {'p95':>7} {'max':>7} {'share':>6}")
+    for name, st in res["stages"].items():
+        print(f"{name:<13} {st['mean_ms']:>7.3f} {st['p50_ms']:>7.3f} {st['p95_ms']:>7.3f} {st['max_ms']:>7.3f} "
+              f"{st['share_pct']:>5.1f}%")
+    c = s["cmd_counts"]
+    print(f"commands: F {c['F']} L {c['L']} R {c['R']} S {c['S']}  changes {s['cmd_changes']}  sends {s['sends']}")
+
+
+def load_result(path):
+    """A result file holds one run, or several under "runs" (the first is taken)."""
+    with open(path, "r", encoding="utf-8") as f:
+        res = json.load(f)
+    return res["runs"][0] if "runs" in res else res
+
+
+def compare(a, b):
+    fa, fb = a["summary"]["fps"], b["summary"]["fps"]
+    print(f"fps {fa:.1f} -> {fb:.1f} ({fb / fa if fa else float('nan'):.2f}x)")
+    print(f"{'stage':<13} {'A mean':>8} {'B mean':>8} {'delta':>8}")
+    for name in STAGES:
+        ma = a["stages"].get(name, {}).get("mean_ms", 0.0)
+        mb = b["stages"].get(name, {}).get("mean_ms", 0.0)
+        if ma or mb:
+            print(f"{name:<13} {ma:>8.3f} {mb:>8.3f} {mb - ma:>+8.3f}")
+    n = min(len(a["frames"]), len(b["frames"]))
+    diff = [i for i in range(n) if a["frames"][i]["cmd"] != b["frames"][i]["cmd"]]
+    err = [abs(a["frames"][i]["cx"] - b["frames"][i]["cx"]) for i in range(n)
+           if a["frames"][i]["cx"] is not None and b["frames"][i]["cx"] is not None]
+    print(f"commands differ on {len(diff)}/{n} frames" + (f" (first: {diff[:10]})" if diff else ""))
+    if err:
+        print(f"cx |A-B| mean {np.mean(err):.2f} p95 {np.percentile(err, 95):.2f} max {max(err):.2f} px")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Offline vision_control pipeline benchmark (no serial/UDP)")
+    p.add_argument("source", nargs="?", help="Video file, image directory or image")
+    p.add_argument("--out", default=None, help="Write the result as JSON")
+    p.add_argument("--compare", nargs=2, metavar=("A", "B"), help="Compare two result files and exit")
+    p.add_argument("--detector", default="contour", choices=sorted(DETECTORS))
+    p.add_argument("--detectors", default=None,
+                   help="Head-to-head: comma-separated detectors run on the same frames (first is the reference)")
+    p.add_argument("--center_tol", type=int, default=50)
+    p.add_argument("--speed", type=int, default=60)
+    p.add_argument("--scale", type=float, default=1.0)
+    p.add_argument("--refine", type=int, default=0)
+    p.add_argument("--keepalive_ms", type=int, default=150)
+    p.add_argument("--fps", type=float, default=30.0, help="Frame rate for image sets (media timeline)")
+    p.add_argument("--max_frames", type=int, default=0, help="Stop after N frames (0 = all)")
+    p.add_argument("--warmup", type=int, default=5, help="Frames left out of the timing stats")
+    p.add_argument("--verbose", action="store_true", help="Print every frame")
+    args = p.parse_args()
+
+    if args.compare:
+        compare(load_result(args.compare[0]), load_result(args.compare[1]))
+        return
+    if not args.source:
+        p.error("source is required (or --compare A B)")
+    detectors = args.detectors.split(",") if args.detectors else [args.detector]
+    for d in detectors:
+        if d not in DETECTORS:
+            p.error(f"unknown detector {d!r} (choose from {', '.join(sorted(DETECTORS))})")
+    results = run(args, detectors)
+    if not results[0]["frames"]:
+        raise SystemExit(f"No frames in {args.source}")
+    for res in results:
+        print_result(res)
+        print()
+    for res in results[1:]:
+        print(f"--- {results[0]['config']['detector']} vs {res['config']['detector']}")
+        compare(results[0], res)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results[0] if len(results) == 1 else {"runs": results}, f, indent=1)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,482 @@
 import argparse
+import os
+import threading
 import time
 import sys
+from collections import deque
 
 import cv2
 import numpy as np
-import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sim"))
+from command_protocol import CommandEncoder, add_protocol_args  # noqa: E402
+from transport import open_transport  # noqa: E402
 
 
 def parse_args():
     p = argparse.ArgumentParser(description="AKINTAY Vision → ESP32 command sender")
-    p.add_argument("--port", default="COM3", help="Serial port (e.g., COM3 or /dev/ttyUSB0)")
+    p.add_argument("--port", default="COM3",
+                   help="Serial port (e.g., COM3 or /dev/ttyUSB0), or udp:HOST:PORT, pty:PATH, emu (ESP32 emulator), none")
     p.add_argument("--baud", type=int, default=115200, help="Baud rate")
     p.add_argument("--speed", type=int, default=60, help="Command speed 0..100")
     p.add_argument("--cam", type=int, default=0, help="OpenCV camera index")
+    p.add_argument("--video", default=None, help="Read frames from this video file instead of the camera")
+    p.add_argument("--shm", default=None,
+                   help="Read frames from a shared-memory camera ring (sim/rov_pool_3d.py --camera ...), e.g. akintay_cam")
+    p.add_argument("--no_serial", action="store_true", help="Same as --port none (UDP-only, e.g. closed loop with the sim)")
     p.add_argument("--center_tol", type=int, default=50, help="Pixel tolerance around image center")
     p.add_argument("--show", action="store_true", help="Show camera frames")
     p.add_argument("--udp", action="store_true", help="Also send commands via UDP (simulator)")
     p.add_argument("--udp_host", default="127.0.0.1", help="UDP host for simulator")
     p.add_argument("--udp_port", type=int, default=5005, help="UDP port for simulator")
-    return p.parse_args()
+    p.add_argument("--pipeline", action="store_true",
+                   help="Run capture, processing and command sending in separate threads (freshest frame wins)")
+    p.add_argument("--keepalive_ms", type=int, default=150, help="Re-send the current command at least this often")
+    p.add_argument("--stats", type=float, default=0.0, help="Print per-stage stats every N seconds (0 = only at exit)")
+    p.add_argument("--detector", default=None, choices=sorted(DETECTORS),
+                   help="Target detector: contour (Canny edges, original), external (mask outer contours), "
+                        "blob (mask connected components). Default: blob with --shm, else contour")
+    p.add_argument("--scale", type=float, default=1.0,
+                   help="Process a downscaled copy (e.g. 0.5); centroid and --center_tol stay in full-res pixels")
+    p.add_argument("--refine", type=int, default=0,
+                   help="With --scale < 1: re-locate the centroid at full res in the target box grown by N px")
+    p.add_argument("--bench_scales", default=None,
+                   help="Benchmark detection at these scales (e.g. 1,0.5,0.25) on --bench_frames frames and exit")
+    p.add_argument("--bench_frames", type=int, default=300, help="Frames to read for --bench_scales")
+    add_protocol_args(p)
+    args = p.parse_args()
+    if args.detector is None:
+        # the sim's dark markers on a dark floor give Canny nothing to close; the mask detectors find them
+        args.detector = "blob" if args.shm else "contour"
+    return args
+
+
+STAGES = ("resize", "cvtColor", "inRange", "blur", "Canny", "morphology", "findContours", "components", "moments")
+LOWER_BLACK = np.array([0, 0, 0])
+UPPER_BLACK = np.array([180, 255, 50])
+
+
+class StageClock:
+    """Adds the time since the previous lap to `times[stage]` (s); a no-op when `times` is None."""
+
+    def __init__(self, times):
+        self.times = times
+        self.t = time.perf_counter() if times is not None else 0.0
+
+    def __call__(self, stage):
+        if self.times is None:
+            return
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0.0) + (now - self.t)
+        self.t = now
+
+
+def find_target(frame, times=None):
+    """Largest dark contour in `frame`: (cx, cy, (x, y, w, h)) in frame pixels, or None.
+
+    Pass a dict as `times` to accumulate per-stage seconds (see STAGES).
+    """
+    lap = StageClock(times)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    lap("cvtColor")
+    mask = cv2.inRange(hsv, LOWER_BLACK, UPPER_BLACK)
+    result = cv2.bitwise_and(frame, frame, mask=mask)
+    lap("inRange")
+    result = cv2.GaussianBlur(result, (5, 5), 0)
+    lap("blur")
+    edges = cv2.Canny(result, 50, 150)
+    lap("Canny")
+    edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+    lap("morphology")
+
+    contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    lap("findContours")
+
+    target = None
+    if contours:
+        largest = max(contours, key=cv2.contourArea)
+        M = cv2.moments(largest)
+        if M["m00"] != 0:
+            target = M["m10"] / M["m00"], M["m01"] / M["m00"], cv2.boundingRect(largest)
+    lap("moments")
+    return target
+
+
+def find_target_external(frame, times=None):
+    """Like find_target, but outer contours of the threshold mask itself (no blur/Canny/closing, no hierarchy)."""
+    lap = StageClock(times)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    lap("cvtColor")
+    mask = cv2.inRange(hsv, LOWER_BLACK, UPPER_BLACK)
+    lap("inRange")
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    lap("findContours")
+
+    target = None
+    if contours:
+        largest = max(contours, key=cv2.contourArea)
+        M = cv2.moments(largest)
+        if M["m00"] != 0:
+            target = M["m10"] / M["m00"], M["m01"] / M["m00"], cv2.boundingRect(largest)
+    lap("moments")
+    return target
+
+
+def find_target_blob(frame, times=None):
+    """Largest 8-connected blob of the threshold mask; area, box and centroid come from one labelling pass."""
+    lap = StageClock(times)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    lap("cvtColor")
+    mask = cv2.inRange(hsv, LOWER_BLACK, UPPER_BLACK)
+    lap("inRange")
+    n, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    lap("components")
+
+    target = None
+    if n > 1:
+        k = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))  # label 0 is the background
+        x, y, w, h = (int(v) for v in stats[k, :4])
+        target = float(centroids[k][0]), float(centroids[k][1]), (x, y, w, h)
+    lap("moments")
+    return target
+
+
+DETECTORS = {
+    "contour": find_target,  # original edge chain
+    "external": find_target_external,
+    "blob": find_target_blob,
+}
+
+
+def locate(frame, scale=1.0, refine=0, times=None, detector=find_target):
+    """Target x-centroid in full-resolution pixels (float), or None.
+
+    With scale < 1 the pipeline runs on a downscaled copy and the centroid is
+    mapped back; refine > 0 re-runs it at full resolution inside the target's
+    bounding box grown by `refine` pixels. `detector` is one of DETECTORS.
+    """
+    if scale >= 1.0:
+        target = detector(frame, times)
+        return None if target is None else target[0]
+    lap = StageClock(times)
+    small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    lap("resize")
+    target = detector(small, times)
+    if target is None:
+        return None
+    # pixel centres: full = (small + 0.5) / scale - 0.5
+    cx = (target[0] + 0.5) / scale - 0.5
+    if refine > 0:
+        x, y, w, h = target[2]
+        fh, fw = frame.shape[:2]
+        x0 = max(0, int(x / scale) - refine)
+        y0 = max(0, int(y / scale) - refine)
+        x1 = min(fw, int((x + w) / scale) + refine)
+        y1 = min(fh, int((y + h) / scale) + refine)
+        fine = detector(frame[y0:y1, x0:x1], times)
+        if fine is not None:
+            cx = x0 + fine[0]
+    return cx
+
+
+def decide(cx, width, center_tol):
+    """F/L/R from the target x (full-resolution pixels), S if there is no target."""
+    if cx is None:
+        return 'S'
+    cx = int(cx)
+    frame_center = width // 2
+    if cx < frame_center - center_tol:
+        return 'L'
+    if cx > frame_center + center_tol:
+        return 'R'
+    return 'F'
+
+
+def detect(frame, center_tol, scale=1.0, refine=0, times=None, detector=find_target):
+    """Dark-target pipeline: returns (cmd, cx) with cmd in F/L/R/S and cx the target x (None if not found)."""
+    cx = locate(frame, scale, refine, times, detector)
+    return decide(cx, frame.shape[1], center_tol), cx
+
+
+def bench_scales(frames, scales, center_tol, refine=0, detector=find_target):
+    """Per-scale detection fps and centroid error against full resolution; returns rows."""
+    ref = [locate(f, detector=detector) for f in frames]
+    rows = []
+    for scale in scales:
+        cxs = []
+        t0 = time.perf_counter()
+        for f in frames:
+            cxs.append(locate(f, scale, refine, detector=detector))
+        wall = time.perf_counter() - t0
+        err = np.array([abs(c - r) for c, r in zip(cxs, ref) if c is not None and r is not None])
+        same = sum(decide(c, f.shape[1], center_tol) == decide(r, f.shape[1], center_tol)
+                   for c, r, f in zip(cxs, ref, frames))
+        rows.append({
+            "scale": scale, "refine": refine, "frames": len(frames), "fps": len(frames) / max(wall, 1e-9),
+            "cx_err_mean": float(err.mean()) if len(err) else float("nan"),
+            "cx_err_p95": float(np.percentile(err, 95)) if len(err) else float("nan"),
+            "cx_err_max": float(err.max()) if len(err) else float("nan"),
+            "missed": sum(c is None and r is not None for c, r in zip(cxs, ref)),
+            "cmd_agree_pct": 100.0 * same / max(1, len(frames)),
+        })
+    return rows
+
+
+class CommandOutput:
+    """Serial (+ optional UDP) command writer: sends on change or when the keepalive expires."""
+
+    def __init__(self, ser, speed, udp_sock=None, udp_addr=None, keepalive_ms=150, encoder=None):
+        self.ser = ser
+        self.speed = max(0, min(100, int(speed)))
+        self.encoder = encoder or CommandEncoder("ascii")
+        self.udp_sock = udp_sock
+        self.udp_addr = udp_addr
+        self.keepalive = keepalive_ms / 1000.0
+        self.last_cmd = None
+        self.last_send = 0.0
+        self.sent = 0
+
+    def update(self, cmd, now=None):
+        """Send `cmd` if it changed or the keepalive is due; returns True if something was written."""
+        now = time.monotonic() if now is None else now
+        if cmd == self.last_cmd and (now - self.last_send) <= self.keepalive:
+            return False
+        self._write(f"CMD:{cmd};SPEED:{self.speed}")
+        self.last_cmd = cmd
+        self.last_send = now
+        self.sent += 1
+        return True
+
+    def stop(self):
+        self._write("CMD:S;SPEED:0")
+
+    def _write(self, line):
+        pkt = self.encoder.encode(line)
+        if self.ser is not None:
+            self.ser.write(pkt)
+        if self.udp_sock is not None:
+            self.udp_sock.sendto(pkt, self.udp_addr)
+
+
+class LatestSlot:
+    """Single-item mailbox: `put` replaces any unread item (counted as dropped), `get` waits for a newer one."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+        self.seq = 0
+        self.read_seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.cond:
+            if self.seq > self.read_seq:
+                self.dropped += 1
+            self.item = item
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        """Newest unread item, or None on timeout/close."""
+        with self.cond:
+            if self.seq == self.read_seq and not self.closed:
+                self.cond.wait(timeout)
+            if self.seq == self.read_seq:
+                return None
+            self.read_seq = self.seq
+            return self.item
 
+    def depth(self):
+        return 1 if self.seq > self.read_seq else 0
 
-def send_cmd(ser, cmd_char, speed):
-    speed = max(0, min(100, int(speed)))
-    msg = f"CMD:{cmd_char};SPEED:{speed}\n".encode("ascii")
-    ser.write(msg)
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.latency = deque(maxlen=1000)  # s
+
+    def add(self, latency):
+        self.count += 1
+        self.latency.append(latency)
+
+    def summary(self, elapsed):
+        lat = np.array(self.latency) * 1000.0 if self.latency else np.zeros(1)
+        return (f"{self.name:<9} {self.count / max(elapsed, 1e-9):6.1f}/s  latency mean {lat.mean():6.2f} "
+                f"p99 {np.percentile(lat, 99):6.2f} max {lat.max():6.2f} ms")
+
+
+class CaptureThread(threading.Thread):
+    """Reads the camera as fast as it delivers and keeps only the freshest frame."""
+
+    def __init__(self, cap, slot):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.slot = slot
+        self.stats = StageStats("capture")  # latency = time blocked in cap.read()
+        self.running = True
+        self.ok = True
+
+    def run(self):
+        while self.running:
+            t0 = time.monotonic()
+            ok, frame = self.cap.read()
+            t1 = time.monotonic()
+            if not ok:
+                self.ok = False
+                break
+            self.stats.add(t1 - t0)
+            self.slot.put((frame, t1))
+        self.slot.close()
+
+
+class SenderThread(threading.Thread):
+    """Writes the newest decision as soon as it changes, plus keepalives, independent of frame timing."""
+
+    def __init__(self, out, slot):
+        super().__init__(daemon=True)
+        self.out = out
+        self.slot = slot
+        self.stats = StageStats("send")  # latency = capture -> command written
+        self.running = True
+        self.cmd = 'S'
+        self.t_capture = None
+
+    def run(self):
+        while self.running:
+            item = self.slot.get(timeout=self.out.keepalive / 2)
+            if item is not None:
+                self.cmd, self.t_capture = item
+            now = time.monotonic()
+            if self.out.update(self.cmd, now) and item is not None:
+                self.stats.add(now - self.t_capture)
+
+
+def run_pipeline(args, cap, out):
+    frames = LatestSlot()
+    decisions = LatestSlot()
+    capture = CaptureThread(cap, frames)
+    sender = SenderThread(out, decisions)
+    process = StageStats("process")  # latency = capture -> decision
+    age = StageStats("age")  # frame age when processing starts
+    t_start = time.monotonic()
+    next_stats = args.stats
+
+    def report():
+        el = time.monotonic() - t_start
+        print("\n".join(s.summary(el) for s in (capture.stats, age, process, sender.stats)))
+        print(f"queues: frame depth {frames.depth()} dropped {frames.dropped}  "
+              f"command depth {decisions.depth()} superseded {decisions.dropped}  sent {out.sent}")
+
+    capture.start()
+    sender.start()
+    try:
+        while True:
+            item = frames.get(timeout=1.0)
+            if item is None:
+                if not capture.is_alive():
+                    break
+                continue
+            frame, t_cap = item
+            age.add(time.monotonic() - t_cap)
+            cmd, _ = detect(frame, args.center_tol, args.scale, args.refine, detector=DETECTORS[args.detector])
+            process.add(time.monotonic() - t_cap)
+            decisions.put((cmd, t_cap))
+
+            if args.show:
+                cv2.putText(frame, f"CMD:{cmd} SPEED:{args.speed}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                cv2.imshow("AKINTAY-CAM", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            if args.stats > 0 and time.monotonic() - t_start >= next_stats:
+                report()
+                next_stats += args.stats
+    finally:
+        capture.running = False
+        sender.running = False
+        capture.join(1.0)
+        sender.join(1.0)
+        report()
+
+
+def run_bench(args, cap):
+    frames = []
+    while len(frames) < args.bench_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        print("No frames to benchmark")
+        return
+    scales = [float(v) for v in args.bench_scales.split(",")]
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames {w}x{h}, detector {args.detector}, center_tol {args.center_tol}, refine {args.refine}")
+    print(f"{'scale':>6} {'fps':>8} {'err mean':>9} {'err p95':>8} {'err max':>8} {'missed':>7} {'cmd agree':>10}")
+    for r in bench_scales(frames, scales, args.center_tol, args.refine, DETECTORS[args.detector]):
+        print(f"{r['scale']:>6.3g} {r['fps']:>8.1f} {r['cx_err_mean']:>9.2f} {r['cx_err_p95']:>8.2f} "
+              f"{r['cx_err_max']:>8.2f} {r['missed']:>7} {r['cmd_agree_pct']:>9.1f}%")
+
+
+def open_source(args):
+    """Frame source: shared-memory ring, video file or camera (all expose read/isOpened/release)."""
+    if args.shm:
+        from shm_camera import ShmCapture
+        return ShmCapture(args.shm)
+    return cv2.VideoCapture(args.video if args.video else args.cam)
 
 
 def main():
     args = parse_args()
 
+    if args.bench_scales:
+        cap = open_source(args)
+        if not cap.isOpened():
+            print("Camera open failed")
+            sys.exit(2)
+        run_bench(args, cap)
+        return
+
     udp_sock = None
     if args.udp:
         import socket
         udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-    try:
-        ser = serial.Serial(args.port, args.baud, timeout=0.05)
-    except Exception as e:
-        print(f"Serial open failed: {e}")
-        sys.exit(1)
+    ser = None
+    if not args.no_serial:
+        try:
+            ser = open_transport(args.port, args.baud, timeout=0.05)
+        except Exception as e:
+            print(f"Serial open failed: {e}")
+            sys.exit(1)
 
-    cap = cv2.VideoCapture(args.cam)
+    cap = open_source(args)
     if not cap.isOpened():
         print("Camera open failed")
         sys.exit(2)
 
-    last_cmd = None
-    last_send_ms = 0
-    send_interval_ms = 150
-
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    out = CommandOutput(ser, args.speed, udp_sock, (args.udp_host, args.udp_port), args.keepalive_ms,
+                        CommandEncoder(args.protocol))
 
     try:
+        if args.pipeline:
+            run_pipeline(args, cap, out)
+            return
+
         while True:
             ok, frame = cap.read()
             if not ok:
                 break
 
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-            lower_black = np.array([0, 0, 0])
-            upper_black = np.array([180, 255, 50])
-            mask = cv2.inRange(hsv, lower_black, upper_black)
-            result = cv2.bitwise_and(frame, frame, mask=mask)
-            result = cv2.GaussianBlur(result, (5, 5), 0)
-            edges = cv2.Canny(result, 50, 150)
-            edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
-
-            contours, _ = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-            cmd = 'S'
-            if contours:
-                largest = max(contours, key=cv2.contourArea)
-                M = cv2.moments(largest)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    frame_center = frame.shape[1] // 2
-                    if cx < frame_center - args.center_tol:
-                        cmd = 'L'
-                    elif cx > frame_center + args.center_tol:
-                        cmd = 'R'
-                    else:
-                        cmd = 'F'
-
-            now_ms = int(time.time() * 1000)
-            if cmd != last_cmd or (now_ms - last_send_ms) > send_interval_ms:
-                send_cmd(ser, cmd, args.speed)
-                if udp_sock is not None:
-                    pkt = f"CMD:{cmd};SPEED:{args.speed}\n".encode("ascii")
-                    udp_sock.sendto(pkt, (args.udp_host, args.udp_port))
-                last_cmd = cmd
-                last_send_ms = now_ms
+            cmd, _ = detect(frame, args.center_tol, args.scale, args.refine, detector=DETECTORS[args.detector])
+            out.update(cmd)
 
             if args.show:
                 cv2.putText(frame, f"CMD:{cmd} SPEED:{args.speed}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
@@ -100,15 +486,17 @@ def main():
 
     finally:
         try:
-            send_cmd(ser, 'S', 0)
+            out.stop()
         except Exception:
             pass
+        if hasattr(cap, "report"):
+            print(cap.report())
         cap.release()
         cv2.destroyAllWindows()
-        ser.close()
+        if ser is not None:
+            print(ser.report())
+            ser.close()
 
 
 if __name__ == "__main__":
     main()
-
-
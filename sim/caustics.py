@@ -0,0 +1,49 @@
+"""Precomputed, looping water caustics.
+
+A short sequence of caustic light frames is generated once (sum of three
+travelling sine waves with a small domain warp, sharpened into bright ridges)
+for the upper part of the pool, faded with depth and tinted. Every time phase
+is an integer multiple of 2*pi/period so the sequence loops seamlessly.
+Per rendered frame only one saturating add of the current frame is done.
+"""
+import math
+
+import cv2
+import numpy as np
+
+
+class Caustics:
+    def __init__(self, width, height, frames=24, period=2.0, depth_frac=0.6, strength=70.0,
+                 tint=(220, 230, 255), scale=1.0):
+        self.width = width
+        self.height = height
+        self.period = float(period)
+        self.rows = max(1, int(height * depth_frac))
+        self.frames = self._build(max(1, frames), strength, tint, scale)
+
+    def _build(self, n, strength, tint, scale):
+        x = np.arange(self.width, dtype=np.float32)[None, :] / scale
+        y = np.arange(self.rows, dtype=np.float32)[:, None] / scale
+        # light fades out with depth (strongest just under the surface)
+        fade = np.clip(1.0 - y * scale / self.rows, 0.0, 1.0) ** 1.5
+        tint = np.array(tint, dtype=np.float32) / 255.0
+        out = np.empty((n, self.rows, self.width, 3), dtype=np.uint8)
+        for k in range(n):
+            t = 2.0 * math.pi * k / n
+            xw = x + 6.0 * np.sin(y * 0.035 + t)
+            yw = y + 6.0 * np.sin(x * 0.030 - t)
+            v = (np.sin(xw * 0.045 + yw * 0.020 + t)
+                 + np.sin(-xw * 0.025 + yw * 0.050 + 2.0 * t)
+                 + np.sin(xw * 0.060 - yw * 0.015 - t)) / 3.0
+            light = (1.0 - np.abs(v)) ** 8 * fade * strength
+            out[k] = np.clip(light[:, :, None] * tint, 0, 255).astype(np.uint8)
+        return out
+
+    def frame_index(self, t):
+        n = len(self.frames)
+        return int((t % self.period) / self.period * n) % n
+
+    def apply(self, img, t):
+        """Brighten `img` in place with the caustic frame for time `t` (seconds)."""
+        roi = img[:self.rows, :self.width]
+        cv2.add(roi, self.frames[self.frame_index(t)], dst=roi)
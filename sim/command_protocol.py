@@ -0,0 +1,202 @@
+"""Framed binary command protocol, carried alongside the ASCII CMD:/VEL: lines.
+
+Frame, 8 bytes:
+  0     0xA5 sync
+  1     seq (uint8, wraps)
+  2..5  surge, sway, heave, yaw (int8, -100..100); CMD frames put SPEED in byte 2
+  6     mode: 'V' (velocity) or the CMD letter 'F', 'L', 'R', 'S'
+  7     CRC-8 (poly 0x07, init 0) over bytes 1..6
+
+ASCII command lines are 7-bit, so a 0xA5 byte can only start a frame. Receivers
+tell the two apart byte by byte (serial) or by the first byte (UDP). A frame
+is 8 bytes against about 20 for `VEL:-100,20,0,-35\\n`, so the same UART carries
+about 2.5x the messages, and a corrupted frame fails its CRC instead of
+steering the vehicle.
+
+Decoded frames come back as the equivalent ASCII line plus an unwrapped
+sequence number, so the existing parsers and SEQ accounting apply to both.
+The frame seq is per session: an encoder starts at a random value, and
+receivers treat a sender that restarts its numbering as a new stream.
+"""
+import random
+import struct
+
+SYNC = 0xA5
+FRAME = struct.Struct("<BBbbbbBB")
+FRAME_SIZE = FRAME.size
+CMD_MODES = b"FLRS"
+PROTOCOLS = ("ascii", "binary")
+LINE_GUARD = 128  # same guard as the firmware's line buffer
+
+
+def _crc8_table():
+    table = []
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = ((c << 1) ^ 0x07) & 0xFF if c & 0x80 else (c << 1) & 0xFF
+        table.append(c)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    c = 0
+    for b in data:
+        c = CRC8_TABLE[c ^ b]
+    return c
+
+
+def _clamp(v, lo, hi):
+    return max(lo, min(hi, int(v)))
+
+
+def _frame(seq, a, mode):
+    body = FRAME.pack(SYNC, seq & 0xFF, *(_clamp(v, -100, 100) for v in a), mode, 0)[:FRAME_SIZE - 1]
+    return body + bytes((crc8(body[1:]),))
+
+
+def encode_vel(vel, seq=0):
+    return _frame(seq, vel, ord("V"))
+
+
+def encode_cmd(cmd, speed, seq=0):
+    return _frame(seq, (_clamp(speed, 0, 100), 0, 0, 0), ord(cmd[:1] or "S"))
+
+
+def parse_line(line):
+    """('V', [s, w, h, y]) or (letter, speed) from an ASCII command line, None if it is not one."""
+    first, _, rest = line.strip().partition(";")
+    if first.startswith("VEL:"):
+        parts = first[4:].split(",")
+        if len(parts) != 4:
+            return None
+        try:
+            return "V", [int(p) for p in parts]
+        except ValueError:
+            return None
+    if first.startswith("CMD:") and len(first) > 4:
+        speed = 0
+        for field in rest.split(";"):
+            if field.startswith("SPEED:"):
+                try:
+                    speed = int(field[6:])
+                except ValueError:
+                    pass
+        return first[4], speed
+    return None
+
+
+def encode_line(line, seq=0):
+    """Frame for an ASCII CMD/VEL line, or None (e.g. MODE: lines stay ASCII)."""
+    parsed = parse_line(line)
+    if parsed is None or (parsed[0] != "V" and parsed[0].encode("ascii", "replace") not in CMD_MODES):
+        return None
+    mode, value = parsed
+    return encode_vel(value, seq) if mode == "V" else encode_cmd(mode, value, seq)
+
+
+def decode_frame(frame):
+    """(ascii line, raw seq) from 8 frame bytes, or None on bad sync/CRC/mode."""
+    if len(frame) < FRAME_SIZE or frame[0] != SYNC or crc8(frame[1:FRAME_SIZE - 1]) != frame[FRAME_SIZE - 1]:
+        return None
+    _, seq, a0, a1, a2, a3, mode, _ = FRAME.unpack_from(frame)
+    if mode == ord("V"):
+        return f"VEL:{a0},{a1},{a2},{a3}", seq
+    if mode in CMD_MODES:
+        return f"CMD:{chr(mode)};SPEED:{max(0, a0)}", seq
+    return None
+
+
+class SeqUnwrap:
+    """Turns the 8-bit frame counter into an increasing integer (steps of up to +-127)."""
+
+    def __init__(self):
+        self.raw = None
+        self.value = 0
+
+    def __call__(self, raw):
+        if self.raw is not None:
+            d = (raw - self.raw) & 0xFF
+            self.value += d - 256 if d >= 128 else d
+        else:
+            self.value = raw
+        self.raw = raw
+        return self.value
+
+
+class StreamDecoder:
+    """Byte-stream receiver for mixed ASCII lines and frames (serial links).
+
+    `feed(data)` returns the complete commands as ASCII lines; frames carry
+    ';SEQ:<n>' with the unwrapped counter. A frame that fails the CRC counts as
+    bad and the search restarts at the next sync byte inside it.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()  # ASCII line in progress
+        self.pending = bytearray()  # frame bytes in progress (starts with SYNC)
+        self.unwrap = SeqUnwrap()
+        self.frames = 0
+        self.lines = 0
+        self.bad = 0
+
+    def feed(self, data):
+        out = []
+        for b in data:
+            if self.pending:
+                self.pending.append(b)
+                if len(self.pending) < FRAME_SIZE:
+                    continue
+                res = decode_frame(self.pending)
+                if res is not None:
+                    self.pending.clear()
+                    self.frames += 1
+                    out.append(f"{res[0]};SEQ:{self.unwrap(res[1])}")
+                    continue
+                self.bad += 1
+                # resync at the next sync byte inside the rejected frame; its other bytes are binary, not a line
+                rest = bytes(self.pending[1:])
+                self.pending.clear()
+                k = rest.find(SYNC)
+                if k >= 0:
+                    out.extend(self.feed(rest[k:]))
+                continue
+            if b == SYNC:
+                self.pending.append(b)
+            elif b in (10, 13):
+                if self.buf:
+                    self.lines += 1
+                    out.append(self.buf.decode("ascii", "replace"))
+                    self.buf.clear()
+            else:
+                self.buf.append(b)
+                if len(self.buf) > LINE_GUARD:
+                    self.buf.clear()
+                    self.bad += 1
+        return out
+
+
+class CommandEncoder:
+    """Sender side: turns CMD/VEL lines into bytes for the chosen protocol (frames carry a running seq)."""
+
+    def __init__(self, protocol="ascii", seq=None):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"protocol must be one of {PROTOCOLS}")
+        self.protocol = protocol
+        self.seq = random.randrange(256) if seq is None else seq  # per session, not a continuation of the last run
+
+    def encode(self, line):
+        if self.protocol == "binary":
+            frame = encode_line(line, self.seq)
+            if frame is not None:
+                self.seq += 1
+                return frame
+        return (line + "\n").encode("ascii")
+
+
+def add_protocol_args(parser):
+    parser.add_argument("--protocol", choices=PROTOCOLS, default="ascii",
+                        help="Command encoding: ascii lines or 8-byte binary frames with CRC")
@@ -0,0 +1,174 @@
+"""Shared UDP command receiver for the sims.
+
+A background thread waits on a non-blocking socket with `selectors`, drains
+every pending datagram in one go and keeps only the newest command together
+with its receive time. The sim loop calls `get_latest()` once per physics tick
+and gets each command at most once, so a burst of commands costs one
+actuation instead of being replayed over later ticks.
+
+Senders may append an optional `;SEQ:<n>` field (e.g. `VEL:60,0,0,0;SEQ:42`).
+It is stripped before the line is handed to the sim. With it, datagrams that
+arrive older than the newest seen from the same sender address are counted as
+reordered and ignored, and sequence gaps are counted as lost. A sender that
+goes quiet for more than `stream_timeout` s, or whose SEQ jumps back by more
+than RESTART_JUMP, is taken as restarted: its numbering starts over (counted
+as restarts) instead of everything it sends being dropped as reordered.
+
+A datagram that starts with the frame sync byte is a binary command frame
+(command_protocol.py). It is CRC-checked (failures counted as bad), turned
+back into the equivalent CMD/VEL line, and its 8-bit counter is unwrapped
+into the same SEQ accounting.
+"""
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from command_protocol import SYNC, SeqUnwrap, decode_frame
+
+RESTART_JUMP = 16  # a SEQ this far behind the newest is a new stream, not a late datagram
+
+
+def split_seq(line):
+    """Return (line without the SEQ field, seq or None)."""
+    if ";SEQ:" not in line:
+        return line, None
+    head, _, tail = line.rpartition(";SEQ:")
+    try:
+        return head, int(tail)
+    except ValueError:
+        return line, None
+
+
+class SeqStream:
+    """SEQ state of one sender address."""
+
+    def __init__(self):
+        self.last_seq = None
+        self.t_last = None
+        self.unwrap = SeqUnwrap()  # binary frames carry an 8-bit counter
+
+
+class UdpCommandServer(threading.Thread):
+    def __init__(self, host: str = "127.0.0.1", port: int = 5005, poll=0.1, rcvbuf=1 << 20, clock=time.perf_counter,
+                 stream_timeout=1.0):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.poll = poll  # s, select timeout so stop() is noticed
+        self.clock = clock
+        self.stream_timeout = stream_timeout  # s of silence after which a sender's SEQ may start over
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if rcvbuf:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            except OSError:
+                pass  # keep the OS default
+        self.sock.bind((self.host, self.port))
+        self.sock.setblocking(False)
+        self.sel = selectors.DefaultSelector()
+        self.sel.register(self.sock, selectors.EVENT_READ)
+        self.lock = threading.Lock()
+        self.running = True
+        self._latest = None  # (line, t_recv) not yet consumed
+        self._streams = {}  # sender address -> SeqStream
+        self.received = 0
+        self.delivered = 0
+        self.coalesced = 0  # superseded by a newer command before the sim read them
+        self.reordered = 0  # arrived with an older SEQ than already seen
+        self.lost = 0  # SEQ gaps
+        self.restarts = 0  # senders whose SEQ started over (idle gap or large backward jump)
+        self.frames = 0  # binary frames accepted
+        self.bad = 0  # binary frames failing sync/CRC/mode checks
+        self.max_batch = 0  # most datagrams drained in one wakeup
+        self.age = deque(maxlen=2000)  # s, receive -> get_latest
+
+    def run(self):
+        while self.running:
+            try:
+                events = self.sel.select(self.poll)
+            except (OSError, ValueError):
+                break  # socket closed by stop()
+            if events:
+                self._drain()
+
+    def _drain(self):
+        batch = 0
+        newest = None
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            t = self.clock()
+            batch += 1
+            stream = self._streams.get(addr)
+            if stream is None:
+                stream = self._streams[addr] = SeqStream()
+            elif stream.t_last is not None and t - stream.t_last > self.stream_timeout:
+                if stream.last_seq is not None:
+                    self.restarts += 1
+                stream = self._streams[addr] = SeqStream()
+            stream.t_last = t
+            if data[:1] == bytes((SYNC,)):
+                res = decode_frame(data)
+                if res is None:
+                    self.bad += 1
+                    continue
+                self.frames += 1
+                line, seq = res[0], stream.unwrap(res[1])
+            else:
+                line, seq = split_seq(data.decode("utf-8", errors="ignore").strip())
+            if seq is not None:
+                if stream.last_seq is not None:
+                    if seq <= stream.last_seq - RESTART_JUMP:
+                        self.restarts += 1
+                    elif seq <= stream.last_seq:
+                        self.reordered += 1
+                        continue
+                    else:
+                        self.lost += seq - stream.last_seq - 1
+                stream.last_seq = seq
+            if newest is not None:
+                self.coalesced += 1
+            newest = (line, t)
+        self.received += batch
+        self.max_batch = max(self.max_batch, batch)
+        if newest is not None:
+            with self.lock:
+                if self._latest is not None:
+                    self.coalesced += 1
+                self._latest = newest
+
+    def get_latest_stamped(self):
+        """Newest unread command as (line, receive time on `clock`), or None."""
+        with self.lock:
+            latest, self._latest = self._latest, None
+        if latest is not None:
+            self.delivered += 1
+            self.age.append(self.clock() - latest[1])
+        return latest
+
+    def get_latest(self):
+        latest = self.get_latest_stamped()
+        return None if latest is None else latest[0]
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sel.close()
+            self.sock.close()
+        except Exception:
+            pass
+
+    def report(self):
+        age = np.array(self.age) * 1000.0 if self.age else np.zeros(1)
+        return (f"commands: {self.received} rx  {self.delivered} applied  coalesced {self.coalesced}  "
+                f"reordered {self.reordered}  lost {self.lost}  restarts {self.restarts}  frames {self.frames}  bad {self.bad}  "
+                f"max batch {self.max_batch}  "
+                f"age p50 {np.percentile(age, 50):.3f} p99 {np.percentile(age, 99):.3f} max {age.max():.3f} ms")
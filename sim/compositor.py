@@ -0,0 +1,39 @@
+"""Layered frame compositor for the OpenCV sims.
+
+Static layers (background gradient, seabed, rocks, pool border, obstacle
+outlines, fixed HUD lines) are rendered once per frame size into a base image;
+each frame starts from one copy of that base and only the dynamic layers are
+drawn on top.
+"""
+import numpy as np
+
+
+class Compositor:
+    def __init__(self):
+        self.layers = []  # static layer callbacks: fn(img), drawn in order
+        self._base = None
+        self._size = None
+        self.renders = 0  # how many times the static base was rebuilt
+
+    def add_static(self, fn):
+        self.layers.append(fn)
+        self.invalidate()
+        return fn
+
+    def invalidate(self):
+        self._base = None
+
+    def base(self, width, height):
+        if self._base is None or self._size != (width, height):
+            img = np.zeros((height, width, 3), dtype=np.uint8)
+            for fn in self.layers:
+                fn(img)
+            self._base = img
+            self._size = (width, height)
+            self.renders += 1
+        return self._base
+
+    def frame(self, width, height):
+        """New frame to draw dynamic layers on: a copy of the cached static base."""
+        return self.base(width, height).copy()
+
@@ -0,0 +1,254 @@
+"""Shared ROV dynamics core with selectable integrators.
+
+Usage: python dynamics.py [--duration 30] [--dts 0.01,0.05,0.1,0.2,0.5]
+
+Model (all sims): first-order yaw, world-frame surge/sway with linear drag and
+a first-order vertical channel
+
+    yaw_rate' = yaw_input - yaw_drag * yaw_rate               heading' = yaw_rate
+    vel'      = R(heading) [fwd, sway] - lin_drag * vel         pos'     = vel
+    vdepth'   = heave + buoyancy_bias - depth_drag * vdepth     depth'   = vdepth
+
+Inputs are held constant over a step. Integrators:
+  euler          legacy update used by the sims so far (explicit drag, position
+                 from the updated velocity); needs small dt
+  semi_implicit  drag taken implicitly, unconditionally stable
+  exact          exponential (zero-order hold) discretization of the drag terms;
+                 thrust direction taken at the mid-step heading
+  rk4            classic Runge-Kutta on the full nonlinear system
+Any of them can be sub-stepped (`substeps=N`).
+
+States work either scalar (RovState) or struct-of-arrays (fleet2d.FleetState).
+Running this file benchmarks steps/s and position error against a fine RK4 reference.
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+
+class RovParams:
+    def __init__(self, max_acc=120.0, max_yaw=60.0, lin_drag=0.8, yaw_drag=1.0):
+        self.max_fwd_acc = float(max_acc)  # px/s^2 at speed=100 (surge)
+        self.max_yaw_rate = math.radians(float(max_yaw))  # rad/s at speed=100
+        self.lin_drag = float(lin_drag)  # per second (xy)
+        self.yaw_drag = float(yaw_drag)  # per second
+        self.sway_acc_ratio = 0.8  # sway slightly weaker than surge
+        self.heave_acc_ratio = 0.6  # vertical weaker
+        self.depth_drag = 0.8
+        self.buoyancy_bias = 0.0  # 0 neutral, >0 sinks, <0 floats
+
+
+class RovState:
+    def __init__(self, x=0.0, y=0.0):
+        self.pos = np.array([x, y], dtype=float)
+        self.vel = np.zeros(2, dtype=float)
+        self.heading = -math.pi / 2  # up
+        self.yaw_rate = 0.0
+        self.depth = 0.0  # positive down (m, abstract)
+        self.vdepth = 0.0
+
+
+INTEGRATORS = ("euler", "semi_implicit", "exact", "rk4")
+
+
+def _phi(k, dt):
+    """exp(-k dt), ∫e^{-ks}ds and its second integral over [0, dt], safe for k -> 0.
+
+    `k` may be an array (per-vehicle drag, e.g. in parameter sweeps).
+    """
+    if np.ndim(k):
+        small = k * dt < 1e-9
+        ks = np.where(small, 1.0, k)
+        e = np.exp(-ks * dt)
+        phi1 = (1.0 - e) / ks
+        return (np.where(small, 1.0 - k * dt, e), np.where(small, dt, phi1),
+                np.where(small, 0.5 * dt * dt, (dt - phi1) / ks))
+    if k * dt < 1e-9:
+        return 1.0 - k * dt, dt, 0.5 * dt * dt
+    e = math.exp(-k * dt)
+    phi1 = (1.0 - e) / k
+    return e, phi1, (dt - phi1) / k
+
+
+def _load(s):
+    return (s.heading, s.yaw_rate, s.pos[..., 0], s.pos[..., 1],
+            s.vel[..., 0], s.vel[..., 1], s.depth, s.vdepth)
+
+
+def _store(s, y):
+    h, w, px, py, vx, vy, d, vd = y
+    s.heading = h
+    s.yaw_rate = w
+    s.pos[..., 0] = px
+    s.pos[..., 1] = py
+    s.vel[..., 0] = vx
+    s.vel[..., 1] = vy
+    s.depth = d
+    s.vdepth = vd
+
+
+def _thrust(h, fwd, sway):
+    ch, sh = np.cos(h), np.sin(h)
+    # forward = (cos, sin), left = (-sin, cos)
+    return ch * fwd + (-sh) * sway, sh * fwd + ch * sway
+
+
+def _step_euler(y, p, u, dt):
+    h, w, px, py, vx, vy, d, vd = y
+    fwd, sway, heave, yaw_in = u
+    heave = heave + p.buoyancy_bias
+    w = w + (yaw_in - p.yaw_drag * w) * dt
+    h = h + w * dt
+    ax, ay = _thrust(h, fwd, sway)
+    vx = vx + (ax - p.lin_drag * vx) * dt
+    vy = vy + (ay - p.lin_drag * vy) * dt
+    px = px + vx * dt
+    py = py + vy * dt
+    vd = vd + (heave - p.depth_drag * vd) * dt
+    d = d + vd * dt
+    return h, w, px, py, vx, vy, d, vd
+
+
+def _step_semi_implicit(y, p, u, dt):
+    h, w, px, py, vx, vy, d, vd = y
+    fwd, sway, heave, yaw_in = u
+    heave = heave + p.buoyancy_bias
+    w = (w + yaw_in * dt) / (1.0 + p.yaw_drag * dt)
+    h = h + w * dt
+    ax, ay = _thrust(h, fwd, sway)
+    kv = 1.0 + p.lin_drag * dt
+    vx = (vx + ax * dt) / kv
+    vy = (vy + ay * dt) / kv
+    px = px + vx * dt
+    py = py + vy * dt
+    vd = (vd + heave * dt) / (1.0 + p.depth_drag * dt)
+    d = d + vd * dt
+    return h, w, px, py, vx, vy, d, vd
+
+
+def _step_exact(y, p, u, dt):
+    h, w, px, py, vx, vy, d, vd = y
+    fwd, sway, heave, yaw_in = u
+    heave = heave + p.buoyancy_bias
+    # x' = v, v' = a - k v with a constant:  v1 = e v0 + phi1 a,  x1 = x0 + phi1 v0 + phi2 a
+    e, phi1, phi2 = _phi(p.yaw_drag, dt)
+    h_new = h + phi1 * w + phi2 * yaw_in
+    w = e * w + phi1 * yaw_in
+    ax, ay = _thrust(0.5 * (h + h_new), fwd, sway)
+    e, phi1, phi2 = _phi(p.lin_drag, dt)
+    px = px + phi1 * vx + phi2 * ax
+    py = py + phi1 * vy + phi2 * ay
+    vx = e * vx + phi1 * ax
+    vy = e * vy + phi1 * ay
+    e, phi1, phi2 = _phi(p.depth_drag, dt)
+    d = d + phi1 * vd + phi2 * heave
+    vd = e * vd + phi1 * heave
+    return h_new, w, px, py, vx, vy, d, vd
+
+
+def _deriv(y, p, u):
+    h, w, px, py, vx, vy, d, vd = y
+    fwd, sway, heave, yaw_in = u
+    heave = heave + p.buoyancy_bias
+    ax, ay = _thrust(h, fwd, sway)
+    return (w, yaw_in - p.yaw_drag * w, vx, vy,
+            ax - p.lin_drag * vx, ay - p.lin_drag * vy, vd, heave - p.depth_drag * vd)
+
+
+def _step_rk4(y, p, u, dt):
+    def add(a, k, c):
+        return tuple(ai + c * ki for ai, ki in zip(a, k))
+    k1 = _deriv(y, p, u)
+    k2 = _deriv(add(y, k1, 0.5 * dt), p, u)
+    k3 = _deriv(add(y, k2, 0.5 * dt), p, u)
+    k4 = _deriv(add(y, k3, dt), p, u)
+    return tuple(yi + dt / 6.0 * (a + 2.0 * b + 2.0 * c + d)
+                 for yi, a, b, c, d in zip(y, k1, k2, k3, k4))
+
+
+_STEPS = {
+    "euler": _step_euler,
+    "semi_implicit": _step_semi_implicit,
+    "exact": _step_exact,
+    "rk4": _step_rk4,
+}
+
+
+def integrate(s, p, u, dt, method="euler", substeps=1):
+    """Advance state `s` in place by `dt` with inputs u = (fwd_acc, sway_acc, heave_acc, yaw_input).
+
+    Boundaries (depth clamp, wrap-around, pool margins) are left to the caller.
+    """
+    try:
+        step = _STEPS[method]
+    except KeyError:
+        raise ValueError(f"unknown integrator: {method} (choose from {', '.join(INTEGRATORS)})")
+    n = max(1, int(substeps))
+    y = _load(s)
+    h = dt / n
+    for _ in range(n):
+        y = step(y, p, u, h)
+    _store(s, y)
+
+
+def _bench_inputs(t, p):
+    """Piecewise-constant test maneuver: surge, turn, combined VEL with heave, stop."""
+    if t < 5.0:
+        return 0.6 * p.max_fwd_acc, 0.0, 0.0, 0.0
+    if t < 10.0:
+        return 0.3 * p.max_fwd_acc, 0.0, 0.0, 0.8 * p.max_yaw_rate
+    if t < 20.0:
+        return (0.5 * p.max_fwd_acc, 0.4 * p.max_fwd_acc * p.sway_acc_ratio,
+                0.3 * p.max_fwd_acc * p.heave_acc_ratio, -0.5 * p.max_yaw_rate)
+    return 0.0, 0.0, 0.0, 0.0
+
+
+def simulate(p, dt, duration, method, substeps=1, sample_every=1.0):
+    """Run the benchmark maneuver and return (positions sampled every `sample_every` s, wall time)."""
+    s = RovState()
+    steps = int(round(duration / dt))
+    every = max(1, int(round(sample_every / dt)))
+    samples = [(s.pos[0], s.pos[1], s.depth)]
+    t0 = time.perf_counter()
+    for i in range(steps):
+        integrate(s, p, _bench_inputs(i * dt, p), dt, method, substeps)
+        if (i + 1) % every == 0:
+            samples.append((s.pos[0], s.pos[1], s.depth))
+    return np.array(samples, dtype=float), time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ROV integrators against a fine RK4 reference")
+    parser.add_argument("--duration", type=float, default=30.0, help="Simulated duration (s)")
+    parser.add_argument("--dts", default="0.01,0.05,0.1,0.2,0.5", help="Comma separated step sizes (s)")
+    parser.add_argument("--substeps", type=int, default=4, help="Sub-step count for the extra 'xN' rows")
+    parser.add_argument("--ref_dt", type=float, default=1e-3, help="Reference RK4 step (s)")
+    parser.add_argument("--max_acc", type=float, default=120.0)
+    parser.add_argument("--max_yaw", type=float, default=60.0)
+    parser.add_argument("--lin_drag", type=float, default=0.8)
+    parser.add_argument("--yaw_drag", type=float, default=1.0)
+    parser.add_argument("--buoyancy_bias", type=float, default=5.0,
+                        help="Constant heave acceleration (>0 sinks); non-zero so the check covers it")
+    args = parser.parse_args()
+
+    p = RovParams(args.max_acc, args.max_yaw, args.lin_drag, args.yaw_drag)
+    p.buoyancy_bias = args.buoyancy_bias
+    # all dts must divide the 1 s sample interval and the maneuver switch times
+    ref, _ = simulate(p, args.ref_dt, args.duration, "rk4")
+
+    print(f"{'method':<18}{'dt':>8}{'steps/s':>12}{'max err (px)':>16}")
+    for dt in [float(v) for v in args.dts.split(",")]:
+        runs = [(m, 1) for m in INTEGRATORS] + [(m, args.substeps) for m in ("euler", "exact")]
+        for method, sub in runs:
+            traj, wall = simulate(p, dt, args.duration, method, sub)
+            n = min(len(traj), len(ref))
+            err = np.max(np.linalg.norm(traj[:n] - ref[:n], axis=1))
+            name = method if sub == 1 else f"{method} x{sub}"
+            steps = args.duration / dt
+            print(f"{name:<18}{dt:>8.3f}{steps / max(wall, 1e-9):>12.0f}{err:>16.3e}")
+
+
+if __name__ == "__main__":
+    main()
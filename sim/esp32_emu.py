@@ -0,0 +1,310 @@
+"""ESP32 main-firmware emulator: the host side of the command link without hardware.
+
+Usage:
+  python esp32_emu.py --link /tmp/akintay_esp32 [--baud 115200] [--loop_ms 1] [--rx_buffer 256]
+  python esp32_emu.py --udp 127.0.0.1:5008
+  (host: --port pty:/tmp/akintay_esp32, --port udp:127.0.0.1:5008, or just --port emu)
+
+Models the parts of AKINTAY_Main_Firmware.ino that shape the link:
+  wire      host bytes are read as soon as they arrive, timestamped, and clocked
+            out at the UART rate (10 bits per byte); a sender faster than
+            the UART builds a backlog. Queueing delay = arrival of a message ->
+            its last byte (newline or frame CRC) leaving the UART. The share of time the backlog exceeds
+            --driver_buffer is when a real serial write() would block
+  RX buffer each firmware loop (--loop_ms) drains what the wire delivered since the
+            previous loop into a --rx_buffer byte buffer; bytes beyond it are
+            lost (overrun) and corrupt the line they belonged to
+  parser    readSerialNonBlocking/parseSerialLine: lines split on CR/LF, a 128
+            character guard, binary frames (sync + CRC), MODE:/CMD:/VEL:
+            handling, 800 ms failsafe
+  debug     the firmware's status line every 250 ms (pty only, --debug_ms)
+
+The report (every --report s and at exit) gives parsed message rate, wire
+throughput and utilisation, queueing delay mean/p99/max, backlog, driver
+buffer full time, overrun bytes, frames, bad lines/frames, failsafe trips and
+the state.
+"""
+import argparse
+import os
+import socket
+import time
+from collections import deque
+
+import numpy as np
+
+from command_protocol import FRAME_SIZE, SYNC, StreamDecoder
+
+FAILSAFE_MS = 800
+MODES = {"MANUAL": 0, "VISION": 1, "STAB": 2, "VEL": 3}
+
+
+class PtyWire:
+    """Host writes into a pty; everything it wrote is read (and timestamped) as soon as it is there."""
+
+    def __init__(self, link):
+        import pty
+        import tty
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)  # keep the slave open too, or reads on the master fail while no host is attached
+        os.set_blocking(self.master, False)
+        self.link = link
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.symlink(os.ttyname(self.slave), link)
+
+    def poll(self):
+        """[(arrival time, bytes)] written by the host since the last call."""
+        chunks = []
+        while True:
+            try:
+                data = os.read(self.master, 65536)
+            except (BlockingIOError, OSError):
+                break
+            if not data:
+                break
+            chunks.append((time.monotonic(), data))
+        return chunks
+
+    def reply(self, data):
+        try:
+            os.write(self.master, data)
+        except (BlockingIOError, OSError):
+            pass  # nobody reading the debug lines; drop them like a full TX buffer
+
+    def close(self):
+        if os.path.lexists(self.link):
+            os.unlink(self.link)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class UdpWire:
+    """Each datagram is a chunk of bytes for the emulated UART."""
+
+    def __init__(self, host, port):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+    def poll(self):
+        chunks = []
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, OSError):
+                break
+            chunks.append((time.monotonic(), data))
+        return chunks
+
+    def reply(self, data):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+
+class Firmware:
+    """Line parser and command state as in AKINTAY_Main_Firmware.ino."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.rx = StreamDecoder()
+        self.mode = 0
+        self.vision_cmd = 'S'
+        self.vision_speed = 0
+        self.vel = [0, 0, 0, 0]
+        self.last_cmd = None
+        self.messages = 0
+        self.bad = 0
+        self.failsafe = 0
+        self.timed_out = False
+        self.gaps = deque(maxlen=10000)  # s between accepted CMD/VEL lines
+
+    def feed(self, data):
+        for line in self.rx.feed(data):
+            self.parse(line)
+
+    def _accepted(self):
+        now = self.clock()
+        if self.last_cmd is not None:
+            self.gaps.append(now - self.last_cmd)
+        self.last_cmd = now
+        self.messages += 1
+        self.timed_out = False
+
+    def parse(self, line):
+        if line.startswith("MODE:"):
+            for name, m in MODES.items():
+                if line.find(name) > 0:
+                    self.mode = m
+                    return
+            self.bad += 1
+            return
+        first, _, rest = line.partition(";")
+        if first.startswith("CMD:") and len(first) > 4:
+            self.vision_cmd = first[4]
+            if rest.startswith("SPEED:"):
+                self.vision_speed = max(0, min(100, _to_int(rest[6:])))
+            self._accepted()
+            return
+        if first.startswith("VEL:"):
+            vals = first[4:].split(",")
+            if len(vals) == 4:
+                self.vel = [max(-100, min(100, _to_int(v))) for v in vals]
+                self._accepted()
+                return
+        self.bad += 1
+
+    def tick(self):
+        """Failsafe check once per loop: no command for FAILSAFE_MS zeroes the inputs."""
+        if self.last_cmd is None or self.timed_out:
+            return
+        if (self.clock() - self.last_cmd) * 1000.0 > FAILSAFE_MS:
+            self.timed_out = True
+            self.failsafe += 1
+            self.vision_cmd, self.vision_speed = 'S', 0
+            self.vel = [0, 0, 0, 0]
+
+    def status(self):
+        return f"MODE:{self.mode} CMD:{self.vision_cmd} SPD:{self.vision_speed} VEL:{','.join(map(str, self.vel))}"
+
+
+def _to_int(s):
+    # Arduino String::toInt: leading integer, 0 if none
+    s = s.strip()
+    n = 0
+    for i, c in enumerate(s):
+        if not (c.isdigit() or (i == 0 and c in "+-")):
+            break
+        n = i + 1
+    try:
+        return int(s[:n])
+    except ValueError:
+        return 0
+
+
+class Emulator:
+    """Clocks queued host bytes through the UART, the RX buffer and the firmware parser."""
+
+    def __init__(self, wire, baud=115200, loop_ms=1.0, rx_buffer=256, debug_ms=250, driver_buffer=4096):
+        self.wire = wire
+        self.rate = baud / 10.0  # bytes/s, 8N1
+        self.loop = loop_ms / 1000.0
+        self.rx_buffer = rx_buffer
+        self.debug = debug_ms / 1000.0
+        self.driver_buffer = driver_buffer
+        self.fw = Firmware()
+        self.queue = deque()  # [arrival time, bytes not yet on the wire]
+        self.queued = 0
+        self.frame_left = 0  # bytes of the frame being clocked out still to go
+        self.wire_free = 0.0  # when the UART finishes the bytes already clocked out
+        self.bytes = 0
+        self.overrun = 0
+        self.delay = deque(maxlen=20000)  # s from a line's arrival to its newline leaving the UART
+        self.full_time = 0.0  # s with more than driver_buffer bytes queued
+        self.t_start = time.monotonic()
+
+    def clock_out(self, now):
+        """Bytes the UART delivered up to `now`; records each message's queueing delay."""
+        out = bytearray()
+        while self.queue:
+            t_arr, data = self.queue[0]
+            start = max(self.wire_free, t_arr)
+            k = min(len(data), int((now - start) * self.rate))
+            if k <= 0:
+                break
+            part = data[:k]
+            for j, b in enumerate(part):
+                if self.frame_left:
+                    self.frame_left -= 1
+                    if self.frame_left:
+                        continue
+                elif b == SYNC:
+                    self.frame_left = FRAME_SIZE - 1
+                    continue
+                elif b != 10:
+                    continue
+                self.delay.append(start + (j + 1) / self.rate - t_arr)
+            out += part
+            self.wire_free = start + k / self.rate
+            self.queued -= k
+            if k == len(data):
+                self.queue.popleft()
+            else:
+                self.queue[0] = [t_arr, data[k:]]
+                break
+        return bytes(out)
+
+    def run(self, report_every=0.0):
+        last = time.monotonic()
+        next_debug = last + self.debug
+        next_report = last + report_every if report_every > 0 else None
+        while True:
+            time.sleep(self.loop)  # the rest of loop(): IMU, mixing, motor writes
+            now = time.monotonic()
+            for t_arr, data in self.wire.poll():
+                self.queue.append([t_arr, data])
+                self.queued += len(data)
+            if self.queued > self.driver_buffer:
+                self.full_time += now - last
+            data = self.clock_out(now)
+            if data:
+                self.bytes += len(data)
+                # everything that arrived since the previous loop sits in the RX buffer
+                if len(data) > self.rx_buffer:
+                    self.overrun += len(data) - self.rx_buffer
+                    data = data[:self.rx_buffer]
+                self.fw.feed(data)
+            last = now
+            self.fw.tick()
+            if self.debug > 0 and now >= next_debug:
+                self.wire.reply((self.fw.status() + "\r\n").encode("ascii"))
+                next_debug += self.debug
+            if next_report is not None and now >= next_report:
+                print(self.report(), flush=True)
+                next_report += report_every
+
+    def report(self):
+        el = max(time.monotonic() - self.t_start, 1e-9)
+        fw = self.fw
+        d = np.array(self.delay) * 1000.0 if self.delay else np.zeros(1)
+        g = np.array(fw.gaps) * 1000.0 if fw.gaps else np.zeros(1)
+        return (f"esp32: {fw.messages / el:.1f} msg/s  {self.bytes / el / 1000.0:.2f} kB/s "
+                f"({100.0 * self.bytes / el / self.rate:.0f}% of UART)  queue delay mean {d.mean():.2f} "
+                f"p99 {np.percentile(d, 99):.2f} max {d.max():.2f} ms  backlog {self.queued} B  "
+                f"driver buffer full {100.0 * self.full_time / el:.0f}%  gap p99 {np.percentile(g, 99):.1f} ms  "
+                f"overrun {self.overrun} B  frames {fw.rx.frames}  bad {fw.bad + fw.rx.bad}  failsafe {fw.failsafe}  [{fw.status()}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKINTAY ESP32 firmware link emulator")
+    parser.add_argument("--link", default="/tmp/akintay_esp32", help="Symlink to the pty the host opens")
+    parser.add_argument("--udp", default=None, help="Listen for datagrams on HOST:PORT instead of a pty")
+    parser.add_argument("--baud", type=int, default=115200, help="Emulated UART rate (the bottleneck)")
+    parser.add_argument("--loop_ms", type=float, default=1.0, help="Firmware loop period (RX buffer service interval)")
+    parser.add_argument("--rx_buffer", type=int, default=256, help="Serial RX buffer size in bytes")
+    parser.add_argument("--driver_buffer", type=int, default=4096,
+                        help="Host serial driver buffer; beyond this backlog a real write() would block")
+    parser.add_argument("--debug_ms", type=float, default=250.0, help="Status line period back to the host (0 = off)")
+    parser.add_argument("--report", type=float, default=0.0, help="Print the report every N seconds (0 = only at exit)")
+    args = parser.parse_args()
+
+    if args.udp:
+        host, port = args.udp.rsplit(":", 1)
+        wire = UdpWire(host, int(port))
+        print(f"esp32 emulator on udp {args.udp}, {args.baud} baud")
+    else:
+        wire = PtyWire(args.link)
+        print(f"esp32 emulator on {args.link} -> {os.ttyname(wire.slave)}, {args.baud} baud", flush=True)
+    emu = Emulator(wire, args.baud, args.loop_ms, args.rx_buffer, args.debug_ms, args.driver_buffer)
+    try:
+        emu.run(args.report)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        wire.close()
+        print(emu.report(), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Multi-rate executive for the sims: physics, render and telemetry at their own rates.
+
+Usage inside a sim loop:
+
+    ex = Executive()
+    physics = ex.add("physics", 500, catchup=True)
+    render = ex.add("render", 60)
+    while True:
+        task = ex.wait_next()
+        if task is physics:
+            step(physics.period)
+        elif task is render:
+            draw()
+
+`wait_next` sleeps (then spins for the last fraction of a millisecond) until the
+earliest deadline and returns that task. Late ticks: a `catchup` task (physics)
+replays missed ticks back-to-back so simulated time tracks wall time, but only
+up to `max_catchup` ticks, beyond which the backlog is dropped and counted; other
+tasks coalesce missed ticks into one, and `task.dt` then covers all of them
+(use it instead of `period` for anything that advances with time, e.g.
+particles). Lateness (start - deadline) and run time per task are kept for
+`report()`.
+"""
+import time
+from collections import deque
+
+import numpy as np
+
+
+class RateTask:
+    def __init__(self, name, hz, catchup=False, max_catchup=50):
+        self.name = name
+        self.hz = float(hz)
+        self.period = 1.0 / self.hz
+        self.catchup = catchup
+        self.max_catchup = max_catchup
+        self.next_due = None
+        self.dt = self.period  # schedule time covered by the current tick (> period when coalesced)
+        self.ticks = 0
+        self.skipped = 0  # ticks dropped or coalesced because we were late
+        self.overruns = 0  # ticks whose run time exceeded the period
+        self.lateness = deque(maxlen=2000)  # s
+        self.runtime = deque(maxlen=2000)  # s
+
+    def stats(self, elapsed):
+        late = np.array(self.lateness) * 1000.0 if self.lateness else np.zeros(1)
+        run = np.array(self.runtime) * 1000.0 if self.runtime else np.zeros(1)
+        rate = self.ticks / elapsed if elapsed > 0 else 0.0
+        return (f"{self.name:<10} {rate:8.1f}/{self.hz:<7.1f}Hz  jitter mean {late.mean():6.3f} "
+                f"p99 {np.percentile(late, 99):6.3f} max {late.max():7.3f} ms  run mean {run.mean():6.3f} "
+                f"max {run.max():7.3f} ms  skipped {self.skipped}  overruns {self.overruns}")
+
+
+class Executive:
+    def __init__(self, spin=0.0003, clock=time.perf_counter):
+        self.tasks = []
+        self.spin = spin  # s of busy-wait before a deadline (sleep granularity)
+        self.clock = clock
+        self.start = None
+        self._current = None
+        self._current_start = 0.0
+
+    def add(self, name, hz, catchup=False, max_catchup=50):
+        task = RateTask(name, hz, catchup, max_catchup)
+        self.tasks.append(task)
+        return task
+
+    def _finish_current(self, now):
+        task = self._current
+        if task is None:
+            return
+        run = now - self._current_start
+        task.runtime.append(run)
+        if run > task.period:
+            task.overruns += 1
+        self._current = None
+
+    def wait_next(self):
+        now = self.clock()
+        self._finish_current(now)
+        if self.start is None:
+            self.start = now
+            for t in self.tasks:
+                t.next_due = now
+        # earliest deadline first; ties go to the task added first
+        task = min(self.tasks, key=lambda t: t.next_due)
+        remaining = task.next_due - now
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while self.clock() < task.next_due:
+            pass
+        now = self.clock()
+        late = now - task.next_due
+        task.lateness.append(late)
+        task.ticks += 1
+        missed = int(late // task.period)
+        if missed > 0 and (not task.catchup or missed > task.max_catchup):
+            # coalesce (render/telemetry) or drop a backlog too long to replay (physics)
+            task.skipped += missed
+            task.dt = (missed + 1) * task.period
+        else:
+            task.dt = task.period
+        task.next_due += task.dt
+        self._current = task
+        self._current_start = now
+        return task
+
+    def elapsed(self):
+        return 0.0 if self.start is None else self.clock() - self.start
+
+    def report(self):
+        el = self.elapsed()
+        return "\n".join(t.stats(el) for t in self.tasks)
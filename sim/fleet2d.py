@@ -0,0 +1,183 @@
+"""Vectorized multi-vehicle world for the 2D simulator.
+
+Usage: python fleet2d.py --n 1000 --duration 60 [--formation line|grid|ring] [--check]
+
+Same dynamics as rov2d.step_dynamics (dynamics.integrate plus depth clamp and
+wrap-around), but the state is stored struct-of-arrays so one call steps
+the whole fleet with NumPy instead of a Python loop per vehicle.
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from dynamics import INTEGRATORS, RovParams, RovState, integrate
+from rov2d import CommandState, parse_cmd, parse_vel, step_dynamics
+
+
+# Discrete command codes (CMD:<c>) stored per vehicle; CMD_VEL mirrors CommandState's '(VEL)'
+CMD_NONE, CMD_F, CMD_L, CMD_R, CMD_S, CMD_VEL = 0, 1, 2, 3, 4, 5
+_CMD_CODES = {'F': CMD_F, 'L': CMD_L, 'R': CMD_R, 'S': CMD_S}
+
+
+class FleetState:
+    """Struct-of-arrays state for `n` vehicles (one row per vehicle)."""
+
+    def __init__(self, n, speed=60):
+        self.n = n
+        self.pos = np.zeros((n, 2), dtype=float)
+        self.vel = np.zeros((n, 2), dtype=float)
+        self.heading = np.full(n, -math.pi / 2)  # up
+        self.yaw_rate = np.zeros(n)
+        self.depth = np.zeros(n)
+        self.vdepth = np.zeros(n)
+        # latched commands, same semantics as rov2d.CommandState
+        self.cmd = np.zeros(n, dtype=np.int8)
+        self.speed = np.full(n, speed, dtype=float)
+        self.vel_cmd = np.zeros((n, 4), dtype=float)
+
+    def apply(self, idx, line):
+        """Apply one CMD/VEL line to vehicle(s) `idx` (int, slice or index array)."""
+        if not line:
+            return
+        v = parse_vel(line)
+        if v is not None:
+            self.cmd[idx] = CMD_VEL  # a VEL line replaces the latched CMD
+            self.vel_cmd[idx] = v
+            return
+        c, s = parse_cmd(line)
+        if c is not None:
+            self.cmd[idx] = _CMD_CODES.get(c, CMD_NONE)
+            self.speed[idx] = s
+            self.vel_cmd[idx] = 0
+
+    def set_vel(self, vel_cmd):
+        """Set per-vehicle VEL inputs from an (n, 4) array in -100..100."""
+        self.cmd[:] = CMD_VEL
+        self.vel_cmd[:] = np.clip(vel_cmd, -100, 100)
+
+    def inputs(self, p: RovParams):
+        """Vectorized CommandState.inputs: returns (fwd_acc, sway_acc, heave_acc, yaw_input) arrays."""
+        use_vel = np.any(self.vel_cmd != 0, axis=1)
+        k = self.speed / 100.0
+        fwd_acc = np.where(self.cmd == CMD_F, k * p.max_fwd_acc, 0.0)
+        yaw_input = np.where(self.cmd == CMD_L, -k * p.max_yaw_rate,
+                             np.where(self.cmd == CMD_R, k * p.max_yaw_rate, 0.0))
+        vc = self.vel_cmd / 100.0
+        fwd_acc = np.where(use_vel, vc[:, 0] * p.max_fwd_acc, fwd_acc)
+        sway_acc = np.where(use_vel, vc[:, 1] * p.max_fwd_acc * p.sway_acc_ratio, 0.0)
+        heave_acc = np.where(use_vel, vc[:, 2] * p.max_fwd_acc * p.heave_acc_ratio, 0.0)
+        yaw_input = np.where(use_vel, vc[:, 3] * p.max_yaw_rate, yaw_input)
+        return fwd_acc, sway_acc, heave_acc, yaw_input
+
+
+def step_fleet(f: FleetState, p: RovParams, u, dt, width, height, method="euler", substeps=1):
+    integrate(f, p, u, dt, method, substeps)
+
+    surfaced = f.depth < 0
+    f.depth[surfaced] = 0.0
+    f.vdepth[surfaced] = 0.0
+
+    # Boundaries wrap-around (same single-step rule as rov2d)
+    x, y = f.pos[:, 0], f.pos[:, 1]
+    x[x < 0] += width
+    x[x > width] -= width
+    y[y < 0] += height
+    y[y > height] -= height
+
+
+def place_formation(f: FleetState, kind, width, height, spacing=30.0):
+    n = f.n
+    cx, cy = width / 2.0, height / 2.0
+    if kind == "line":
+        f.pos[:, 0] = (cx + (np.arange(n) - (n - 1) / 2.0) * spacing) % width
+        f.pos[:, 1] = cy
+    elif kind == "grid":
+        cols = int(math.ceil(math.sqrt(n)))
+        i = np.arange(n)
+        f.pos[:, 0] = (cx + (i % cols - (cols - 1) / 2.0) * spacing) % width
+        f.pos[:, 1] = (cy + (i // cols - (cols - 1) / 2.0) * spacing) % height
+    elif kind == "ring":
+        a = np.linspace(0, 2 * math.pi, n, endpoint=False)
+        r = max(spacing, n * spacing / (2 * math.pi))
+        f.pos[:, 0] = (cx + r * np.cos(a)) % width
+        f.pos[:, 1] = (cy + r * np.sin(a)) % height
+        f.heading[:] = a + math.pi / 2  # tangent: circulate
+    else:
+        raise ValueError(f"unknown formation: {kind}")
+
+
+def check_against_scalar(params, width, height, steps=500, dt=0.01, n=16, method="euler", substeps=1):
+    """Step n vehicles both ways (fleet vs per-vehicle rov2d) and return the max position error."""
+    rng = np.random.default_rng(7)
+    fleet = FleetState(n)
+    fleet.pos[:] = rng.uniform(0, [width, height], size=(n, 2))
+    singles = []
+    for i in range(n):
+        s = RovState(*fleet.pos[i])
+        c = CommandState()
+        if i % 3 == 2:
+            # CMD then VEL then VEL:0 must leave the vehicle coasting, not back on the latched CMD
+            lines = ["CMD:F;SPEED:80", "VEL:10,0,0,0", "VEL:0,0,0,0"]
+        elif i % 2:
+            lines = [f"VEL:{rng.integers(-100, 101)},{rng.integers(-100, 101)},{rng.integers(-100, 101)},{rng.integers(-100, 101)}"]
+        else:
+            lines = [f"CMD:{'FLRS'[i % 4]};SPEED:{rng.integers(0, 101)}"]
+        for line in lines:
+            c.apply(line)
+            fleet.apply(i, line)
+        singles.append((s, c))
+    for _ in range(steps):
+        step_fleet(fleet, params, fleet.inputs(params), dt, width, height, method, substeps)
+        for s, c in singles:
+            step_dynamics(s, params, c.inputs(params), dt, width, height, method, substeps)
+    ref = np.array([s.pos for s, _ in singles])
+    return float(np.max(np.abs(ref - fleet.pos)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKINTAY vectorized fleet sim (headless)")
+    parser.add_argument("--n", type=int, default=1000, help="Number of vehicles")
+    parser.add_argument("--dt", type=float, default=0.01, help="Fixed timestep (s)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Simulated duration (s)")
+    parser.add_argument("--width", type=int, default=900)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--formation", choices=["line", "grid", "ring"], default="grid")
+    parser.add_argument("--cmd", default="VEL:60,0,0,15", help="Command applied to every vehicle")
+    parser.add_argument("--max_acc", type=float, default=120.0)
+    parser.add_argument("--max_yaw", type=float, default=60.0)
+    parser.add_argument("--lin_drag", type=float, default=0.8)
+    parser.add_argument("--yaw_drag", type=float, default=1.0)
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="euler")
+    parser.add_argument("--substeps", type=int, default=1)
+    parser.add_argument("--check", action="store_true", help="Verify against the scalar rov2d dynamics first")
+    parser.add_argument("--out", default=None, help="Save final fleet state (.npz)")
+    args = parser.parse_args()
+
+    params = RovParams(args.max_acc, args.max_yaw, args.lin_drag, args.yaw_drag)
+    if args.check:
+        err = check_against_scalar(params, args.width, args.height, method=args.integrator, substeps=args.substeps)
+        print(f"check: max |pos(fleet) - pos(rov2d)| = {err:.3e} px")
+
+    fleet = FleetState(args.n)
+    place_formation(fleet, args.formation, args.width, args.height)
+    fleet.apply(slice(None), args.cmd)
+
+    steps = int(round(args.duration / args.dt))
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        step_fleet(fleet, params, fleet.inputs(params), args.dt, args.width, args.height,
+                   args.integrator, args.substeps)
+    wall = time.perf_counter() - t0
+    print(f"fleet: {args.n} vehicles x {steps} steps in {wall:.3f}s wall "
+          f"({args.n * steps / max(wall, 1e-9):.3e} vehicle-steps/s)")
+
+    if args.out:
+        np.savez_compressed(args.out, pos=fleet.pos, vel=fleet.vel, heading=fleet.heading,
+                            yaw_rate=fleet.yaw_rate, depth=fleet.depth, vdepth=fleet.vdepth)
+        print(f"state → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
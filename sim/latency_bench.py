@@ -0,0 +1,212 @@
+"""End-to-end command -> telemetry latency benchmark for the sims.
+
+Usage:
+  python latency_bench.py --sim rov2d.py --rates 10,50,100,200 --sizes 900x600,1920x1080
+  python latency_bench.py --sim rov_pool_3d.py --no_launch --listen_port 5005 --telemetry_port 5006
+
+For every render size the sim is launched with telemetry on (unless
+--no_launch), then at every command rate the bench sends `CMD:S;SPEED:<v>;SEQ:<n>`
+for `--duration` seconds. S keeps the vehicle still, and v cycles through 1..100.
+Every sim echoes the latched speed in its telemetry, so a command is matched to
+the first telemetry frame that shows its value. Latency is measured on this
+process's clock, from just before sendto to the arrival of that frame.
+
+Per command:
+  matched     its value showed up in telemetry (latency recorded)
+  superseded  a later command showed up first (the sim coalesced it, or it fell
+              between telemetry frames)
+  lost        never shown and not superseded by the end of the window
+"""
+import argparse
+import itertools
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from send_udp import wait_until
+from telemetry import decode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class TelemetryMatcher(threading.Thread):
+    """Receive telemetry and match speed values to pending commands."""
+
+    def __init__(self, host, port):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.lock = threading.Lock()
+        self.pending = deque()  # (value, t_send) in send order
+        self.latency = []
+        self.superseded = 0
+        self.frames = 0
+        self.last_value = None
+        self.running = True
+
+    def sent(self, value, t_send):
+        with self.lock:
+            self.pending.append((value, t_send))
+
+    def reset(self):
+        with self.lock:
+            lost = len(self.pending)
+            self.pending.clear()
+            self.latency = []
+            self.superseded = 0
+            self.frames = 0
+            self.last_value = None  # the next run's first command may echo the same value
+        return lost
+
+    def run(self):
+        while self.running:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            t_rx = time.perf_counter()
+            tele = decode(data)
+            if tele is None or "speed" not in tele:
+                continue
+            self.frames += 1
+            v = tele["speed"]
+            with self.lock:
+                if v == self.last_value:
+                    continue
+                self.last_value = v
+                # newest pending command with this value; everything older was superseded
+                for i in range(len(self.pending) - 1, -1, -1):
+                    if self.pending[i][0] == v:
+                        self.latency.append(t_rx - self.pending[i][1])
+                        self.superseded += i
+                        for _ in range(i + 1):
+                            self.pending.popleft()
+                        break
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+def run_rate(matcher, sock, addr, rate, duration, seq, settle=0.5):
+    """Send at `rate` Hz for `duration` s; return a result dict.
+
+    `seq` is an iterator of SEQ numbers shared by all runs: the sim drops a
+    SEQ at or below the newest it has seen from this socket, so restarting at
+    0 for every rate would show up as loss.
+    """
+    matcher.reset()
+    n = int(round(rate * duration))
+    t0 = time.perf_counter() + 0.05
+    for k in range(n):
+        value = k % 100 + 1
+        now = wait_until(t0 + k / rate)
+        matcher.sent(value, now)
+        sock.sendto(f"CMD:S;SPEED:{value};SEQ:{next(seq)}\n".encode("ascii"), addr)
+    time.sleep(settle)
+    with matcher.lock:
+        lat = np.array(matcher.latency) * 1000.0
+        superseded = matcher.superseded
+        frames = matcher.frames
+        lost = len(matcher.pending)
+        matcher.pending.clear()
+    res = {"rate_hz": rate, "sent": n, "matched": len(lat), "superseded": superseded, "lost": lost,
+           "loss_pct": 100.0 * lost / n if n else 0.0, "telemetry_frames": frames}
+    for q in (50, 95, 99):
+        res[f"p{q}_ms"] = float(np.percentile(lat, q)) if len(lat) else float("nan")
+    res["max_ms"] = float(lat.max()) if len(lat) else float("nan")
+    return res
+
+
+def launch(args, width, height):
+    cmd = shlex.split(args.sim_prefix) if args.sim_prefix else [sys.executable]
+    cmd += [os.path.join(HERE, args.sim), "--listen_port", str(args.listen_port), "--telemetry",
+            "--telemetry_port", str(args.telemetry_port), "--telemetry_hz", str(args.telemetry_hz),
+            "--width", str(width), "--height", str(height)] + shlex.split(args.sim_args)
+    return subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_telemetry(matcher, timeout=20.0):
+    t_end = time.perf_counter() + timeout
+    while time.perf_counter() < t_end:
+        if matcher.frames > 0:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKINTAY sim command -> telemetry latency benchmark")
+    parser.add_argument("--sim", default="rov2d.py", choices=["rov2d.py", "rov_pool_anim.py", "rov_pool_3d.py"])
+    parser.add_argument("--rates", default="10,50,100,200", help="Command rates (Hz)")
+    parser.add_argument("--sizes", default="900x600", help="Render sizes WxH (one sim launch each)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of commands per rate")
+    parser.add_argument("--telemetry_hz", type=float, default=200.0, help="Telemetry rate requested from the sim")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--listen_port", type=int, default=5005, help="Sim command port")
+    parser.add_argument("--telemetry_port", type=int, default=5006, help="Port this bench receives telemetry on")
+    parser.add_argument("--no_launch", action="store_true", help="Measure an already running sim (sizes ignored)")
+    parser.add_argument("--sim_prefix", default="", help="Command prefix to launch the sim (e.g. 'xvfb-run python')")
+    parser.add_argument("--sim_args", default="", help="Extra sim arguments")
+    parser.add_argument("--out", default=None, help="Write results as JSON lines")
+    args = parser.parse_args()
+
+    rates = [float(r) for r in args.rates.split(",")]
+    sizes = [tuple(int(v) for v in s.split("x")) for s in args.sizes.split(",")]
+    if args.no_launch:
+        sizes = [None]
+
+    matcher = TelemetryMatcher("127.0.0.1", args.telemetry_port)
+    matcher.start()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    addr = (args.host, args.listen_port)
+    seq = itertools.count()
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    print(f"{'size':>10} {'rate':>6} {'sent':>6} {'match':>6} {'super':>6} {'lost':>5} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} ms")
+    try:
+        for size in sizes:
+            matcher.reset()
+            proc = launch(args, *size) if size is not None else None
+            try:
+                if not wait_for_telemetry(matcher):
+                    print(f"{args.sim}: no telemetry on port {args.telemetry_port}")
+                    continue
+                time.sleep(0.5)  # let start-up transients pass
+                label = "running" if size is None else f"{size[0]}x{size[1]}"
+                for rate in rates:
+                    res = run_rate(matcher, sock, addr, rate, args.duration, seq)
+                    res.update({"sim": args.sim, "size": label})
+                    print(f"{label:>10} {rate:>6.0f} {res['sent']:>6} {res['matched']:>6} {res['superseded']:>6} "
+                          f"{res['lost']:>5} {res['p50_ms']:>8.2f} {res['p95_ms']:>8.2f} {res['p99_ms']:>8.2f} "
+                          f"{res['max_ms']:>8.2f}")
+                    if out is not None:
+                        out.write(json.dumps(res) + "\n")
+                        out.flush()
+            finally:
+                if proc is not None:
+                    proc.terminate()
+                    proc.wait(5)
+    finally:
+        matcher.stop()
+        sock.close()
+        if out is not None:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
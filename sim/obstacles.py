@@ -0,0 +1,221 @@
+"""Circular obstacles for rov2d: loading, a uniform-grid index and collision response.
+
+Usage (benchmark): python obstacles.py [--counts 10,100,1000,10000,100000] [--queries 20000]
+
+Obstacles are stored as arrays (x, y, r) and bucketed by the grid cell of their
+centre (CSR layout: indices sorted by cell, one start offset per cell). The cell
+size is at least the largest contact distance (vehicle radius + biggest obstacle
+radius), so every obstacle that can touch the vehicle has its centre in the 3x3
+cells around it. A query touches only those cells, and each cell row is one
+contiguous slice. Cost depends on the local density, not the total count.
+
+With `world=(width, height)` the world wraps around like rov2d's: a vehicle
+within reach of an edge is also tested at its wrapped images, so obstacles on
+the far side of the edge still collide.
+
+Obstacle files: one `x y r` (or `x,y,r`) per line with '#' comments, or a .npy
+array of shape (n, 3).
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+
+def make_obstacles(width, height, count=8, seed=42):
+    rng = np.random.default_rng(seed)
+    obstacles = []
+    for _ in range(count):
+        x = float(rng.integers(60, width - 60))
+        y = float(rng.integers(60, height - 60))
+        r = float(rng.integers(20, 40))
+        obstacles.append((x, y, r))
+    return obstacles
+
+
+def load_obstacles(path):
+    """Read obstacles as a list of (x, y, r)."""
+    if path.endswith(".npy"):
+        arr = np.load(path)
+    else:
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for raw in f:
+                line = raw.split("#", 1)[0].replace(",", " ").split()
+                if line:
+                    rows.append([float(v) for v in line[:3]])
+        arr = np.array(rows, dtype=float).reshape(-1, 3)
+    return [tuple(map(float, row)) for row in arr]
+
+
+class ObstacleGrid:
+    def __init__(self, obstacles, vehicle_radius=22.0, restitution=0.3, cell=0.0, world=None):
+        arr = np.array(obstacles, dtype=float).reshape(-1, 3)
+        self.vehicle_radius = float(vehicle_radius)
+        self.restitution = float(restitution)
+        self.world = world  # (width, height) for wrap-around, or None
+        self.n = len(arr)
+        self.hits = 0  # steps with at least one contact
+        reach = self.vehicle_radius + (arr[:, 2].max() if self.n else 0.0)
+        self.cell = max(float(cell), reach, 1.0)
+        if self.n:
+            self.x0, self.y0 = arr[:, 0].min(), arr[:, 1].min()
+            self.nx = int((arr[:, 0].max() - self.x0) // self.cell) + 1
+            self.ny = int((arr[:, 1].max() - self.y0) // self.cell) + 1
+        else:
+            self.x0 = self.y0 = 0.0
+            self.nx = self.ny = 1
+        cx = ((arr[:, 0] - self.x0) // self.cell).astype(np.int64)
+        cy = ((arr[:, 1] - self.y0) // self.cell).astype(np.int64)
+        key = cy * self.nx + cx
+        order = np.argsort(key, kind="stable")
+        self.ox = arr[order, 0].copy()
+        self.oy = arr[order, 1].copy()
+        self.orad = arr[order, 2].copy()
+        # start[k]:start[k+1] are the obstacles in cell k (row-major)
+        self.start = np.searchsorted(key[order], np.arange(self.nx * self.ny + 1))
+
+    def candidates(self, x, y):
+        """Index ranges (into ox/oy/orad) of obstacles that may touch a vehicle at (x, y)."""
+        cx = int(math.floor((x - self.x0) / self.cell))
+        cy = int(math.floor((y - self.y0) / self.cell))
+        if self.n == 0 or cx < -1 or cy < -1 or cx > self.nx or cy > self.ny:
+            return []
+        c0, c1 = max(cx - 1, 0), min(cx + 1, self.nx - 1)
+        ranges = []
+        for row in range(max(cy - 1, 0), min(cy + 1, self.ny - 1) + 1):
+            a, b = self.start[row * self.nx + c0], self.start[row * self.nx + c1 + 1]
+            if b > a:
+                ranges.append((a, b))
+        return ranges
+
+    def images(self, x, y):
+        """(x, y) plus its wrapped copies that are within reach of the far edge."""
+        if self.world is None:
+            return [(x, y)]
+        w, h = self.world
+        xs = [x] + ([x + w] if x < self.cell else []) + ([x - w] if x > w - self.cell else [])
+        ys = [y] + ([y + h] if y < self.cell else []) + ([y - h] if y > h - self.cell else [])
+        return [(ix, iy) for iy in ys for ix in xs]
+
+    def query(self, x, y):
+        """Indices of obstacles overlapping the vehicle circle at (x, y) (or a wrapped image of it)."""
+        pts = self.images(x, y)
+        if len(pts) == 1:
+            return self._query_at(x, y)
+        out = []
+        for ix, iy in pts:
+            out.extend(i for i in self._query_at(ix, iy) if i not in out)
+        return out
+
+    def _query_at(self, x, y):
+        out = []
+        rv = self.vehicle_radius
+        for a, b in self.candidates(x, y):
+            dx = self.ox[a:b] - x
+            dy = self.oy[a:b] - y
+            rr = self.orad[a:b] + rv
+            hit = np.nonzero(dx * dx + dy * dy < rr * rr)[0]
+            if len(hit):
+                out.extend((hit + a).tolist())
+        return out
+
+    def collide(self, s):
+        """Push state `s` out of every overlapping obstacle and reflect the inward velocity.
+
+        Returns True if the vehicle was in contact.
+        """
+        hits = []
+        for ix, iy in self.images(s.pos[0], s.pos[1]):
+            # offset of this image; push along the image-to-obstacle normal
+            sx, sy = ix - s.pos[0], iy - s.pos[1]
+            for i in self._query_at(ix, iy):
+                hits.append(i)
+                self._push(s, i, sx, sy)
+        if hits:
+            self.hits += 1
+        return bool(hits)
+
+    def _push(self, s, i, sx, sy):
+        dx = s.pos[0] + sx - self.ox[i]
+        dy = s.pos[1] + sy - self.oy[i]
+        d = math.hypot(dx, dy)
+        if d < 1e-9:
+            nx, ny, d = 1.0, 0.0, 0.0
+        else:
+            nx, ny = dx / d, dy / d
+        contact = self.orad[i] + self.vehicle_radius
+        if d >= contact:
+            return  # already pushed clear by an earlier obstacle
+        s.pos[0] += nx * (contact - d)
+        s.pos[1] += ny * (contact - d)
+        vn = s.vel[0] * nx + s.vel[1] * ny
+        if vn < 0:
+            s.vel[0] -= (1.0 + self.restitution) * vn * nx
+            s.vel[1] -= (1.0 + self.restitution) * vn * ny
+
+
+def brute_force_query(arr, x, y, vehicle_radius, world=None):
+    dx, dy = arr[:, 0] - x, arr[:, 1] - y
+    if world is not None:
+        # nearest wrapped copy
+        dx = (dx + world[0] / 2) % world[0] - world[0] / 2
+        dy = (dy + world[1] / 2) % world[1] - world[1] / 2
+    return np.nonzero(dx * dx + dy * dy < (arr[:, 2] + vehicle_radius) ** 2)[0]
+
+
+def check_wrap(arr, side, rng, n=2000):
+    """Queries hugging the edges and corners of a wrapped world must match brute force; returns hits/query."""
+    grid = ObstacleGrid(arr, world=(side, side))
+    near = rng.uniform(-grid.cell, grid.cell, (n, 2)) % side  # within reach of an edge on both axes
+    along = np.column_stack((near[:, 0], rng.uniform(0, side, n)))  # within reach of a vertical edge
+    hits = 0
+    for x, y in np.concatenate((near, along)):
+        got = sorted((grid.ox[i], grid.oy[i]) for i in grid.query(x, y))
+        ref = sorted(map(tuple, arr[brute_force_query(arr, x, y, grid.vehicle_radius, grid.world), :2]))
+        assert got == ref, "wrapped grid and brute force disagree"
+        hits += len(got)
+    return hits / (2 * n)
+
+
+def bench(counts, queries=20000, density=8 / (900 * 600), seed=0):
+    """Per-query cost vs obstacle count at constant density (the world grows with the count)."""
+    rng = np.random.default_rng(seed)
+    print(f"{'obstacles':>10} {'world':>13} {'build ms':>9} {'grid us/q':>10} {'brute us/q':>11} {'hits/q':>7} {'edge hits/q':>12}")
+    for n in counts:
+        side = math.sqrt(n / density)
+        arr = np.column_stack((rng.uniform(0, side, n), rng.uniform(0, side, n), rng.uniform(20, 40, n)))
+        t0 = time.perf_counter()
+        grid = ObstacleGrid(arr)
+        build = time.perf_counter() - t0
+        pts = rng.uniform(0, side, (queries, 2))
+        t0 = time.perf_counter()
+        hits = 0
+        for x, y in pts:
+            hits += len(grid.query(x, y))
+        t_grid = (time.perf_counter() - t0) / queries
+        nb = min(queries, 2000)
+        t0 = time.perf_counter()
+        ref = 0
+        for x, y in pts[:nb]:
+            ref += len(brute_force_query(arr, x, y, grid.vehicle_radius))
+        t_brute = (time.perf_counter() - t0) / nb
+        check = sum(len(grid.query(x, y)) for x, y in pts[:nb])
+        assert check == ref, "grid and brute force disagree"
+        edge = check_wrap(arr, side, rng, nb)
+        print(f"{n:>10} {side:>6.0f}x{side:<6.0f} {build * 1000:>9.2f} {t_grid * 1e6:>10.2f} "
+              f"{t_brute * 1e6:>11.2f} {hits / queries:>7.3f} {edge:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Obstacle grid query benchmark")
+    parser.add_argument("--counts", default="10,100,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--density", type=float, default=8 / (900 * 600), help="Obstacles per px^2 (default: rov2d's 8 in 900x600)")
+    args = parser.parse_args()
+    bench([int(c) for c in args.counts.split(",")], args.queries, args.density)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Background video recording of rendered sim frames.
+
+The sim loop only hands frames to a bounded queue; an encoder thread writes
+them with cv2.VideoWriter or pipes raw BGR frames into ffmpeg. When the queue
+is full the frame is either dropped (`policy="drop"`, keeps the sim loop
+real-time) or the caller waits (`policy="block"`, for headless/batch runs
+where every frame must land in the file).
+"""
+import queue
+import subprocess
+import threading
+import time
+
+
+class FrameRecorder(threading.Thread):
+    def __init__(self, path, fps, queue_size=64, policy="drop", fourcc="mp4v", ffmpeg=False):
+        super().__init__(daemon=True)
+        if policy not in ("drop", "block"):
+            raise ValueError(f"unknown record policy: {policy}")
+        self.path = path
+        self.fps = float(fps)
+        self.policy = policy
+        self.fourcc = fourcc
+        self.ffmpeg = ffmpeg
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.max_backlog = 0
+        self.encode_time = 0.0
+        self.error = None
+        self._writer = None
+        self._proc = None
+
+    def submit(self, frame):
+        """Queue a frame (must not be modified afterwards). Returns False if it was dropped."""
+        if self.error is not None:
+            return False
+        self.submitted += 1
+        try:
+            if self.policy == "block":
+                self.queue.put(frame)
+            else:
+                self.queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.max_backlog = max(self.max_backlog, self.queue.qsize())
+        return True
+
+    def backlog(self):
+        return self.queue.qsize()
+
+    def _open(self, frame):
+        h, w = frame.shape[:2]
+        if self.ffmpeg:
+            self._proc = subprocess.Popen([
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", f"{self.fps:g}", "-i", "-",
+                "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", self.path,
+            ], stdin=subprocess.PIPE)
+        else:
+            import cv2
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (w, h))
+            if not self._writer.isOpened():
+                raise RuntimeError(f"VideoWriter could not open {self.path}")
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue  # keep draining so blocked producers are released
+            t0 = time.perf_counter()
+            try:
+                if self._writer is None and self._proc is None:
+                    self._open(frame)
+                if self._proc is not None:
+                    self._proc.stdin.write(frame.tobytes())
+                else:
+                    self._writer.write(frame)
+                self.written += 1
+            except Exception as e:
+                self.error = e
+            self.encode_time += time.perf_counter() - t0
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self._writer is not None:
+            self._writer.release()
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except Exception:
+                pass
+            self._proc.wait()
+
+    def report(self):
+        per = self.encode_time / self.written * 1000.0 if self.written else 0.0
+        msg = (f"recorder: {self.written}/{self.submitted} frames → {self.path}  dropped {self.dropped}  "
+               f"backlog {self.backlog()} (max {self.max_backlog}/{self.queue.maxsize})  encode {per:.2f} ms/frame")
+        if self.error is not None:
+            msg += f"  ERROR: {self.error}"
+        return msg
+
+
+def add_record_args(parser):
+    parser.add_argument("--record", default=None, help="Record rendered frames to this video file")
+    parser.add_argument("--record_fps", type=float, default=0.0, help="Headless recording rate (0 = --render_hz); live runs record every displayed frame")
+    parser.add_argument("--record_queue", type=int, default=64, help="Max frames waiting for the encoder")
+    parser.add_argument("--record_policy", choices=["drop", "block"], default=None,
+                        help="When the encoder falls behind: drop frames (live default) or block (headless default)")
+    parser.add_argument("--record_ffmpeg", action="store_true", help="Encode with an ffmpeg pipe (libx264) instead of cv2.VideoWriter")
+
+
+def recorder_from_args(args, fps, policy="drop", exact_fps=False):
+    """Start a recorder for --record, or return None. `fps` is the fallback rate (used as-is if exact_fps)."""
+    if not args.record:
+        return None
+    rate = fps if exact_fps else (args.record_fps or fps)
+    rec = FrameRecorder(args.record, rate, args.record_queue,
+                        args.record_policy or policy, ffmpeg=args.record_ffmpeg)
+    rec.start()
+    return rec
@@ -1,43 +1,18 @@
-import socket
 import time
 import math
-import threading
 from collections import deque
 import argparse
 
 import cv2
 import numpy as np
 
-
-class UdpCommandServer(threading.Thread):
-    def __init__(self, host: str = "127.0.0.1", port: int = 5005):
-        super().__init__(daemon=True)
-        self.host = host
-        self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind((self.host, self.port))
-        self.queue = deque(maxlen=10)
-        self.running = True
-
-    def run(self):
-        while self.running:
-            try:
-                data, _ = self.sock.recvfrom(1024)
-                self.queue.append(data.decode("utf-8", errors="ignore").strip())
-            except Exception:
-                time.sleep(0.01)
-
-    def get_latest(self):
-        if not self.queue:
-            return None
-        return self.queue.pop()
-
-    def stop(self):
-        self.running = False
-        try:
-            self.sock.close()
-        except Exception:
-            pass
+from command_server import UdpCommandServer
+from compositor import Compositor
+from dynamics import INTEGRATORS, RovParams, RovState, integrate
+from executive import Executive
+from obstacles import ObstacleGrid, load_obstacles, make_obstacles
+from recorder import add_record_args, recorder_from_args
+from telemetry import TelemetryPublisher, add_telemetry_args
 
 
 def parse_cmd(line: str):
@@ -81,218 +56,367 @@ def draw_arrow(img, x, y, angle, length=50, color=(0, 255, 0), thickness=2):
     cv2.arrowedLine(img, (int(x), int(y)), (end_x, end_y), color, thickness, tipLength=0.25)
 
 
+class CommandState:
+    """Latched operator command: last CMD/SPEED and last VEL vector."""
+
+    def __init__(self, speed=60):
+        self.cmd = "(none)"
+        self.speed = speed
+        self.vel_cmd = [0, 0, 0, 0]
+
+    def apply(self, line):
+        if not line:
+            return
+        v = parse_vel(line)
+        if v is not None:
+            self.vel_cmd = v
+            self.cmd = '(VEL)'
+            return
+        c, s = parse_cmd(line)
+        if c is not None:
+            self.cmd = c
+            self.speed = s
+            self.vel_cmd = [0, 0, 0, 0]
+
+    def inputs(self, p: RovParams):
+        """Return (fwd_acc, sway_acc, heave_acc, yaw_input) from either VEL or discrete CMD."""
+        fwd_acc = 0.0
+        sway_acc = 0.0
+        heave_acc = 0.0
+        yaw_input = 0.0
+        if any(self.vel_cmd):
+            surge, sway, heave, yaw = self.vel_cmd
+            fwd_acc = (surge / 100.0) * p.max_fwd_acc
+            sway_acc = (sway / 100.0) * p.max_fwd_acc * p.sway_acc_ratio
+            heave_acc = (heave / 100.0) * p.max_fwd_acc * p.heave_acc_ratio
+            yaw_input = (yaw / 100.0) * p.max_yaw_rate
+        elif self.cmd == 'F':
+            fwd_acc = (self.speed / 100.0) * p.max_fwd_acc
+        elif self.cmd == 'L':
+            yaw_input = -(self.speed / 100.0) * p.max_yaw_rate
+        elif self.cmd == 'R':
+            yaw_input = (self.speed / 100.0) * p.max_yaw_rate
+        # 'S' or None → no thrust
+        return fwd_acc, sway_acc, heave_acc, yaw_input
+
+
+def step_dynamics(s: RovState, p: RovParams, u, dt, width, height, method="euler", substeps=1, grid=None):
+    integrate(s, p, u, dt, method, substeps)
+
+    # Vertical (depth)
+    if s.depth < 0:
+        s.depth = 0.0; s.vdepth = 0.0
+
+    # Boundaries wrap-around
+    wrap(s, width, height)
+
+    # Obstacle contacts (ObstacleGrid) on the wrapped position; a push-out may cross an edge again
+    contact = False
+    if grid is not None:
+        contact = grid.collide(s)
+        if contact:
+            wrap(s, width, height)
+    return contact
+
+
+def wrap(s: RovState, width, height):
+    if s.pos[0] < 0: s.pos[0] += width
+    if s.pos[0] > width: s.pos[0] -= width
+    if s.pos[1] < 0: s.pos[1] += height
+    if s.pos[1] > height: s.pos[1] -= height
+
+
+def scene_obstacles(args):
+    """Obstacles from --obstacle_file, or --obstacle_count random ones with --obstacles; plus their grid."""
+    if args.obstacle_file:
+        obstacles = load_obstacles(args.obstacle_file)
+    elif args.obstacles:
+        obstacles = make_obstacles(args.width, args.height, args.obstacle_count)
+    else:
+        return [], None
+    return obstacles, ObstacleGrid(obstacles, args.vehicle_radius, args.restitution, world=(args.width, args.height))
+
+
+def make_compositor(args, obstacles):
+    """Static layers (obstacles, fixed HUD lines) are drawn once per window size."""
+    comp = Compositor()
+
+    @comp.add_static
+    def draw_static(img):
+        for (ox, oy, orad) in obstacles:
+            cv2.circle(img, (int(ox), int(oy)), int(orad), (80, 80, 80), thickness=2)
+        static_hud = [
+            f"Listen UDP {args.listen_host}:{args.listen_port}  |  Press 'q' to quit",
+            f"Keys: W/A/D drive, S stop, +/- speed  |  trail={args.trail} obstacles={bool(obstacles)}",
+        ]
+        y0 = 20 + 3 * 24
+        for line in static_hud:
+            cv2.putText(img, line, (16, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+            y0 += 24
+
+    return comp
+
+
+def draw_scene(img, state: RovState, ctrl: CommandState, trail=None, contact=False):
+    """Dynamic layers: body, trail, heading arrow and the live HUD lines."""
+    pos, vel, heading = state.pos, state.vel, state.heading
+
+    # Body
+    body_len = 40
+    body_w = 20
+    pts = np.array([
+        [ body_len,  0],
+        [-body_len, -body_w],
+        [-body_len,  body_w],
+    ], dtype=float)
+    ca, sa = math.cos(heading), math.sin(heading)
+    rot = np.array([[ca, -sa],[sa, ca]])
+    pts_rot = (pts @ rot.T) + pos
+    cv2.fillPoly(img, [pts_rot.astype(int)], (60, 60, 230) if contact else (80, 160, 255))
+
+    # Trail
+    if trail is not None:
+        trail.append((int(pos[0]), int(pos[1])))
+        if len(trail) > 2:
+            cv2.polylines(img, [np.array(trail, dtype=np.int32)], isClosed=False, color=(0, 200, 200), thickness=2)
+
+    draw_arrow(img, pos[0], pos[1], heading, 60, (0, 255, 0), 2)
+
+    hud = [
+        f"CMD: {ctrl.cmd}  SPEED: {ctrl.speed}  VEL:{ctrl.vel_cmd}",
+        f"POS: ({pos[0]:.1f}, {pos[1]:.1f})  V: ({vel[0]:.1f},{vel[1]:.1f})  DEPTH:{state.depth:.2f} vZ:{state.vdepth:.2f}",
+        f"HDG: {math.degrees(heading)%360:.1f} deg  YawRate: {math.degrees(state.yaw_rate):.1f} deg/s",
+    ]
+    y0 = 20
+    for line in hud:
+        cv2.putText(img, line, (16, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+        y0 += 24
+
+
+def load_script(path):
+    """Read a timestamped command script: one `<t_seconds> <CMD...|VEL...>` per line, '#' comments."""
+    script = []
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.split("#", 1)[0].strip()
+            if not line:
+                continue
+            t, msg = line.split(None, 1)
+            script.append((float(t), msg.strip()))
+    script.sort(key=lambda e: e[0])
+    return script
+
+
+TRAJ_COLUMNS = ("t", "x", "y", "depth", "heading", "vx", "vy", "vdepth", "yaw_rate")
+
+
+def run_headless(script, steps, dt, params: RovParams, width=900, height=600, state: RovState = None,
+                 method="euler", substeps=1, frame_every=0, on_frame=None, grid=None):
+    """Advance the 2D dynamics `steps` times with a fixed `dt`, no display and no wall clock.
+
+    `script` is a list of (t, line) sorted by t; every line whose t <= sim time is applied
+    before the step. `grid` (ObstacleGrid) adds obstacle collisions. If `on_frame` is given it is called as on_frame(state, ctrl, t) every
+    `frame_every` steps (e.g. to render/record). Returns an array of shape (steps + 1, len(TRAJ_COLUMNS)).
+    """
+    s = state if state is not None else RovState(width / 2.0, height / 2.0)
+    ctrl = CommandState()
+    traj = np.empty((steps + 1, len(TRAJ_COLUMNS)), dtype=float)
+    traj[0] = (0.0, s.pos[0], s.pos[1], s.depth, s.heading, s.vel[0], s.vel[1], s.vdepth, s.yaw_rate)
+    k = 0
+    for i in range(steps):
+        t = i * dt
+        while k < len(script) and script[k][0] <= t:
+            ctrl.apply(script[k][1])
+            k += 1
+        step_dynamics(s, params, ctrl.inputs(params), dt, width, height, method, substeps, grid)
+        traj[i + 1] = ((i + 1) * dt, s.pos[0], s.pos[1], s.depth, s.heading, s.vel[0], s.vel[1], s.vdepth, s.yaw_rate)
+        if on_frame is not None and (i + 1) % frame_every == 0:
+            on_frame(s, ctrl, (i + 1) * dt)
+    return traj
+
+
+def save_trajectory(path, traj):
+    if path.endswith(".npz"):
+        np.savez_compressed(path, **{name: traj[:, i] for i, name in enumerate(TRAJ_COLUMNS)})
+    else:
+        np.savetxt(path, traj, delimiter=",", header=",".join(TRAJ_COLUMNS), comments="", fmt="%.6f")
+
+
+def headless_main(args):
+    params = RovParams(args.max_acc, args.max_yaw, args.lin_drag, args.yaw_drag)
+    script = load_script(args.script) if args.script else []
+    steps = args.steps if args.steps > 0 else int(round(args.duration / args.dt))
+    # Optional recording: render a frame every 1/record_fps of *simulated* time
+    # (rounded to a whole number of steps; the file is tagged with the resulting rate)
+    frame_every = max(1, int(round(1.0 / ((args.record_fps or args.render_hz) * args.dt))))
+    rec = recorder_from_args(args, 1.0 / (frame_every * args.dt), policy="block", exact_fps=True)
+    obstacles, grid = scene_obstacles(args)
+    on_frame = None
+    if rec is not None:
+        comp = make_compositor(args, obstacles)
+        trail = deque(maxlen=500) if args.trail else None
+
+        def record_frame(s, ctrl, t):
+            img = comp.frame(args.width, args.height)
+            draw_scene(img, s, ctrl, trail, grid is not None and bool(grid.query(*s.pos)))
+            rec.submit(img)
+        on_frame = record_frame
+
+    t0 = time.perf_counter()
+    traj = run_headless(script, steps, args.dt, params, args.width, args.height,
+                        method=args.integrator, substeps=args.substeps, frame_every=frame_every, on_frame=on_frame,
+                        grid=grid)
+    if rec is not None:
+        rec.close()
+    wall = time.perf_counter() - t0
+    sim_t = steps * args.dt
+    print(f"headless: {steps} steps, dt={args.dt}s ({args.integrator} x{args.substeps}), sim {sim_t:.1f}s in {wall:.3f}s wall "
+          f"({steps / max(wall, 1e-9):.0f} steps/s, x{sim_t / max(wall, 1e-9):.0f} real time)")
+    last = traj[-1]
+    if grid is not None:
+        print(f"obstacles: {grid.n}, contact in {grid.hits} steps")
+    print(f"final: POS ({last[1]:.1f}, {last[2]:.1f})  DEPTH {last[3]:.2f}  HDG {math.degrees(last[4]) % 360:.1f} deg")
+    if args.out:
+        save_trajectory(args.out, traj)
+        print(f"trajectory → {args.out}")
+    if rec is not None:
+        print(rec.report())
+
+
 def main():
     parser = argparse.ArgumentParser(description="AKINTAY 2D ROV Simulator")
     parser.add_argument("--listen_host", default="127.0.0.1", help="UDP listen host for control")
     parser.add_argument("--listen_port", type=int, default=5005, help="UDP listen port for control")
     parser.add_argument("--keyboard", action="store_true", help="Enable keyboard control (W/A/D to drive, S to stop, +/- speed)")
     parser.add_argument("--trail", action="store_true", help="Draw motion trail")
-    parser.add_argument("--obstacles", action="store_true", help="Add static circular obstacles")
+    parser.add_argument("--obstacles", action="store_true", help="Add static circular obstacles (collide with the vehicle)")
+    parser.add_argument("--obstacle_count", type=int, default=8, help="Random obstacles with --obstacles")
+    parser.add_argument("--obstacle_file", default=None, help="Load obstacles from a file ('x y r' per line or .npy)")
+    parser.add_argument("--vehicle_radius", type=float, default=22.0, help="Vehicle collision radius (px)")
+    parser.add_argument("--restitution", type=float, default=0.3, help="Bounce factor of the normal velocity on contact (0..1)")
     parser.add_argument("--telemetry", action="store_true", help="Enable UDP telemetry broadcast of pose")
     parser.add_argument("--telemetry_host", default="127.0.0.1", help="Telemetry UDP host")
     parser.add_argument("--telemetry_port", type=int, default=5006, help="Telemetry UDP port")
+    add_telemetry_args(parser)
     parser.add_argument("--width", type=int, default=900, help="Window width")
     parser.add_argument("--height", type=int, default=600, help="Window height")
     parser.add_argument("--max_acc", type=float, default=120.0, help="Max forward acceleration (px/s^2) at speed=100")
     parser.add_argument("--max_yaw", type=float, default=60.0, help="Max yaw rate (deg/s) at speed=100")
     parser.add_argument("--lin_drag", type=float, default=0.8, help="Linear drag (1/s)")
     parser.add_argument("--yaw_drag", type=float, default=1.0, help="Yaw drag (1/s)")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="euler", help="Dynamics integrator")
+    parser.add_argument("--substeps", type=int, default=1, help="Integrator sub-steps per physics step")
+    parser.add_argument("--physics_hz", type=float, default=500.0, help="Fixed physics rate (Hz)")
+    parser.add_argument("--render_hz", type=float, default=60.0, help="Display rate (Hz)")
+    parser.add_argument("--telemetry_hz", type=float, default=30.0, help="Telemetry publish rate (Hz)")
+    parser.add_argument("--exec_stats", type=float, default=0.0, help="Print rate/jitter stats every N seconds (0 = only at exit)")
+    parser.add_argument("--headless", action="store_true", help="No window/UDP: run a fixed-step batch as fast as possible")
+    parser.add_argument("--dt", type=float, default=0.01, help="Headless fixed timestep (s)")
+    parser.add_argument("--steps", type=int, default=0, help="Headless step count (overrides --duration)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Headless simulated duration (s)")
+    parser.add_argument("--script", default=None, help="Headless command script: '<t> CMD:..|VEL:..' per line")
+    parser.add_argument("--out", default=None, help="Headless trajectory output (.csv or .npz)")
+    add_record_args(parser)
     args = parser.parse_args()
 
+    if args.headless:
+        headless_main(args)
+        return
+
     server = UdpCommandServer(args.listen_host, args.listen_port)
     server.start()
 
     width, height = args.width, args.height
-    center = np.array([width // 2, height // 2], dtype=float)
 
     # State
-    pos = center.copy()
-    vel = np.zeros(2, dtype=float)
-    heading = -math.pi / 2  # up
-    yaw_rate = 0.0
-    depth = 0.0  # positive down (m, abstract)
-    vdepth = 0.0
-
-    # Parameters
-    max_fwd_acc = float(args.max_acc)  # px/s^2 at speed=100 (surge)
-    max_yaw_rate = math.radians(float(args.max_yaw))  # rad/s at speed=100
-    lin_drag = float(args.lin_drag)  # per second (xy)
-    yaw_drag = float(args.yaw_drag)  # per second
-    sway_acc_ratio = 0.8  # sway slightly weaker than surge
-    heave_acc_ratio = 0.6  # vertical weaker
-    depth_drag = 0.8
-    buoyancy_bias = 0.0  # 0 neutral, >0 sinks, <0 floats
-
-    last_cmd = "(none)"
-    last_speed = 60  # default keyboard speed
-    last_time = time.time()
-    last_vel_cmd = [0, 0, 0, 0]
+    state = RovState(width // 2, height // 2)
+    params = RovParams(args.max_acc, args.max_yaw, args.lin_drag, args.yaw_drag)
+    ctrl = CommandState(speed=60)  # default keyboard speed
 
     # Trail
-    trail = deque(maxlen=500)
-
-    # Obstacles
-    rng = np.random.default_rng(42)
-    obstacles = []
-    if args.obstacles:
-        for _ in range(8):
-            x = float(rng.integers(60, width - 60))
-            y = float(rng.integers(60, height - 60))
-            r = float(rng.integers(20, 40))
-            obstacles.append((x, y, r))
-
-    # Telemetry socket
-    tele_sock = None
-    tele_addr = None
+    trail = deque(maxlen=500) if args.trail else None
+
+    # Obstacles (random or from a file) with a grid index for collisions
+    obstacles, grid = scene_obstacles(args)
+    contact = False
+
+    # Static layers are drawn once
+    comp = make_compositor(args, obstacles)
+
+    # Recording goes through a bounded queue to an encoder thread
+    rec = recorder_from_args(args, args.render_hz, exact_fps=True)
+
+    # Telemetry publisher
+    tele = None
     if args.telemetry:
-        tele_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        tele_addr = (args.telemetry_host, args.telemetry_port)
+        tele = TelemetryPublisher(args.telemetry_host, args.telemetry_port, args.telemetry_format)
+
+    # Physics, render and telemetry each run at their own rate
+    ex = Executive()
+    physics = ex.add("physics", args.physics_hz, catchup=True)
+    render = ex.add("render", args.render_hz)
+    telemetry = ex.add("telemetry", args.telemetry_hz) if tele is not None else None
+    next_stats = args.exec_stats
 
     try:
         while True:
-            now = time.time()
-            dt = max(1e-3, min(0.05, now - last_time))
-            last_time = now
-
-            # Handle incoming command
-            line = server.get_latest()
-            if line:
-                v = parse_vel(line)
-                if v is not None:
-                    last_vel_cmd = v
-                    last_cmd = '(VEL)'
-                else:
-                    c, s = parse_cmd(line)
-                    if c is not None:
-                        last_cmd = c
-                        last_speed = s
-                        last_vel_cmd = [0, 0, 0, 0]
-
-            # Keyboard override (if enabled)
-            key = cv2.waitKey(1) & 0xFF
-            if args.keyboard:
-                if key in (ord('w'), ord('W')):
-                    last_cmd = 'F'
-                elif key in (ord('a'), ord('A')):
-                    last_cmd = 'L'
-                elif key in (ord('d'), ord('D')):
-                    last_cmd = 'R'
-                elif key in (ord('s'), ord('S')):
-                    last_cmd = 'S'
-                elif key in (ord('+'), ord('=')):
-                    last_speed = min(100, last_speed + 5)
-                elif key in (ord('-'), ord('_')):
-                    last_speed = max(0, last_speed - 5)
-                elif key == ord('q'):
-                    break
-
-            # Compute control inputs from either VEL or discrete CMD
-            fwd_acc = 0.0
-            sway_acc = 0.0
-            heave_acc = 0.0
-            yaw_input = 0.0
-            if any(last_vel_cmd):
-                surge, sway, heave, yaw = last_vel_cmd
-                fwd_acc = (surge / 100.0) * max_fwd_acc
-                sway_acc = (sway / 100.0) * max_fwd_acc * sway_acc_ratio
-                heave_acc = (heave / 100.0) * max_fwd_acc * heave_acc_ratio
-                yaw_input = (yaw / 100.0) * max_yaw_rate
-            else:
-                if last_cmd == 'F':
-                    fwd_acc = (last_speed / 100.0) * max_fwd_acc
-                elif last_cmd == 'L':
-                    yaw_input = -(last_speed / 100.0) * max_yaw_rate
-                elif last_cmd == 'R':
-                    yaw_input = (last_speed / 100.0) * max_yaw_rate
-                else:
-                    # 'S' or None → no thrust
-                    pass
-
-            # Update yaw/heading
-            yaw_rate += (yaw_input - yaw_drag * yaw_rate) * dt
-            heading += yaw_rate * dt
-
-            # Accelerations in world frame (surge + sway)
-            forward = np.array([math.cos(heading), math.sin(heading)])
-            left = np.array([-math.sin(heading), math.cos(heading)])
-            acc_world = forward * fwd_acc + left * sway_acc
-            vel += (acc_world - lin_drag * vel) * dt
-            pos += vel * dt
-
-            # Vertical (depth)
-            vdepth += (heave_acc + buoyancy_bias - depth_drag * vdepth) * dt
-            depth += vdepth * dt
-            if depth < 0:
-                depth = 0; vdepth = 0
-
-            # Boundaries wrap-around
-            if pos[0] < 0: pos[0] += width
-            if pos[0] > width: pos[0] -= width
-            if pos[1] < 0: pos[1] += height
-            if pos[1] > height: pos[1] -= height
-
-            # Render
-            img = np.zeros((height, width, 3), dtype=np.uint8)
-
-            # Obstacles
-            if obstacles:
-                for (ox, oy, orad) in obstacles:
-                    cv2.circle(img, (int(ox), int(oy)), int(orad), (80, 80, 80), thickness=2)
-            # Body
-            body_len = 40
-            body_w = 20
-            pts = np.array([
-                [ body_len,  0],
-                [-body_len, -body_w],
-                [-body_len,  body_w],
-            ], dtype=float)
-            ca, sa = math.cos(heading), math.sin(heading)
-            rot = np.array([[ca, -sa],[sa, ca]])
-            pts_rot = (pts @ rot.T) + pos
-            cv2.fillPoly(img, [pts_rot.astype(int)], (80, 160, 255))
-
-            # Trail
-            if args.trail:
-                trail.append((int(pos[0]), int(pos[1])))
-                if len(trail) > 2:
-                    cv2.polylines(img, [np.array(trail, dtype=np.int32)], isClosed=False, color=(0, 200, 200), thickness=2)
-
-            draw_arrow(img, pos[0], pos[1], heading, 60, (0, 255, 0), 2)
-
-            hud = [
-                f"CMD: {last_cmd}  SPEED: {last_speed}  VEL:{last_vel_cmd}",
-                f"POS: ({pos[0]:.1f}, {pos[1]:.1f})  V: ({vel[0]:.1f},{vel[1]:.1f})  DEPTH:{depth:.2f} vZ:{vdepth:.2f}",
-                f"HDG: {math.degrees(heading)%360:.1f} deg  YawRate: {math.degrees(yaw_rate):.1f} deg/s",
-                f"Listen UDP {args.listen_host}:{args.listen_port}  |  Press 'q' to quit",
-                f"Keys: W/A/D drive, S stop, +/- speed  |  trail={args.trail} obstacles={bool(obstacles)}",
-            ]
-            y0 = 20
-            for line in hud:
-                cv2.putText(img, line, (16, y0), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
-                y0 += 24
-
-            cv2.imshow("AKINTAY ROV 2D SIM", img)
-
-            # Telemetry (JSON)
-            if tele_sock is not None:
-                import json
-                tele = {
-                    "pos": {"x": float(pos[0]), "y": float(pos[1]), "z": float(depth)},
-                    "vel": {"x": float(vel[0]), "y": float(vel[1]), "z": float(vdepth)},
-                    "yaw_deg": float((math.degrees(heading) % 360.0)),
-                    "cmd": last_cmd,
-                    "speed": int(last_speed),
-                    "vel_cmd": list(map(int, last_vel_cmd)),
-                }
-                msg = (json.dumps(tele) + "\n").encode("ascii")
-                tele_sock.sendto(msg, tele_addr)
+            task = ex.wait_next()
+
+            if task is physics:
+                # Handle incoming command, then one fixed step
+                ctrl.apply(server.get_latest())
+                contact = step_dynamics(state, params, ctrl.inputs(params), physics.period, width, height,
+                                        args.integrator, args.substeps, grid)
+
+            elif task is render:
+                # Render: cached static layers, then the dynamic ones
+                img = comp.frame(width, height)
+                draw_scene(img, state, ctrl, trail, contact)
+
+                cv2.imshow("AKINTAY ROV 2D SIM", img)
+                if rec is not None:
+                    rec.submit(img)
+
+                # Keyboard override (if enabled); waitKey also pumps the window
+                key = cv2.waitKey(1) & 0xFF
+                if args.keyboard:
+                    if key in (ord('w'), ord('W')):
+                        ctrl.cmd = 'F'
+                    elif key in (ord('a'), ord('A')):
+                        ctrl.cmd = 'L'
+                    elif key in (ord('d'), ord('D')):
+                        ctrl.cmd = 'R'
+                    elif key in (ord('s'), ord('S')):
+                        ctrl.cmd = 'S'
+                    elif key in (ord('+'), ord('=')):
+                        ctrl.speed = min(100, ctrl.speed + 5)
+                    elif key in (ord('-'), ord('_')):
+                        ctrl.speed = max(0, ctrl.speed - 5)
+                    elif key == ord('q'):
+                        break
+
+                if args.exec_stats > 0 and ex.elapsed() >= next_stats:
+                    print(ex.report())
+                    if rec is not None:
+                        print(rec.report())
+                    next_stats += args.exec_stats
+
+            elif task is telemetry:
+                tele.publish(state.pos, state.depth, math.degrees(state.heading) % 360.0,
+                             vel=state.vel, vdepth=state.vdepth, cmd=ctrl.cmd, speed=ctrl.speed,
+                             vel_cmd=ctrl.vel_cmd)
 
     finally:
         server.stop()
+        if tele is not None:
+            tele.close()
         cv2.destroyAllWindows()
+        print(ex.report())
+        print(server.report())
+        if rec is not None:
+            rec.close()
+            print(rec.report())
 
 
 if __name__ == "__main__":
     main()
-
-
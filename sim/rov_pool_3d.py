@@ -2,6 +2,7 @@
 
 Usage:
   python rov_pool_3d.py --keyboard --telemetry
+  python rov_pool_3d.py --camera forward   # + vision_control.py --shm akintay_cam --no_serial --udp
 
 Controls (keyboard mode):
   W/A/D : forward / left / right (yaw)
@@ -13,47 +14,23 @@ Controls (keyboard mode):
 This script receives the same UDP commands as the other sims (CMD:/VEL) and
 visualizes a pseudo-3D AUV: depth affects vertical screen position and scale,
 and shadow/blur show proximity to pool floor.
+
+With --camera, an onboard forward or downward view is rendered at --camera_hz
+straight into a shared-memory ring (shm_camera.py), so vision_control.py can
+drive the sim closed-loop without encoding or copying frames between processes.
 """
 import argparse
 import math
-import time
-import threading
-import socket
-import json
 import numpy as np
 import cv2
-from collections import deque
-
-
-class UdpCommandServer(threading.Thread):
-    def __init__(self, host: str = "127.0.0.1", port: int = 5005):
-        super().__init__(daemon=True)
-        self.host = host
-        self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind((self.host, self.port))
-        self.queue = deque(maxlen=20)
-        self.running = True
-
-    def run(self):
-        while self.running:
-            try:
-                data, _ = self.sock.recvfrom(1024)
-                self.queue.append(data.decode("utf-8", errors="ignore").strip())
-            except Exception:
-                time.sleep(0.01)
-
-    def get_latest(self):
-        if not self.queue:
-            return None
-        return self.queue.pop()
-
-    def stop(self):
-        self.running = False
-        try:
-            self.sock.close()
-        except Exception:
-            pass
+
+from command_server import UdpCommandServer
+from compositor import Compositor
+from dynamics import INTEGRATORS, RovParams, RovState, integrate
+from executive import Executive
+from recorder import add_record_args, recorder_from_args
+from shm_camera import FrameRingWriter
+from telemetry import TelemetryPublisher, add_telemetry_args
 
 
 def parse_vel(line: str):
@@ -164,10 +141,115 @@ def draw_shadow(img, screen_x, screen_y, scale, depth, floor_y):
     r = int(30 * scale + 40*(1-prox))
     sx = int(screen_x)
     sy = int(floor_y)
-    overlay = img.copy()
+    # blend only the ellipse bounding box instead of a full-frame copy
+    h, w = img.shape[:2]
+    x0, x1 = max(0, sx - r - 1), min(w, sx + r + 2)
+    y0, y1 = max(0, sy - int(r*0.5) - 1), min(h, sy + int(r*0.5) + 2)
+    if x0 >= x1 or y0 >= y1:
+        return
+    roi = img[y0:y1, x0:x1]
+    overlay = roi.copy()
     alpha = 0.25 + 0.5*(1-prox)
-    cv2.ellipse(overlay, (sx, sy), (r, int(r*0.5)), 0, 0, 360, (10, 20, 30), -1)
-    cv2.addWeighted(overlay, alpha, img, 1-alpha, 0, img)
+    cv2.ellipse(overlay, (sx - x0, sy - y0), (r, int(r*0.5)), 0, 0, 360, (10, 20, 30), -1)
+    cv2.addWeighted(overlay, alpha, roi, 1-alpha, 0, roi)
+
+
+# dark floor markers / posts (x, y, r) in world units for the onboard camera; V < 50, so vision_control's
+# mask detectors (blob/external, the default with --shm) find them; the Canny contour detector mostly does not
+# a slalom ahead of the start pose (heading is "up", -y)
+CAMERA_MARKERS = [(30.0, -120.0, 22.0), (-100.0, -400.0, 22.0), (80.0, -700.0, 22.0), (-60.0, -1000.0, 22.0)]
+MARKER_COLOR = np.array([30, 25, 25], dtype=float)
+
+
+class OnboardCamera:
+    """Renders the vehicle's forward or downward view into a caller-supplied frame (e.g. a shared-memory slot).
+
+    forward: pinhole view along the heading; water above the horizon, fogged
+             floor below, markers as posts standing on the floor.
+    down:    floor texture under the vehicle, forward = image up, zoom from
+             the height above the floor.
+    """
+
+    def __init__(self, width, height, mode, max_depth, markers=CAMERA_MARKERS, fog=6000.0):
+        self.width, self.height, self.mode = width, height, mode
+        self.max_depth = max_depth
+        self.markers = np.array(markers, dtype=float).reshape(-1, 3)
+        self.fog = fog
+        self.cx, self.cy = (width - 1) / 2.0, (height - 1) / 2.0
+        if mode == "forward":
+            self.f = 0.8 * width
+            self.post_h = 190.0  # posts reach almost to the surface
+            self.rows = np.arange(height, dtype=float) - self.cy
+        else:
+            self.f = 0.5 * width
+            self.tex_half = 1024
+            self.texture = self._floor_texture()
+
+    def _floor_texture(self):
+        n = 2 * self.tex_half
+        rng = np.random.RandomState(42)
+        noise = (rng.rand(n, n) * 40).astype(np.uint8)
+        tex = np.empty((n, n, 3), dtype=np.uint8)
+        tex[:, :, 0] = 150 + noise
+        tex[:, :, 1] = 140 + noise // 2
+        tex[:, :, 2] = 110 + noise // 3
+        for lx in range(-self.tex_half, self.tex_half, 200):  # lane lines every 200 units
+            cv2.line(tex, (lx + self.tex_half, 0), (lx + self.tex_half, n - 1), (100, 110, 120), 3)
+        for x, y, r in self.markers:
+            cv2.circle(tex, (int(x) + self.tex_half, int(y) + self.tex_half), int(r), MARKER_COLOR.tolist(), -1)
+        return tex
+
+    def water(self, depth):
+        """Water colour (BGR floats) at this depth: darker deeper."""
+        k = 1.0 - 0.4 * depth / self.max_depth
+        return np.array([200.0, 150.0, 90.0]) * k
+
+    def render(self, out, pos, heading, depth):
+        if self.mode == "forward":
+            self._render_forward(out, pos, heading, depth)
+        else:
+            self._render_down(out, pos, heading, depth)
+
+    def _render_forward(self, out, pos, heading, depth):
+        water = self.water(depth)
+        sand = np.array([150.0, 140.0, 115.0])
+        # per-row colour: gradient above the horizon, fogged floor below it
+        rows = self.rows
+        col = np.empty((self.height, 3))
+        up = rows <= 0
+        col[up] = water * (1.0 + 0.25 * (-rows[up] / max(self.cy, 1.0)))[:, None]
+        below = ~up
+        dist = self.f * max(self.max_depth - depth, 1.0) / rows[below]
+        k = np.exp(-dist / self.fog)[:, None]
+        col[below] = sand * k + water * (1.0 - k)
+        out[:] = np.clip(col, 0, 255).astype(np.uint8)[:, None, :]
+
+        ca, sa = math.cos(heading), math.sin(heading)
+        rel = self.markers[:, :2] - np.asarray(pos[:2], dtype=float)
+        fwd = rel[:, 0] * ca + rel[:, 1] * sa
+        lat = -rel[:, 0] * sa + rel[:, 1] * ca
+        for i in np.argsort(-fwd):  # far to near
+            d = fwd[i]
+            if d < 10.0:
+                continue
+            u = self.cx + self.f * lat[i] / d
+            half = self.f * self.markers[i, 2] / d
+            v0 = self.cy + self.f * (self.max_depth - self.post_h - depth) / d
+            v1 = self.cy + self.f * (self.max_depth - depth) / d
+            k = math.exp(-d / self.fog)
+            color = (MARKER_COLOR * k + water * (1.0 - k)).tolist()
+            cv2.rectangle(out, (int(u - half), int(v0)), (int(u + half), int(v1)), color, -1)
+
+    def _render_down(self, out, pos, heading, depth):
+        ppu = self.f / max(self.max_depth - depth, 5.0)  # image px per world unit
+        ca, sa = math.cos(heading), math.sin(heading)
+        fx, fy = ca / ppu, sa / ppu  # forward (image up)
+        rx, ry = -sa / ppu, ca / ppu  # right (image right)
+        ox = pos[0] + self.tex_half - self.cx * rx + self.cy * fx
+        oy = pos[1] + self.tex_half - self.cx * ry + self.cy * fy
+        M = np.array([[rx, -fx, ox], [ry, -fy, oy]])
+        cv2.warpAffine(self.texture, M, (self.width, self.height), dst=out,
+                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REFLECT)
 
 
 def main():
@@ -176,8 +258,25 @@ def main():
     parser.add_argument("--listen_port", type=int, default=5005)
     parser.add_argument("--keyboard", action="store_true")
     parser.add_argument("--telemetry", action="store_true")
+    parser.add_argument("--telemetry_host", default="127.0.0.1", help="Telemetry UDP host")
+    parser.add_argument("--telemetry_port", type=int, default=5006, help="Telemetry UDP port")
     parser.add_argument("--width", type=int, default=1000)
     parser.add_argument("--height", type=int, default=700)
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="euler", help="Dynamics integrator")
+    parser.add_argument("--substeps", type=int, default=1, help="Integrator sub-steps per physics step")
+    parser.add_argument("--physics_hz", type=float, default=500.0, help="Fixed physics rate (Hz)")
+    parser.add_argument("--render_hz", type=float, default=60.0, help="Display rate (Hz)")
+    parser.add_argument("--telemetry_hz", type=float, default=30.0, help="Telemetry publish rate (Hz)")
+    add_telemetry_args(parser)
+    parser.add_argument("--exec_stats", type=float, default=0.0, help="Print rate/jitter stats every N seconds (0 = only at exit)")
+    add_record_args(parser)
+    parser.add_argument("--camera", choices=["none", "forward", "down"], default="none",
+                        help="Render an onboard camera into a shared-memory ring (vision_control.py --shm)")
+    parser.add_argument("--camera_size", default="640x480", help="Onboard camera WxH")
+    parser.add_argument("--camera_hz", type=float, default=30.0, help="Onboard camera frame rate")
+    parser.add_argument("--camera_shm", default="akintay_cam", help="Shared-memory ring name")
+    parser.add_argument("--camera_slots", type=int, default=4, help="Frames in the ring")
+    parser.add_argument("--camera_show", action="store_true", help="Also show the onboard camera in a window")
     args = parser.parse_args()
 
     server = UdpCommandServer(args.listen_host, args.listen_port)
@@ -187,155 +286,191 @@ def main():
     # logical world coordinates map to screen: use center
     world_center = np.array([w//2, h//3], dtype=float)
 
-    pos = np.array([0.0, 0.0])  # x,y in world coordinates (relative)
-    vel = np.zeros(2)
-    heading = -math.pi/2
-    yaw_rate = 0.0
+    state = RovState(0.0, 0.0)  # x,y in world coordinates (relative)
+    pos, vel = state.pos, state.vel
 
     depth = 20.0  # meters (0=surface)
     vdepth = 0.0
     max_depth = 200.0
     buoyancy = -5.0  # positive sinks, negative floats (tweakable)
 
-    max_fwd_acc = 160.0
-    max_yaw_rate = math.radians(90)
-    lin_drag = 0.9
-    yaw_drag = 1.0
+    params = RovParams(max_acc=160.0, max_yaw=90.0, lin_drag=0.9, yaw_drag=1.0)
+    params.depth_drag = 0.0  # vertical: buoyancy integrates freely
+    max_fwd_acc = params.max_fwd_acc
+    max_yaw_rate = params.max_yaw_rate
 
     last_cmd = '(none)'
     last_speed = 60
-    last_time = time.time()
-
-    tele_sock = None
-    tele_addr = None
+    last_vel_cmd = [0, 0, 0, 0]
+    # latched control inputs (held until the next command)
+    fwd_acc = 0.0
+    yaw_input = 0.0
+    heave_acc = 0.0
+
+    floor_y = int(h*0.85)
+    surface_y = int(h*0.25)
+    gx, gy = w-60, int(h*0.15)
+    gh = int(h*0.6)
+
+    # water, seabed, rocks/lanes and the gauge frame are static: render once per window size
+    comp = Compositor()
+    comp.add_static(draw_water_background)
+    comp.add_static(lambda img: draw_seabed(img, floor_y))
+    comp.add_static(lambda img: draw_pool_objects(img, floor_y))
+    comp.add_static(lambda img: cv2.rectangle(img, (gx, gy), (gx+20, gy+gh), (230,230,230), 1))
+
+    tele = None
     if args.telemetry:
-        tele_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        tele_addr = ("127.0.0.1", 5006)
+        tele = TelemetryPublisher(args.telemetry_host, args.telemetry_port, args.telemetry_format)
+
+    # Recording goes through a bounded queue to an encoder thread
+    rec = recorder_from_args(args, args.render_hz, exact_fps=True)
+
+    # Physics, render and telemetry each run at their own rate
+    ex = Executive()
+    physics = ex.add("physics", args.physics_hz, catchup=True)
+    render = ex.add("render", args.render_hz)
+    telemetry = ex.add("telemetry", args.telemetry_hz) if tele is not None else None
+
+    # Onboard camera renders straight into the shared-memory ring slot
+    ring = camera = camera_task = None
+    if args.camera != "none":
+        cw, ch = (int(v) for v in args.camera_size.split("x"))
+        camera = OnboardCamera(cw, ch, args.camera, max_depth)
+        ring = FrameRingWriter(args.camera_shm, cw, ch, args.camera_slots)
+        camera_task = ex.add("camera", args.camera_hz)
+    next_stats = args.exec_stats
 
     try:
         while True:
-            now = time.time()
-            dt = max(1e-3, min(0.05, now - last_time))
-            last_time = now
-
-            line = server.get_latest()
-            # defaults for this step
-            fwd_acc = 0.0
-            yaw_input = 0.0
-
-            if line:
-                vel_cmd = parse_vel(line)
-                if vel_cmd is not None:
-                    # VEL: surge,sway,heave,yaw
-                    surge, sway, heave, yaw = vel_cmd
-                    # map surge to forward acc; yaw to yaw_input; heave to vertical thrust
-                    last_speed = int(abs(surge))
-                    fwd_acc = (surge / 100.0) * max_fwd_acc
-                    yaw_input = (yaw / 100.0) * max_yaw_rate
-                    # heave positive -> descend
-                    vdepth += (heave / 100.0) * 20.0 * dt
-                else:
-                    cparts = line.split(";")
-                    # parse CMD if present
-                    for p in cparts:
-                        if p.startswith("CMD:"):
-                            last_cmd = p.split(":",1)[1].strip()[:1]
-                        if p.startswith("SPEED:"):
-                            try:
-                                last_speed = int(p.split(":",1)[1])
-                            except Exception:
-                                pass
-                    if last_cmd == 'F':
-                        fwd_acc = (last_speed/100.0)*max_fwd_acc
-                    else:
-                        fwd_acc = 0.0
-                    if last_cmd == 'L':
-                        yaw_input = - (last_speed/100.0) * max_yaw_rate
-                    elif last_cmd == 'R':
-                        yaw_input = (last_speed/100.0) * max_yaw_rate
+            task = ex.wait_next()
+
+            if task is physics:
+                dt = physics.period
+                line = server.get_latest()
+                if line:
+                    vel_cmd = parse_vel(line)
+                    if vel_cmd is not None:
+                        # VEL: surge,sway,heave,yaw
+                        surge, sway, heave, yaw = vel_cmd
+                        last_vel_cmd = vel_cmd
+                        # map surge to forward acc; yaw to yaw_input; heave to vertical thrust
+                        last_speed = int(abs(surge))
+                        fwd_acc = (surge / 100.0) * max_fwd_acc
+                        yaw_input = (yaw / 100.0) * max_yaw_rate
+                        # heave positive -> descend
+                        heave_acc = (heave / 100.0) * 20.0
                     else:
-                        yaw_input = 0.0
-
-            # keyboard controls
-            key = cv2.waitKey(1) & 0xFF
-            if args.keyboard:
-                if key in (ord('w'), ord('W')):
-                    last_cmd = 'F'; fwd_acc = (last_speed/100.0)*max_fwd_acc
-                elif key in (ord('a'), ord('A')):
-                    last_cmd = 'L'; yaw_input = - (last_speed/100.0) * max_yaw_rate
-                elif key in (ord('d'), ord('D')):
-                    last_cmd = 'R'; yaw_input = (last_speed/100.0) * max_yaw_rate
-                elif key in (ord('s'), ord('S')):
-                    last_cmd = 'S'; fwd_acc = 0.0; yaw_input = 0.0
-                elif key in (ord('r'), ord('R')):
-                    # dive
-                    vdepth += 30.0 * dt
-                elif key in (ord('f'), ord('F')):
-                    # rise
-                    vdepth -= 30.0 * dt
-                elif key in (ord('q'), ord('Q')):
-                    break
-
-            # dynamics
-            yaw_rate += (yaw_input - yaw_drag * yaw_rate) * dt
-            heading += yaw_rate * dt
-
-            forward = np.array([math.cos(heading), math.sin(heading)])
-            acc_world = forward * fwd_acc
-            vel += (acc_world - lin_drag * vel) * dt
-            pos += vel * dt
-
-            # vertical dynamics: buoyancy acts as constant force
-            # simple PID-free: vdepth integrates and depth integrates
-            vdepth += (buoyancy) * dt
-            depth += vdepth * dt
-            # clamp depth
-            depth = max(0.0, min(max_depth, depth))
-
-            # rendering
-            img = np.zeros((h, w, 3), dtype=np.uint8)
-            draw_water_background(img)
-
-            # world->screen mapping: center plus pos offset
-            screen_x = world_center[0] + pos[0]
-            surface_y = int(h*0.25)
-            sx, sy, scale = project_3d_to_2d(screen_x, world_center[1]+pos[1], depth, cam_z=-300, base_y=surface_y, max_depth=max_depth)
-
-            # floor and objects to emulate Gazebo pool
-            floor_y = int(h*0.85)
-            draw_seabed(img, floor_y)
-            draw_pool_objects(img, floor_y)
-
-            # shadow on floor (use floor_y)
-            draw_shadow(img, sx, sy, scale, depth, floor_y)
-
-            draw_auv_3d(img, sx, sy, heading, scale, depth)
-
-            # HUD + depth bar
-            cv2.putText(img, f"Depth: {depth:.1f} m  vZ: {vdepth:.1f} m/s", (16, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
-            # depth gauge on right
-            gx, gy = w-60, int(h*0.15)
-            gh = int(h*0.6)
-            cv2.rectangle(img, (gx, gy), (gx+20, gy+gh), (230,230,230), 1)
-            dp = depth / max_depth
-            fill_h = int(gh * min(1.0, dp))
-            cv2.rectangle(img, (gx+2, gy+gh-fill_h+2), (gx+18, gy+gh-2), (200,80,80), -1)
-
-            cv2.imshow("AUV Pool 3D", img)
-
-            # telemetry
-            if tele_sock is not None and tele_addr is not None:
-                tele = {"pos": {"x": float(pos[0]), "y": float(pos[1]), "z": float(depth)},
-                        "yaw_deg": float((math.degrees(heading) % 360.0)),
-                        "vel": {"x": float(vel[0]), "y": float(vel[1])}}
-                try:
-                    tele_sock.sendto((json.dumps(tele)+"\n").encode('ascii'), tele_addr)
-                except Exception:
-                    pass
+                        last_vel_cmd = [0, 0, 0, 0]
+                        cparts = line.split(";")
+                        # parse CMD if present
+                        for p in cparts:
+                            if p.startswith("CMD:"):
+                                last_cmd = p.split(":",1)[1].strip()[:1]
+                            if p.startswith("SPEED:"):
+                                try:
+                                    last_speed = int(p.split(":",1)[1])
+                                except Exception:
+                                    pass
+                        heave_acc = 0.0
+                        if last_cmd == 'F':
+                            fwd_acc = (last_speed/100.0)*max_fwd_acc
+                        else:
+                            fwd_acc = 0.0
+                        if last_cmd == 'L':
+                            yaw_input = - (last_speed/100.0) * max_yaw_rate
+                        elif last_cmd == 'R':
+                            yaw_input = (last_speed/100.0) * max_yaw_rate
+                        else:
+                            yaw_input = 0.0
+
+                # dynamics; vertical: buoyancy acts as constant force
+                # simple PID-free: vdepth integrates and depth integrates
+                state.depth, state.vdepth = depth, vdepth
+                integrate(state, params, (fwd_acc, 0.0, buoyancy + heave_acc, yaw_input), dt,
+                          args.integrator, args.substeps)
+                depth, vdepth = state.depth, state.vdepth
+                # clamp depth
+                depth = max(0.0, min(max_depth, depth))
+
+            elif task is render:
+                heading = state.heading
+
+                # rendering
+                # static water/floor/objects (emulating the Gazebo pool) come from the cache
+                img = comp.frame(w, h)
+
+                # world->screen mapping: center plus pos offset
+                screen_x = world_center[0] + pos[0]
+                sx, sy, scale = project_3d_to_2d(screen_x, world_center[1]+pos[1], depth, cam_z=-300, base_y=surface_y, max_depth=max_depth)
+
+                # shadow on floor (use floor_y)
+                draw_shadow(img, sx, sy, scale, depth, floor_y)
+
+                draw_auv_3d(img, sx, sy, heading, scale, depth)
+
+                # HUD + depth bar
+                cv2.putText(img, f"Depth: {depth:.1f} m  vZ: {vdepth:.1f} m/s", (16, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
+                # depth gauge on right (frame is static)
+                dp = depth / max_depth
+                fill_h = int(gh * min(1.0, dp))
+                cv2.rectangle(img, (gx+2, gy+gh-fill_h+2), (gx+18, gy+gh-2), (200,80,80), -1)
+
+                cv2.imshow("AUV Pool 3D", img)
+                if rec is not None:
+                    rec.submit(img)
+
+                # keyboard controls
+                key = cv2.waitKey(1) & 0xFF
+                if args.keyboard:
+                    if key in (ord('w'), ord('W')):
+                        last_cmd = 'F'; fwd_acc = (last_speed/100.0)*max_fwd_acc; yaw_input = 0.0
+                    elif key in (ord('a'), ord('A')):
+                        last_cmd = 'L'; fwd_acc = 0.0; yaw_input = - (last_speed/100.0) * max_yaw_rate
+                    elif key in (ord('d'), ord('D')):
+                        last_cmd = 'R'; fwd_acc = 0.0; yaw_input = (last_speed/100.0) * max_yaw_rate
+                    elif key in (ord('s'), ord('S')):
+                        last_cmd = 'S'; fwd_acc = 0.0; yaw_input = 0.0; heave_acc = 0.0
+                    elif key in (ord('r'), ord('R')):
+                        # dive
+                        vdepth += 30.0 * render.period
+                    elif key in (ord('f'), ord('F')):
+                        # rise
+                        vdepth -= 30.0 * render.period
+                    elif key in (ord('q'), ord('Q')):
+                        break
+
+                if args.exec_stats > 0 and ex.elapsed() >= next_stats:
+                    print(ex.report())
+                    if rec is not None:
+                        print(rec.report())
+                    next_stats += args.exec_stats
+
+            elif task is camera_task:
+                frame = ring.slot()
+                camera.render(frame, pos, state.heading, depth)
+                ring.publish()
+                if args.camera_show:
+                    cv2.imshow("AUV Camera", frame)
+
+            elif task is telemetry:
+                tele.publish(pos, depth, math.degrees(state.heading) % 360.0,
+                             vel=vel, vdepth=vdepth, cmd='(VEL)' if any(last_vel_cmd) else last_cmd,
+                             speed=last_speed, vel_cmd=last_vel_cmd)
 
     finally:
         server.stop()
+        if tele is not None:
+            tele.close()
+        if ring is not None:
+            frame = None
+            ring.close()
         cv2.destroyAllWindows()
+        print(ex.report())
+        print(server.report())
+        if rec is not None:
+            rec.close()
+            print(rec.report())
 
 
 if __name__ == "__main__":
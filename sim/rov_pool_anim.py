@@ -3,49 +3,22 @@
 Usage: python rov_pool_anim.py [--listen_port 5005] [--keyboard] [--telemetry]
 
 This reuses the simple command parsing from the original sim but improves
-rendering: pool border, water gradient, subtle caustics, and bubble particles
+rendering: pool border, water gradient, animated caustics, and bubble particles
 generated when thrust is applied.
 """
 import argparse
 import math
-import time
-import threading
-import socket
-import json
 import numpy as np
 import cv2
-from collections import deque
 
-
-class UdpCommandServer(threading.Thread):
-    def __init__(self, host: str = "127.0.0.1", port: int = 5005):
-        super().__init__(daemon=True)
-        self.host = host
-        self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind((self.host, self.port))
-        self.queue = deque(maxlen=20)
-        self.running = True
-
-    def run(self):
-        while self.running:
-            try:
-                data, _ = self.sock.recvfrom(1024)
-                self.queue.append(data.decode("utf-8", errors="ignore").strip())
-            except Exception:
-                time.sleep(0.01)
-
-    def get_latest(self):
-        if not self.queue:
-            return None
-        return self.queue.pop()
-
-    def stop(self):
-        self.running = False
-        try:
-            self.sock.close()
-        except Exception:
-            pass
+from caustics import Caustics
+from command_server import UdpCommandServer
+from compositor import Compositor
+from dynamics import INTEGRATORS, RovParams, RovState, integrate
+from executive import Executive
+from particles import ParticlePool, emission_count, rear_point
+from recorder import add_record_args, recorder_from_args
+from telemetry import TelemetryPublisher, add_telemetry_args
 
 
 def parse_cmd(line: str):
@@ -65,18 +38,6 @@ def parse_cmd(line: str):
     return cmd, max(0, min(100, speed))
 
 
-class Bubble:
-    def __init__(self, pos, vel, life=1.2):
-        self.pos = np.array(pos, dtype=float)
-        self.vel = np.array(vel, dtype=float)
-        self.life = life
-
-    def update(self, dt):
-        self.pos += self.vel * dt
-        self.vel += np.array([0.0, -10.0]) * dt  # slight rise
-        self.life -= dt
-
-
 def draw_pool_background(img):
     h, w = img.shape[:2]
     # gradient: deeper (bottom) darker
@@ -84,14 +45,7 @@ def draw_pool_background(img):
         t = y / h
         color = (int(200*(1-0.6*t)), int(210*(1-0.8*t)), int(255*(1-0.95*t)))
         cv2.line(img, (0, y), (w, y), color, 1)
-    # subtle caustics: sinusoidal bright lines
-    for i in range(6):
-        freq = 0.02 + i*0.005
-        amp = 8 + i*2
-        offset = i*30
-        for x in range(0, w, 4):
-            y = int(h*0.2 + math.sin(x*freq + offset)*amp)
-            cv2.line(img, (x, max(0,y-1)), (x, min(h-1,y+1)), (220,230,255), 1)
+    # caustics are animated on top of this every frame (see caustics.Caustics)
 
 
 def draw_pool_border(img, margin=20):
@@ -137,143 +91,173 @@ def main():
     parser.add_argument("--listen_port", type=int, default=5005)
     parser.add_argument("--keyboard", action="store_true")
     parser.add_argument("--telemetry", action="store_true")
+    parser.add_argument("--telemetry_host", default="127.0.0.1", help="Telemetry UDP host")
+    parser.add_argument("--telemetry_port", type=int, default=5006, help="Telemetry UDP port")
     parser.add_argument("--width", type=int, default=1000)
     parser.add_argument("--height", type=int, default=700)
+    parser.add_argument("--bubble_rate", type=float, default=120.0, help="Bubbles emitted per second under thrust")
+    parser.add_argument("--max_particles", type=int, default=4096, help="Capacity of each particle pool")
+    parser.add_argument("--silt", action="store_true", help="Kick up silt under the vehicle when thrusting")
+    parser.add_argument("--wash", action="store_true", help="Show fast thruster wash particles")
+    parser.add_argument("--caustic_frames", type=int, default=24, help="Precomputed caustic frames per loop (0 = off)")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="euler", help="Dynamics integrator")
+    parser.add_argument("--substeps", type=int, default=1, help="Integrator sub-steps per physics step")
+    parser.add_argument("--physics_hz", type=float, default=500.0, help="Fixed physics rate (Hz)")
+    parser.add_argument("--render_hz", type=float, default=60.0, help="Display rate (Hz)")
+    parser.add_argument("--telemetry_hz", type=float, default=30.0, help="Telemetry publish rate (Hz)")
+    add_telemetry_args(parser)
+    parser.add_argument("--exec_stats", type=float, default=0.0, help="Print rate/jitter stats every N seconds (0 = only at exit)")
+    add_record_args(parser)
     args = parser.parse_args()
 
     server = UdpCommandServer(args.listen_host, args.listen_port)
     server.start()
 
     width, height = args.width, args.height
-    pos = np.array([width//2, height//2], dtype=float)
-    vel = np.zeros(2, dtype=float)
-    heading = -math.pi/2
-    yaw_rate = 0.0
-    depth = 0.0
+    state = RovState(width//2, height//2)
+    pos = state.pos
 
-    max_fwd_acc = 140.0
-    max_yaw_rate = math.radians(80)
-    lin_drag = 0.9
-    yaw_drag = 1.0
+    params = RovParams(max_acc=140.0, max_yaw=80.0, lin_drag=0.9, yaw_drag=1.0)
+    max_fwd_acc = params.max_fwd_acc
+    max_yaw_rate = params.max_yaw_rate
 
     last_cmd = '(none)'
     last_speed = 60
-    last_time = time.time()
 
-    bubbles = []
-
-    tele_sock = None
-    tele_addr = None
+    rng = np.random.default_rng()
+    # particle effects, drawn behind the AUV in this order
+    bubbles = ParticlePool(args.max_particles, accel=(0.0, -10.0), fade=1.5)  # slight rise
+    silt = ParticlePool(args.max_particles, drag=0.6, fade=4.0, radius=(3, 2),
+                        color_new=(110, 140, 160), color_old=(150, 170, 180), outline=None, levels=3)
+    wash = ParticlePool(args.max_particles, drag=5.0, fade=0.35, radius=(2, 4),
+                        color_new=(255, 255, 255), color_old=(230, 235, 240), outline=None, levels=3)
+    effects = [p for p, on in ((silt, args.silt), (wash, args.wash), (bubbles, True)) if on]
+
+    margin = 40
+    # pool background and border are static: render once per window size
+    comp = Compositor()
+    comp.add_static(draw_pool_background)
+    comp.add_static(lambda img: draw_pool_border(img, margin=margin))
+    caustics = Caustics(width, height, frames=args.caustic_frames) if args.caustic_frames > 0 else None
+
+    tele = None
     if args.telemetry:
-        tele_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        tele_addr = ("127.0.0.1", 5006)
+        tele = TelemetryPublisher(args.telemetry_host, args.telemetry_port, args.telemetry_format)
+
+    # Recording goes through a bounded queue to an encoder thread
+    rec = recorder_from_args(args, args.render_hz, exact_fps=True)
+
+    # Physics, render and telemetry each run at their own rate
+    ex = Executive()
+    physics = ex.add("physics", args.physics_hz, catchup=True)
+    render = ex.add("render", args.render_hz)
+    telemetry = ex.add("telemetry", args.telemetry_hz) if tele is not None else None
+    next_stats = args.exec_stats
+    thrust_level = 0.0
 
     try:
         while True:
-            now = time.time()
-            dt = max(1e-3, min(0.05, now - last_time))
-            last_time = now
-
-            # commands
-            line = server.get_latest()
-            if line:
-                c, s = parse_cmd(line)
-                if c is not None:
-                    last_cmd = c
-                    last_speed = s
-
-            # keyboard
-            key = cv2.waitKey(1) & 0xFF
-            if args.keyboard:
-                if key in (ord('w'), ord('W')):
-                    last_cmd = 'F'
-                elif key in (ord('a'), ord('A')):
-                    last_cmd = 'L'
-                elif key in (ord('d'), ord('D')):
-                    last_cmd = 'R'
-                elif key in (ord('s'), ord('S')):
-                    last_cmd = 'S'
-                elif key == ord('q'):
-                    break
-
-            fwd_acc = 0.0
-            yaw_input = 0.0
-            thrust_level = 0.0
-            if last_cmd == 'F':
-                fwd_acc = (last_speed / 100.0) * max_fwd_acc
-                thrust_level = last_speed
-            elif last_cmd == 'L':
-                yaw_input = -(last_speed / 100.0) * max_yaw_rate
-            elif last_cmd == 'R':
-                yaw_input = (last_speed / 100.0) * max_yaw_rate
-
-            yaw_rate += (yaw_input - yaw_drag * yaw_rate) * dt
-            heading += yaw_rate * dt
-
-            forward = np.array([math.cos(heading), math.sin(heading)])
-            left = np.array([-math.sin(heading), math.cos(heading)])
-            acc_world = forward * fwd_acc
-            vel += (acc_world - lin_drag * vel) * dt
-            pos += vel * dt
-
-            # keep inside pool margins
-            margin = 40
-            pos[0] = max(margin, min(width - margin, pos[0]))
-            pos[1] = max(margin, min(height - margin, pos[1]))
-
-            # bubbles when thrust
-            if thrust_level > 10:
-                # emit a few bubbles from rear
-                for _ in range(2):
-                    angle = heading + math.pi + (np.random.rand()-0.5)*0.4
-                    speed = 40 + np.random.rand()*40
-                    bx = pos[0] - math.cos(heading)*(60) + (np.random.rand()-0.5)*8
-                    by = pos[1] - math.sin(heading)*(60) + (np.random.rand()-0.5)*8
-                    bvel = np.array([math.cos(angle)*speed, math.sin(angle)*speed*0.6])
-                    bubbles.append(Bubble((bx, by), bvel, life=1.2 + np.random.rand()*0.6))
-
-            # update bubbles
-            bubbles = [b for b in bubbles if b.life > 0]
-            for b in bubbles:
-                b.update(dt)
-
-            # render
-            img = np.zeros((height, width, 3), dtype=np.uint8)
-            draw_pool_background(img)
-            draw_pool_border(img, margin=margin)
-
-            # draw bubbles (behind AUV)
-            for b in bubbles:
-                alpha = max(0.0, min(1.0, b.life / 1.5))
-                r = int(4 + (1-alpha)*6)
-                col = (int(230*alpha + 200*(1-alpha)), int(245*alpha + 220*(1-alpha)), int(255*alpha))
-                cv2.circle(img, (int(b.pos[0]), int(b.pos[1])), r, col, -1, lineType=cv2.LINE_AA)
-                # faint outline
-                cv2.circle(img, (int(b.pos[0]), int(b.pos[1])), r+2, (200,220,240), 1)
-
-            draw_auv(img, pos, heading, depth, thrust_level)
-
-            # hud
-            cv2.putText(img, f"CMD: {last_cmd}  SPD: {last_speed}", (16, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
-
-            cv2.imshow("AUV Pool Sim", img)
-
-            # telemetry
-            if tele_sock is not None and tele_addr is not None:
-                tele = {
-                    "pos": {"x": float(pos[0]), "y": float(pos[1]), "z": float(depth)},
-                    "yaw_deg": float((math.degrees(heading) % 360.0)),
-                    "cmd": last_cmd,
-                    "speed": int(last_speed),
-                }
-                try:
-                    tele_sock.sendto((json.dumps(tele)+"\n").encode('ascii'), tele_addr)
-                except Exception:
-                    pass
+            task = ex.wait_next()
+
+            if task is physics:
+                dt = physics.period
+
+                # commands
+                line = server.get_latest()
+                if line:
+                    c, s = parse_cmd(line)
+                    if c is not None:
+                        last_cmd = c
+                        last_speed = s
+
+                fwd_acc = 0.0
+                yaw_input = 0.0
+                thrust_level = 0.0
+                if last_cmd == 'F':
+                    fwd_acc = (last_speed / 100.0) * max_fwd_acc
+                    thrust_level = last_speed
+                elif last_cmd == 'L':
+                    yaw_input = -(last_speed / 100.0) * max_yaw_rate
+                elif last_cmd == 'R':
+                    yaw_input = (last_speed / 100.0) * max_yaw_rate
+
+                integrate(state, params, (fwd_acc, 0.0, 0.0, yaw_input), dt, args.integrator, args.substeps)
+
+                # keep inside pool margins
+                pos[0] = max(margin, min(width - margin, pos[0]))
+                pos[1] = max(margin, min(height - margin, pos[1]))
+
+            elif task is render:
+                dt = render.dt  # > period when late ticks were coalesced, so particles keep up with physics
+                heading, depth = state.heading, state.depth
+
+                # particles when thrust (emitted from the rear); visual only, so stepped at display rate
+                if thrust_level > 10:
+                    back = heading + math.pi
+                    bubbles.emit_cone(rng, emission_count(rng, args.bubble_rate, dt), rear_point(pos, heading, 60),
+                                      back, 0.4, (40, 80), (1.2, 1.8), jitter=8, vel_scale=(1.0, 0.6))
+                    if args.wash:
+                        wash.emit_cone(rng, emission_count(rng, 4 * args.bubble_rate, dt), rear_point(pos, heading, 56),
+                                       back, 0.25, (150, 260), (0.2, 0.35), jitter=16)
+                    if args.silt:
+                        silt.emit_cone(rng, emission_count(rng, args.bubble_rate * thrust_level / 100.0, dt), pos,
+                                       0.0, 2 * math.pi, (5, 25), (3.0, 5.0), jitter=80)
+
+                for p in effects:
+                    p.update(dt)
+
+                # render
+                img = comp.frame(width, height)
+                if caustics is not None:
+                    caustics.apply(img, ex.elapsed())
+
+                # draw particles (behind AUV)
+                for p in effects:
+                    p.draw(img)
+
+                draw_auv(img, pos, heading, depth, thrust_level)
+
+                # hud
+                cv2.putText(img, f"CMD: {last_cmd}  SPD: {last_speed}", (16, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
+
+                cv2.imshow("AUV Pool Sim", img)
+                if rec is not None:
+                    rec.submit(img)
+
+                # keyboard
+                key = cv2.waitKey(1) & 0xFF
+                if args.keyboard:
+                    if key in (ord('w'), ord('W')):
+                        last_cmd = 'F'
+                    elif key in (ord('a'), ord('A')):
+                        last_cmd = 'L'
+                    elif key in (ord('d'), ord('D')):
+                        last_cmd = 'R'
+                    elif key in (ord('s'), ord('S')):
+                        last_cmd = 'S'
+                    elif key == ord('q'):
+                        break
+
+                if args.exec_stats > 0 and ex.elapsed() >= next_stats:
+                    print(ex.report())
+                    if rec is not None:
+                        print(rec.report())
+                    next_stats += args.exec_stats
+
+            elif task is telemetry:
+                tele.publish(pos, state.depth, math.degrees(state.heading) % 360.0,
+                             vel=state.vel, vdepth=state.vdepth, cmd=last_cmd, speed=last_speed)
 
     finally:
         server.stop()
+        if tele is not None:
+            tele.close()
         cv2.destroyAllWindows()
+        print(ex.report())
+        print(server.report())
+        if rec is not None:
+            rec.close()
+            print(rec.report())
 
 
 if __name__ == "__main__":
@@ -1,32 +1,123 @@
+"""Timestamped UDP command player for the AKINTAY sims.
+
+Usage:
+  python send_udp.py                                   # demo: F, L, R, F+20, S every 0.7 s
+  python send_udp.py --scenario run.txt [--stream_hz 100] [--loop 3] [--time_scale 0.5] [--seq]
+  python send_udp.py --scenario run.txt --protocol binary   # 8-byte CRC frames (always sequenced)
+
+The scenario uses rov2d's `--script` format: one `<t_seconds> <CMD...|VEL...>`
+per line, '#' comments. Sends are scheduled on a monotonic clock, with a sleep
+until shortly before the deadline and a spin for the rest, so the send time
+error stays well under a millisecond. With `--stream_hz`, the current VEL line
+is re-sent at that rate between events, as a joystick would. At the end, the
+player reports the actual minus scheduled send time.
+"""
+import argparse
+import random
 import socket
 import time
-import argparse
+
+import numpy as np
+
+from command_protocol import add_protocol_args, encode_line
+from rov2d import load_script
+
+
+def demo_script(speed=60, gap=0.7):
+    lines = [
+        f"CMD:F;SPEED:{speed}",
+        "CMD:L;SPEED:40",
+        "CMD:R;SPEED:40",
+        f"CMD:F;SPEED:{min(100, speed + 20)}",
+        "CMD:S;SPEED:0",
+    ]
+    return [(i * gap, line) for i, line in enumerate(lines)]
+
+
+def schedule(script, stream_hz=0.0, loops=1, period=None, time_scale=1.0):
+    """Yield (t, line) send times (s from start), events plus VEL stream repeats, loop by loop.
+
+    `loops` <= 0 repeats forever. `period` is the loop length in script time
+    (default: last event + 1 s).
+    """
+    if not script:
+        return
+    if period is None:
+        period = script[-1][0] + 1.0
+    step = 1.0 / stream_hz if stream_hz > 0 else None
+    n = 0
+    while loops <= 0 or n < loops:
+        base = n * period
+        for i, (t, line) in enumerate(script):
+            yield (base + t) * time_scale, line
+            end = script[i + 1][0] if i + 1 < len(script) else period
+            if step is not None and line.startswith("VEL:"):
+                k = 1
+                while t + k * step < end - 1e-9:
+                    yield (base + t + k * step) * time_scale, line
+                    k += 1
+        n += 1
+
+
+def wait_until(deadline, spin=0.002, clock=time.perf_counter):
+    """Sleep until `spin` s before `deadline`, then busy-wait; return the wake time."""
+    remaining = deadline - clock()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    now = clock()
+    while now < deadline:
+        now = clock()
+    return now
+
+
+def timing_report(errors):
+    if not errors:
+        return "player: nothing sent"
+    e = np.array(errors) * 1000.0
+    late = int(np.count_nonzero(e > 1.0))
+    return (f"player: {len(e)} sends  error mean {e.mean():.3f} p50 {np.percentile(e, 50):.3f} "
+            f"p99 {np.percentile(e, 99):.3f} max {e.max():.3f} ms  >1 ms: {late}")
 
 
 def main():
-    p = argparse.ArgumentParser(description="Send demo UDP commands to AKINTAY sim")
+    p = argparse.ArgumentParser(description="Send timed UDP commands to AKINTAY sim")
     p.add_argument("--host", default="127.0.0.1")
     p.add_argument("--port", type=int, default=5005)
-    p.add_argument("--speed", type=int, default=60)
+    p.add_argument("--speed", type=int, default=60, help="Demo forward speed (no --scenario)")
+    p.add_argument("--scenario", default=None, help="Timestamped command file: '<t> CMD:..|VEL:..' per line")
+    p.add_argument("--stream_hz", type=float, default=0.0, help="Re-send the current VEL line at this rate (0 = events only)")
+    p.add_argument("--loop", type=int, default=1, help="Play the scenario N times (0 = forever)")
+    p.add_argument("--period", type=float, default=None, help="Loop length in script seconds (default: last event + 1 s)")
+    p.add_argument("--time_scale", type=float, default=1.0, help="Multiply script times (0.5 = twice as fast)")
+    p.add_argument("--spin", type=float, default=0.002, help="Busy-wait this long (s) before each send")
+    p.add_argument("--seq", action="store_true", help="Append ';SEQ:<n>' so the receiver can count loss/reordering")
+    p.add_argument("--verbose", action="store_true", help="Print every send")
+    add_protocol_args(p)
     args = p.parse_args()
 
+    script = load_script(args.scenario) if args.scenario else demo_script(args.speed)
     addr = (args.host, args.port)
-    seq = [
-        f"CMD:F;SPEED:{args.speed}\n",
-        "CMD:L;SPEED:40\n",
-        "CMD:R;SPEED:40\n",
-        f"CMD:F;SPEED:{min(100, args.speed+20)}\n",
-        "CMD:S;SPEED:0\n",
-    ]
-
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    for msg in seq:
-        s.sendto(msg.encode("ascii"), addr)
-        time.sleep(0.7)
-    s.close()
+    errors = []
+    n = 0
+    frame_seq = random.randrange(256)  # binary seq is per session
+    t0 = time.perf_counter()
+    try:
+        for t, line in schedule(script, args.stream_hz, args.loop, args.period, args.time_scale):
+            now = wait_until(t0 + t, args.spin)
+            msg = f"{line};SEQ:{n}" if args.seq else line
+            frame = encode_line(line, frame_seq + n) if args.protocol == "binary" else None
+            s.sendto(frame if frame is not None else (msg + "\n").encode("ascii"), addr)
+            errors.append(now - (t0 + t))
+            n += 1
+            if args.verbose:
+                print(f"{now - t0:9.4f}  {msg}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s.close()
+        print(timing_report(errors))
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,199 @@
+"""Shared-memory frame ring: a sim renders camera frames in place, vision reads them without copies.
+
+Usage (inspect a running ring): python shm_camera.py --name akintay_cam [--seconds 5]
+
+Layout of the block (all little-endian, native alignment):
+  header   int64[8]     magic, version, width, height, channels, slots, seq, writer_alive
+  slot_seq int64[slots]  publish number held by each slot (0 = never written)
+  slot_t   float64[slots] time.monotonic() of each publish (CLOCK_MONOTONIC is system-wide)
+  frames   uint8[slots, height, width, channels]  (64-byte aligned)
+
+The writer renders straight into `slot()` (the slot after the newest), then
+`publish()` stamps it and bumps `seq`. The newest frame is slot (seq - 1) % slots.
+A reader can hold a view for up to slots - 1 publishes before the writer
+reuses that slot. `ShmCapture.read` checks the previous frame's slot on the
+next call and counts it as overrun if it was rewritten meanwhile.
+"""
+import argparse
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+MAGIC = 0x4D43414B  # b"AKCM"
+VERSION = 1
+HEADER = 8
+H_MAGIC, H_VERSION, H_WIDTH, H_HEIGHT, H_CHANNELS, H_SLOTS, H_SEQ, H_ALIVE = range(HEADER)
+
+
+def _layout(width, height, channels, slots):
+    seq_off = HEADER * 8
+    t_off = seq_off + slots * 8
+    frame_off = (t_off + slots * 8 + 63) // 64 * 64
+    return seq_off, t_off, frame_off, frame_off + slots * width * height * channels
+
+
+class _Ring:
+    def _map(self, shm, width, height, channels, slots):
+        seq_off, t_off, frame_off, _ = _layout(width, height, channels, slots)
+        buf = shm.buf
+        self.header = np.ndarray((HEADER,), np.int64, buf, 0)
+        self.slot_seq = np.ndarray((slots,), np.int64, buf, seq_off)
+        self.slot_t = np.ndarray((slots,), np.float64, buf, t_off)
+        self.frames = np.ndarray((slots, height, width, channels), np.uint8, buf, frame_off)
+        self.width, self.height, self.channels, self.slots = width, height, channels, slots
+
+    def _unmap(self):
+        # views must go before the mapping can be closed
+        self.header = self.slot_seq = self.slot_t = self.frames = None
+
+
+class FrameRingWriter(_Ring):
+    """Creates (or takes over) the named block and publishes frames into it."""
+
+    def __init__(self, name, width, height, slots=4, channels=3):
+        size = _layout(width, height, channels, slots)[3]
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # stale block from a crashed writer
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self._map(self.shm, width, height, channels, slots)
+        self.slot_seq[:] = 0
+        self.header[:] = (MAGIC, VERSION, width, height, channels, slots, 0, 1)
+        self.seq = 0
+
+    def slot(self):
+        """Frame buffer to render the next frame into (not visible to readers until publish)."""
+        return self.frames[self.seq % self.slots]
+
+    def publish(self, t=None):
+        k = self.seq % self.slots
+        self.seq += 1
+        self.slot_t[k] = time.monotonic() if t is None else t
+        self.slot_seq[k] = self.seq
+        self.header[H_SEQ] = self.seq
+
+    def close(self):
+        if self.header is not None:
+            self.header[H_ALIVE] = 0
+        self._unmap()
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # the caller still holds a slot view; unlink below still frees the name
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ShmCapture(_Ring):
+    """cv2.VideoCapture-like reader of the newest frame in a ring.
+
+    `read()` waits for a frame newer than the last one returned and gives back a
+    view into shared memory (copy=True for a private copy). It returns
+    (False, None) once the writer has closed or after `timeout` s without a
+    new frame.
+    """
+
+    def __init__(self, name, timeout=5.0, copy=False, poll=0.001):
+        self.timeout = timeout
+        self.copy = copy
+        self.poll = poll
+        self.last_seq = 0
+        self.last_slot = None
+        self.last_t = None
+        self.received = 0
+        self.skipped = 0  # publishes never returned (reader slower than writer)
+        self.overrun = 0  # returned frames rewritten before the next read
+        try:
+            self.shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            self.shm = None
+            return
+        try:
+            # the writer owns the block; don't let this process's tracker unlink it at exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        header = np.ndarray((HEADER,), np.int64, self.shm.buf, 0)
+        if header[H_MAGIC] != MAGIC or header[H_VERSION] != VERSION:
+            del header
+            self.shm.close()
+            self.shm = None
+            return
+        w, h, c, n = (int(v) for v in header[[H_WIDTH, H_HEIGHT, H_CHANNELS, H_SLOTS]])
+        del header
+        self._map(self.shm, w, h, c, n)
+
+    def isOpened(self):
+        return self.shm is not None
+
+    def read(self):
+        if self.shm is None:
+            return False, None
+        if self.last_slot is not None and self.slot_seq[self.last_slot] != self.last_seq:
+            self.overrun += 1
+        deadline = time.monotonic() + self.timeout
+        while True:
+            seq = int(self.header[H_SEQ])
+            if seq > self.last_seq:
+                break
+            if not self.header[H_ALIVE] or time.monotonic() > deadline:
+                return False, None
+            time.sleep(self.poll)
+        k = (seq - 1) % self.slots
+        if self.last_seq:
+            self.skipped += seq - self.last_seq - 1
+        self.last_seq, self.last_slot, self.last_t = seq, k, float(self.slot_t[k])
+        self.received += 1
+        frame = self.frames[k]
+        return True, (frame.copy() if self.copy else frame)
+
+    def get(self, prop):
+        # the cv2.CAP_PROP_* values vision code asks for
+        return {3: float(self.width), 4: float(self.height)}.get(int(prop), 0.0)
+
+    def report(self):
+        return f"shm: {self.received} frames  skipped {self.skipped}  overrun {self.overrun}"
+
+    def release(self):
+        if self.shm is not None:
+            self._unmap()
+            try:
+                self.shm.close()
+            except BufferError:
+                pass  # a returned frame view is still alive; the mapping goes with the process
+            self.shm = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a shared-memory camera ring")
+    parser.add_argument("--name", default="akintay_cam")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    cap = ShmCapture(args.name)
+    if not cap.isOpened():
+        raise SystemExit(f"No camera ring named {args.name}")
+    print(f"{args.name}: {cap.width}x{cap.height}x{cap.channels}, {cap.slots} slots")
+    age = []
+    t_end = time.monotonic() + args.seconds
+    while time.monotonic() < t_end:
+        ok, _ = cap.read()
+        if not ok:
+            break
+        age.append(time.monotonic() - cap.last_t)
+    if age:
+        a = np.array(age) * 1000.0
+        print(f"{len(a) / args.seconds:.1f} fps  age mean {a.mean():.2f} p99 {np.percentile(a, 99):.2f} ms")
+    print(cap.report())
+    cap.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@ import sys
 import time
 import socket
 import threading
-from tkinter import Tk, Frame, Button, Label, Scale, HORIZONTAL, StringVar, Entry
+from tkinter import Tk, Frame, Button, Label, Scale, HORIZONTAL, StringVar, Entry, OptionMenu
+
+from command_protocol import PROTOCOLS, CommandEncoder
+from telemetry import decode
 
 
 class TelemetryListener(threading.Thread):
@@ -20,7 +23,9 @@ class TelemetryListener(threading.Thread):
         while self.running:
             try:
                 data, _ = self.sock.recvfrom(1024)
-                self.latest = data.decode("ascii", errors="ignore").strip()
+                tele = decode(data)
+                if tele is not None:
+                    self.latest = format_telemetry(tele)
             except Exception:
                 time.sleep(0.05)
 
@@ -32,6 +37,20 @@ class TelemetryListener(threading.Thread):
             pass
 
 
+def format_telemetry(tele):
+    pos = tele.get("pos", {})
+    text = (f"POSE: x={pos.get('x', 0):.1f} y={pos.get('y', 0):.1f} z={pos.get('z', 0):.1f} "
+            f"yaw={tele.get('yaw_deg', 0):.1f}")
+    vel = tele.get("vel")
+    if vel:
+        text += f"  VEL: {vel.get('x', 0):.1f},{vel.get('y', 0):.1f},{vel.get('z', 0):.1f}"
+    if "cmd" in tele:
+        text += f"  CMD: {tele['cmd']} @ {tele.get('speed', 0)}"
+    if "vel_cmd" in tele:
+        text += "  VEL_CMD: " + ",".join(str(v) for v in tele["vel_cmd"])
+    return text
+
+
 class SimGUI:
     def __init__(self, root: Tk):
         self.root = root
@@ -53,6 +72,10 @@ class SimGUI:
         self.btn_stop = Button(top, text="Stop Sim", command=self.stop_sim, state="disabled")
         self.btn_stop.grid(row=0, column=3)
 
+        Label(top, text="Protocol").grid(row=0, column=4, padx=(6, 0))
+        self.protocol = StringVar(value="ascii")
+        OptionMenu(top, self.protocol, *PROTOCOLS).grid(row=0, column=5)
+
         Label(top, text="Speed").grid(row=1, column=0, sticky="w")
         self.sl = Scale(top, from_=0, to=100, orient=HORIZONTAL)
         self.sl.set(60)
@@ -89,6 +112,7 @@ class SimGUI:
         self.proc = None
         self.tel_listener = None
         self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.encoders = {p: CommandEncoder(p) for p in PROTOCOLS}
 
     def start_sim(self):
         try:
@@ -131,7 +155,7 @@ class SimGUI:
         except Exception:
             port = 5007
         spd = int(self.sl.get())
-        msg = f"CMD:{c};SPEED:{spd}\n".encode("ascii")
+        msg = self.encoders[self.protocol.get()].encode(f"CMD:{c};SPEED:{spd}")
         self.udp.sendto(msg, ("127.0.0.1", port))
 
     def send_vel(self):
@@ -140,7 +164,7 @@ class SimGUI:
         except Exception:
             port = 5007
         vals = (self.surge.get(), self.sway.get(), self.heave.get(), self.yaw.get())
-        msg = f"VEL:{vals[0]},{vals[1]},{vals[2]},{vals[3]}\n".encode("ascii")
+        msg = self.encoders[self.protocol.get()].encode(f"VEL:{vals[0]},{vals[1]},{vals[2]},{vals[3]}")
         self.udp.sendto(msg, ("127.0.0.1", port))
 
 
@@ -0,0 +1,231 @@
+"""Parallel Monte Carlo / grid sweep of the ROV dynamics parameters.
+
+Usage:
+  python sweep.py --max_acc 60:200 --max_yaw 30:90 --lin_drag 0.4:1.6 --yaw_drag 0.5:2 \\
+                  --samples 2000 --scenario surge,turn,zigzag --out sweep.csv
+  python sweep.py --max_acc 80,120,160 --lin_drag 0.5:1.5 --grid 5 --script pool_test.txt
+
+Each parameter is a fixed value (`120`), a list (`80,120,160`) or a range
+(`60:200`). Ranges are sampled uniformly (`--samples N`) or split into `--grid N`
+points; the grid is the full product. Every parameter set runs against every
+scenario: a built-in one or a command script in rov2d's `--script` format.
+
+Runs are batched into chunks that step as one fleet (per-run parameter
+arrays through dynamics.integrate, open water: no wrap-around) and chunks are
+spread over a process pool. One summary row per run is appended to `--out`
+(.csv or .jsonl) as chunks finish:
+
+  settling_time_s   time after the last command until speed and yaw rate stay
+                    within `--band` (fraction of their peak) of their final values;
+                    NaN if not steady for the last SETTLE_HOLD seconds
+  overshoot_pct     peak speed after the last command above the final speed,
+                    in % of the final speed (0 when the final speed is ~0)
+  path_length       distance travelled (px)
+  heading_error_deg final heading minus the ideal heading of a vehicle that
+                    turns at exactly the commanded rate (speed/100 * max_yaw)
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dynamics import INTEGRATORS, RovParams, integrate
+from fleet2d import FleetState
+from rov2d import load_script
+
+PARAM_NAMES = ("max_acc", "max_yaw", "lin_drag", "yaw_drag")
+RESULT_COLUMNS = ("run", "scenario") + PARAM_NAMES + (
+    "settling_time_s", "overshoot_pct", "path_length", "heading_error_deg", "final_speed")
+
+SETTLE_HOLD = 1.0  # s a signal must stay in band before the end to count as settled
+
+SCENARIOS = {
+    "surge": [(0.0, "CMD:F;SPEED:60")],
+    "stop": [(0.0, "CMD:F;SPEED:100"), (8.0, "CMD:S;SPEED:0")],
+    "turn": [(0.0, "CMD:R;SPEED:60"), (3.0, "CMD:F;SPEED:60")],
+    "zigzag": [(0.0, "VEL:60,0,0,40"), (4.0, "VEL:60,0,0,-40"), (8.0, "VEL:60,0,0,40"), (12.0, "VEL:60,0,0,0")],
+}
+
+
+def parse_spec(text):
+    """'120' -> [120.0]; '80,120' -> [80.0, 120.0]; '60:200' -> (60.0, 200.0) range."""
+    if ":" in text:
+        lo, hi = (float(v) for v in text.split(":", 1))
+        return (lo, hi)
+    return [float(v) for v in text.split(",")]
+
+
+def sample_params(specs, samples=0, grid=0, seed=0):
+    """Return an (n, 4) array of parameter sets from per-parameter specs."""
+    if samples > 0:
+        rng = np.random.default_rng(seed)
+        cols = []
+        for spec in specs:
+            if isinstance(spec, tuple):
+                cols.append(rng.uniform(spec[0], spec[1], samples))
+            else:
+                cols.append(rng.choice(spec, samples))
+        return np.column_stack(cols)
+    axes = []
+    for spec in specs:
+        if isinstance(spec, tuple):
+            axes.append(np.linspace(spec[0], spec[1], max(1, grid)) if grid > 1 else [0.5 * (spec[0] + spec[1])])
+        else:
+            axes.append(spec)
+    return np.array(list(itertools.product(*axes)), dtype=float)
+
+
+def fleet_params(values):
+    """RovParams whose four swept fields are per-run arrays (columns of `values`)."""
+    p = RovParams()
+    p.max_fwd_acc = values[:, 0].copy()
+    p.max_yaw_rate = np.radians(values[:, 1])
+    p.lin_drag = values[:, 2].copy()
+    p.yaw_drag = values[:, 3].copy()
+    return p
+
+
+def run_chunk(first_run, scenario, script, values, dt, duration, method="euler", substeps=1, band=0.02):
+    """Simulate one scenario for every parameter row in `values`; return result rows."""
+    n = len(values)
+    p = fleet_params(values)
+    f = FleetState(n)
+    steps = int(round(duration / dt))
+    speed = np.empty((steps, n))
+    yaw_rate = np.empty((steps, n))
+    path = np.zeros(n)
+    ideal_heading = f.heading.copy()
+    t_last = 0.0
+    k = 0
+    for i in range(steps):
+        t = i * dt
+        while k < len(script) and script[k][0] <= t:
+            f.apply(slice(None), script[k][1])
+            t_last = script[k][0]
+            k += 1
+        u = f.inputs(p)
+        prev = f.pos.copy()
+        integrate(f, p, u, dt, method, substeps)
+        surfaced = f.depth < 0
+        f.depth[surfaced] = 0.0
+        f.vdepth[surfaced] = 0.0
+        path += np.hypot(*(f.pos - prev).T)
+        ideal_heading += u[3] * dt
+        speed[i] = np.hypot(f.vel[:, 0], f.vel[:, 1])
+        yaw_rate[i] = f.yaw_rate
+
+    # response after the last command change
+    hold = max(1, int(round(SETTLE_HOLD / dt)))
+    i0 = min(steps - 1, int(math.ceil(t_last / dt)))
+    settle = np.full(n, np.nan)
+    for sig in (speed, np.abs(yaw_rate)):
+        seg = sig[i0:]
+        tol = band * np.maximum(sig.max(axis=0), 1e-9)
+        outside = np.abs(seg - seg[-1]) > tol
+        # index of the last sample outside the band (+1), 0 if always inside
+        last_out = np.where(outside.any(axis=0), len(seg) - np.argmax(outside[::-1], axis=0), 0)
+        t_settle = last_out * dt
+        t_settle[last_out > len(seg) - hold] = np.nan  # not steady for SETTLE_HOLD before the end
+        settle = np.where(np.isnan(settle), t_settle, np.maximum(settle, t_settle))
+    final_speed = speed[-1]
+    peak = speed[i0:].max(axis=0)
+    moving = final_speed > 1e-6 * np.maximum(peak, 1e-9)
+    overshoot = np.where(moving, (peak - final_speed) / np.where(moving, final_speed, 1.0) * 100.0, 0.0)
+    heading_err = np.degrees((f.heading - ideal_heading + math.pi) % (2 * math.pi) - math.pi)
+
+    rows = []
+    for j in range(n):
+        rows.append((first_run + j, scenario, *(float(v) for v in values[j]),
+                     float(settle[j]), float(overshoot[j]), float(path[j]), float(heading_err[j]),
+                     float(final_speed[j])))
+    return rows
+
+
+class ResultWriter:
+    """Append result rows to a .csv or .jsonl file as they arrive."""
+
+    def __init__(self, path):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.jsonl = path.endswith(".jsonl")
+        if not self.jsonl:
+            self.w = csv.writer(self.f)
+            self.w.writerow(RESULT_COLUMNS)
+
+    def write(self, rows):
+        for row in rows:
+            if self.jsonl:
+                self.f.write(json.dumps(dict(zip(RESULT_COLUMNS, row))) + "\n")
+            else:
+                self.w.writerow(row)
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKINTAY ROV dynamics parameter sweep (headless, parallel)")
+    parser.add_argument("--max_acc", default="120", help="Max forward acceleration (px/s^2): value, list a,b,c or range lo:hi")
+    parser.add_argument("--max_yaw", default="60", help="Max yaw rate (deg/s): value, list or range")
+    parser.add_argument("--lin_drag", default="0.8", help="Linear drag (1/s): value, list or range")
+    parser.add_argument("--yaw_drag", default="1.0", help="Yaw drag (1/s): value, list or range")
+    parser.add_argument("--samples", type=int, default=0, help="Random samples over the ranges (0 = grid)")
+    parser.add_argument("--grid", type=int, default=5, help="Grid points per range when not sampling")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", default="surge,turn", help=f"Built-in scenarios: {','.join(SCENARIOS)} (empty for none)")
+    parser.add_argument("--script", action="append", default=[], help="Extra scenario from a command script (repeatable)")
+    parser.add_argument("--dt", type=float, default=0.01, help="Fixed timestep (s)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Simulated duration per run (s)")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="euler")
+    parser.add_argument("--substeps", type=int, default=1)
+    parser.add_argument("--band", type=float, default=0.02, help="Settling band as a fraction of the peak")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = all cores)")
+    parser.add_argument("--chunk", type=int, default=64, help="Runs stepped together as one fleet per task")
+    parser.add_argument("--out", default="sweep.csv", help="Results file (.csv or .jsonl)")
+    args = parser.parse_args()
+
+    specs = [parse_spec(getattr(args, name)) for name in PARAM_NAMES]
+    values = sample_params(specs, args.samples, args.grid, args.seed)
+    scenarios = [(name, SCENARIOS[name]) for name in filter(None, args.scenario.split(","))]
+    scenarios += [(os.path.splitext(os.path.basename(path))[0], load_script(path)) for path in args.script]
+    if not scenarios:
+        parser.error("no scenarios: give --scenario and/or --script")
+
+    tasks = []
+    run = 0
+    for name, script in scenarios:
+        for i in range(0, len(values), args.chunk):
+            chunk = values[i:i + args.chunk]
+            tasks.append((run, name, script, chunk))
+            run += len(chunk)
+    workers = args.workers or os.cpu_count() or 1
+    print(f"sweep: {len(values)} parameter sets x {len(scenarios)} scenarios = {run} runs, "
+          f"{len(tasks)} chunks on {workers} workers → {args.out}")
+
+    writer = ResultWriter(args.out)
+    done = 0
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_chunk, first, name, script, chunk, args.dt, args.duration,
+                                   args.integrator, args.substeps, args.band)
+                       for first, name, script, chunk in tasks]
+            for fut in as_completed(futures):
+                rows = fut.result()
+                writer.write(rows)
+                done += len(rows)
+                wall = time.perf_counter() - t0
+                print(f"\r{done}/{run} runs  {done / max(wall, 1e-9):.1f} runs/s", end="", flush=True)
+    finally:
+        writer.close()
+    print(f"\nsweep: {done} runs in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Shared sim telemetry: fixed-layout binary packet with an optional JSON mode.
+
+Binary packet (little-endian, 50 bytes, one per UDP datagram):
+
+    magic   2s   b"AT"
+    version u8   TELEMETRY_VERSION
+    flags   u8   which optional groups are valid (FLAG_*)
+    seq     u32  packet counter (wraps)
+    t       f64  sender time.time() at publish
+    pos     3f32 x, y (px / world units), z (depth)
+    vel     3f32 x, y, z
+    yaw_deg f32  0..360
+    cmd     c    last CMD letter, b"V" for VEL mode, b"-" for none
+    speed   u8   0..100
+    vel_cmd 4i8  surge, sway, heave, yaw in -100..100
+
+`decode` accepts either format and returns the JSON-style dict
+({"pos": {...}, "vel": {...}, "yaw_deg", "cmd", "speed", "vel_cmd", "seq", "t"}),
+so listeners do not need to know which mode the sim runs in.
+"""
+import json
+import socket
+import struct
+import time
+
+TELEMETRY_MAGIC = b"AT"
+TELEMETRY_VERSION = 1
+FORMATS = ("binary", "json")
+
+FLAG_VEL = 0x01  # vel.x / vel.y valid
+FLAG_VEL_Z = 0x02  # vel.z valid
+FLAG_CMD = 0x04  # cmd / speed valid
+FLAG_VEL_CMD = 0x08  # vel_cmd valid
+
+PACKET = struct.Struct("<2sBBId3f3ffcB4b")
+
+
+def cmd_to_byte(cmd):
+    if not cmd or cmd == "(none)":
+        return b"-"
+    if cmd == "(VEL)":
+        return b"V"
+    return cmd[:1].encode("ascii", errors="replace")
+
+
+def byte_to_cmd(b):
+    c = b.decode("ascii", errors="replace")
+    return {"-": "(none)", "V": "(VEL)"}.get(c, c)
+
+
+class TelemetryPublisher:
+    def __init__(self, host="127.0.0.1", port=5006, fmt="binary"):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown telemetry format: {fmt}")
+        self.addr = (host, port)
+        self.fmt = fmt
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.buf = bytearray(PACKET.size)
+        self.seq = 0
+        self.sent = 0
+        self.errors = 0
+
+    def encode(self, pos, depth, yaw_deg, vel=None, vdepth=None, cmd=None, speed=0, vel_cmd=None, t=None):
+        flags = 0
+        vx = vy = vz = 0.0
+        if vel is not None:
+            flags |= FLAG_VEL
+            vx, vy = float(vel[0]), float(vel[1])
+        if vdepth is not None:
+            flags |= FLAG_VEL_Z
+            vz = float(vdepth)
+        if cmd is not None:
+            flags |= FLAG_CMD
+        vc = (0, 0, 0, 0)
+        if vel_cmd is not None:
+            flags |= FLAG_VEL_CMD
+            vc = tuple(int(max(-100, min(100, v))) for v in vel_cmd)
+        t = time.time() if t is None else float(t)
+        if self.fmt == "json":
+            tele = {"pos": {"x": float(pos[0]), "y": float(pos[1]), "z": float(depth)},
+                    "yaw_deg": float(yaw_deg), "seq": self.seq, "t": t}
+            if flags & FLAG_VEL:
+                tele["vel"] = {"x": vx, "y": vy}
+                if flags & FLAG_VEL_Z:
+                    tele["vel"]["z"] = vz
+            if flags & FLAG_CMD:
+                tele["cmd"] = cmd
+                tele["speed"] = int(speed)
+            if flags & FLAG_VEL_CMD:
+                tele["vel_cmd"] = list(vc)
+            return (json.dumps(tele) + "\n").encode("ascii")
+        PACKET.pack_into(self.buf, 0, TELEMETRY_MAGIC, TELEMETRY_VERSION, flags, self.seq & 0xFFFFFFFF, t,
+                         float(pos[0]), float(pos[1]), float(depth), vx, vy, vz, float(yaw_deg),
+                         cmd_to_byte(cmd), max(0, min(100, int(speed))), *vc)
+        return self.buf
+
+    def publish(self, pos, depth, yaw_deg, **fields):
+        msg = self.encode(pos, depth, yaw_deg, **fields)
+        self.seq += 1
+        try:
+            self.sock.sendto(msg, self.addr)
+            self.sent += 1
+        except OSError:
+            self.errors += 1
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+
+
+def decode(data):
+    """Decode a binary or JSON telemetry datagram into the JSON-style dict; None if unrecognized."""
+    if len(data) == PACKET.size and data[:2] == TELEMETRY_MAGIC:
+        (_, version, flags, seq, t, px, py, pz, vx, vy, vz, yaw,
+         cmd, speed, s0, s1, s2, s3) = PACKET.unpack(data)
+        if version != TELEMETRY_VERSION:
+            return None
+        tele = {"pos": {"x": px, "y": py, "z": pz}, "yaw_deg": yaw, "seq": seq, "t": t}
+        if flags & FLAG_VEL:
+            tele["vel"] = {"x": vx, "y": vy}
+            if flags & FLAG_VEL_Z:
+                tele["vel"]["z"] = vz
+        if flags & FLAG_CMD:
+            tele["cmd"] = byte_to_cmd(cmd)
+            tele["speed"] = speed
+        if flags & FLAG_VEL_CMD:
+            tele["vel_cmd"] = [s0, s1, s2, s3]
+        return tele
+    try:
+        return json.loads(bytes(data).decode("ascii", errors="ignore"))
+    except ValueError:
+        return None
+
+
+def add_telemetry_args(parser):
+    parser.add_argument("--telemetry_format", choices=FORMATS, default="binary",
+                        help="Telemetry encoding: fixed 50-byte binary packet or legacy JSON line")
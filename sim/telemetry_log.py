@@ -0,0 +1,363 @@
+"""Columnar, memory-mappable telemetry log with time-indexed seek and replay.
+
+Usage:
+  python telemetry_log.py record session.tlog [--port 5006] [--forward 127.0.0.1:5007]
+  python telemetry_log.py info session.tlog
+  python telemetry_log.py replay session.tlog [--speed 2] [--start 60] [--end 120] [--max_gap 2] \\
+                          [--telemetry 127.0.0.1:5006] [--commands 127.0.0.1:5005]
+
+A log is a directory: `meta.json` plus one append-only raw little-endian file
+per column (`t_rx.bin`, `pos.bin`, ...). Rows are appended in blocks, so a
+reader sees every complete row written so far. `TelemetryLog` opens the
+columns with np.memmap, so opening an hour-long session costs the same as
+opening a short one. `t_rx` (receiver time.monotonic(), non-decreasing) is the
+time index: `index_at(t)` is a binary search over the mapped column. Wall-clock
+receive time is kept separately in `t_wall`. Recording into an existing log
+starts a new session right after its last row (no gap in `t_rx`); the first
+row of every session is listed in meta.json. Replay also skips any idle
+stretch longer than --max_gap instead of waiting it out.
+
+The recorder accepts both telemetry formats (telemetry.decode). It can forward
+every datagram so sim_gui keeps working while a session is recorded. Replay
+re-publishes the telemetry (e.g. to sim_gui) and/or re-sends the logged
+CMD/VEL inputs to a sim, at any speed.
+"""
+import argparse
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+from telemetry import (FLAG_CMD, FLAG_VEL, FLAG_VEL_CMD, FLAG_VEL_Z, FORMATS, TelemetryPublisher,
+                       byte_to_cmd, cmd_to_byte, decode)
+
+LOG_VERSION = 2
+READ_VERSIONS = (1, 2)  # v1: t_rx was time.time(), no t_wall
+
+# name, dtype, per-row shape
+COLUMNS = (
+    ("t_rx", "<f8", ()),  # receiver time.monotonic() (index)
+    ("t_wall", "<f8", ()),  # receiver time.time()
+    ("t", "<f8", ()),  # sender timestamp
+    ("seq", "<u4", ()),
+    ("flags", "u1", ()),  # telemetry.FLAG_*
+    ("pos", "<f4", (3,)),  # x, y, depth
+    ("vel", "<f4", (3,)),
+    ("yaw_deg", "<f4", ()),
+    ("cmd", "S1", ()),  # telemetry.cmd_to_byte
+    ("speed", "u1", ()),
+    ("vel_cmd", "i1", (4,)),
+)
+
+ROW_DTYPE = np.dtype([(name, dt, shape) for name, dt, shape in COLUMNS])
+
+
+def _column_path(path, name):
+    return os.path.join(path, name + ".bin")
+
+
+class TelemetryLogWriter:
+    """Append rows to a log directory (created if missing), flushed in blocks."""
+
+    def __init__(self, path, block=256, flush_interval=1.0):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, "meta.json")
+        t_rx_path = _column_path(path, "t_rx")
+        n = os.path.getsize(t_rx_path) // 8 if os.path.exists(t_rx_path) else 0
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != LOG_VERSION:
+                raise ValueError(f"{path}: log version {meta.get('version')} != {LOG_VERSION}")
+        else:
+            meta = {"version": LOG_VERSION, "columns": [[n, d, list(s)] for n, d, s in COLUMNS],
+                    "created": time.time()}
+        sessions = meta.setdefault("sessions", [0])  # first row of each recording session
+        if n > sessions[-1]:
+            sessions.append(n)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        self.files = {name: open(_column_path(path, name), "ab") for name, _, _ in COLUMNS}
+        # a new session continues t_rx right after the last row, whatever the clock did meanwhile
+        self.t_offset = 0.0
+        self._last = None
+        if n:
+            with open(t_rx_path, "rb") as f:
+                f.seek((n - 1) * 8)
+                self._last = float(np.frombuffer(f.read(8), dtype="<f8")[0])
+        self.buf = np.zeros(max(1, block), dtype=ROW_DTYPE)
+        self.n = 0
+        self.rows = 0
+        self.flush_interval = flush_interval
+        self._last_flush = time.perf_counter()
+
+    def append(self, tele, t_rx=None, t_wall=None):
+        """Append one decoded telemetry dict (telemetry.decode output); t_rx is a time.monotonic() value."""
+        r = self.buf[self.n]
+        t_rx = time.monotonic() if t_rx is None else t_rx
+        if self._last is not None:
+            self.t_offset = self._last - t_rx  # first row of an appended session
+            self._last = None
+        r["t_rx"] = t_rx + self.t_offset
+        r["t_wall"] = time.time() if t_wall is None else t_wall
+        r["t"] = tele.get("t", 0.0)
+        r["seq"] = tele.get("seq", 0) & 0xFFFFFFFF
+        pos = tele.get("pos", {})
+        r["pos"] = (pos.get("x", 0.0), pos.get("y", 0.0), pos.get("z", 0.0))
+        r["yaw_deg"] = tele.get("yaw_deg", 0.0)
+        flags = 0
+        vel = tele.get("vel")
+        if vel is not None:
+            flags |= FLAG_VEL
+            if "z" in vel:
+                flags |= FLAG_VEL_Z
+            r["vel"] = (vel.get("x", 0.0), vel.get("y", 0.0), vel.get("z", 0.0))
+        else:
+            r["vel"] = 0.0
+        if "cmd" in tele:
+            flags |= FLAG_CMD
+        r["cmd"] = cmd_to_byte(tele.get("cmd"))
+        r["speed"] = max(0, min(100, int(tele.get("speed", 0))))
+        if "vel_cmd" in tele:
+            flags |= FLAG_VEL_CMD
+            r["vel_cmd"] = np.clip(tele["vel_cmd"], -100, 100)
+        else:
+            r["vel_cmd"] = 0
+        r["flags"] = flags
+        self.n += 1
+        self.rows += 1
+        if self.n == len(self.buf) or time.perf_counter() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.n:
+            block = self.buf[:self.n]
+            for name, f in self.files.items():
+                f.write(np.ascontiguousarray(block[name]).tobytes())
+                f.flush()
+            self.n = 0
+        self._last_flush = time.perf_counter()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+
+class TelemetryLog:
+    """Read-only, memory-mapped view of a log directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") not in READ_VERSIONS:
+            raise ValueError(f"{path}: unsupported log version {self.meta.get('version')}")
+        columns = [(n, d, tuple(s)) for n, d, s in self.meta["columns"]]
+        # rows = complete rows present in every column (a writer may be mid-append)
+        sizes = {}
+        for name, dt, shape in columns:
+            row_bytes = np.dtype(dt).itemsize * int(np.prod(shape, dtype=int))
+            sizes[name] = os.path.getsize(_column_path(path, name)) // row_bytes
+        self.n = min(sizes.values())
+        self.columns = {}
+        for name, dt, shape in columns:
+            if self.n:
+                self.columns[name] = np.memmap(_column_path(path, name), dtype=dt, mode="r", shape=(self.n,) + shape)
+            else:
+                self.columns[name] = np.zeros((0,) + shape, dtype=dt)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def sessions(self):
+        """First row of each recording session (v1 logs: [0])."""
+        return [i for i in self.meta.get("sessions", [0]) if i < self.n] or [0]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def t0(self):
+        return float(self.columns["t_rx"][0]) if self.n else 0.0
+
+    @property
+    def duration(self):
+        return float(self.columns["t_rx"][-1]) - self.t0 if self.n else 0.0
+
+    def index_at(self, t):
+        """First row with t_rx >= t0 + t (s from the start of the log): O(log n)."""
+        return int(np.searchsorted(self.columns["t_rx"], self.t0 + t, side="left"))
+
+    def window(self, start=0.0, end=None):
+        """Row range [i0, i1) covering [start, end) seconds from the start of the log."""
+        i1 = self.n if end is None else self.index_at(end)
+        return self.index_at(start), i1
+
+    def row(self, i):
+        """Row `i` as a telemetry dict (same shape as telemetry.decode)."""
+        c = self.columns
+        flags = int(c["flags"][i])
+        pos = c["pos"][i]
+        tele = {"pos": {"x": float(pos[0]), "y": float(pos[1]), "z": float(pos[2])},
+                "yaw_deg": float(c["yaw_deg"][i]), "seq": int(c["seq"][i]), "t": float(c["t"][i])}
+        if flags & FLAG_VEL:
+            vel = c["vel"][i]
+            tele["vel"] = {"x": float(vel[0]), "y": float(vel[1])}
+            if flags & FLAG_VEL_Z:
+                tele["vel"]["z"] = float(vel[2])
+        if flags & FLAG_CMD:
+            tele["cmd"] = byte_to_cmd(bytes(c["cmd"][i]))
+            tele["speed"] = int(c["speed"][i])
+        if flags & FLAG_VEL_CMD:
+            tele["vel_cmd"] = [int(v) for v in c["vel_cmd"][i]]
+        return tele
+
+
+def command_line(tele):
+    """CMD/VEL line that reproduces the logged operator input, or None if not logged."""
+    if "vel_cmd" in tele and (tele.get("cmd") == "(VEL)" or any(tele["vel_cmd"])):
+        return "VEL:" + ",".join(str(v) for v in tele["vel_cmd"])
+    cmd = tele.get("cmd")
+    if cmd and cmd not in ("(none)", "(VEL)"):
+        return f"CMD:{cmd};SPEED:{tele.get('speed', 0)}"
+    return None
+
+
+def _addr(text):
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+
+def record(args):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((args.host, args.port))
+    sock.settimeout(0.5)
+    fwd = _addr(args.forward) if args.forward else None
+    writer = TelemetryLogWriter(args.log, block=args.block)
+    bad = 0
+    t_end = time.perf_counter() + args.duration if args.duration > 0 else None
+    print(f"recording {args.host}:{args.port} → {args.log}" + (f" (forward {args.forward})" if fwd else ""))
+    try:
+        while t_end is None or time.perf_counter() < t_end:
+            try:
+                data, _ = sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            t_rx, t_wall = time.monotonic(), time.time()
+            if fwd is not None:
+                sock.sendto(data, fwd)
+            tele = decode(data)
+            if tele is None:
+                bad += 1
+                continue
+            writer.append(tele, t_rx, t_wall)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        sock.close()
+    print(f"recorded {writer.rows} rows ({bad} undecodable) → {args.log}")
+
+
+def info(args):
+    log = TelemetryLog(args.log)
+    print(f"{args.log}: {len(log)} rows, {log.duration:.1f}s"
+          + (f", {len(log) / log.duration:.1f} rows/s" if log.duration > 0 else ""))
+    if len(log):
+        seq = log["seq"].astype(np.int64)
+        gaps = int(np.count_nonzero(np.diff(seq) > 1))
+        if "t_wall" in log.columns:
+            print("started " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(log["t_wall"][0]))))
+        print(f"first {log.row(0)}\nlast  {log.row(len(log) - 1)}\nseq gaps: {gaps}  sessions: {len(log.sessions)}")
+
+
+def replay(args):
+    from send_udp import wait_until
+
+    log = TelemetryLog(args.log)
+    i0, i1 = log.window(args.start, args.end)
+    if i0 >= i1:
+        print("replay: nothing in that window")
+        return
+    tele_pub = TelemetryPublisher(*_addr(args.telemetry), fmt=args.format) if args.telemetry else None
+    cmd_addr = _addr(args.commands) if args.commands else None
+    cmd_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if cmd_addr else None
+    t_rx = log["t_rx"]
+    base = float(t_rx[i0])
+    prev = base
+    skipped = 0.0  # log time not waited out: idle stretches longer than --max_gap
+    last_line = None
+    sent = 0
+    start = time.perf_counter()
+    try:
+        for i in range(i0, i1):
+            t = float(t_rx[i])
+            if t - prev > args.max_gap:
+                skipped += t - prev
+            prev = t
+            if args.speed > 0:
+                wait_until(start + (t - base - skipped) / args.speed)
+            tele = log.row(i)
+            if tele_pub is not None:
+                vel = tele.get("vel")
+                tele_pub.publish((tele["pos"]["x"], tele["pos"]["y"]), tele["pos"]["z"], tele["yaw_deg"],
+                                 vel=None if vel is None else (vel["x"], vel["y"]),
+                                 vdepth=None if vel is None else vel.get("z"),
+                                 cmd=tele.get("cmd"), speed=tele.get("speed", 0), vel_cmd=tele.get("vel_cmd"))
+            if cmd_sock is not None:
+                line = command_line(tele)
+                if line is not None and line != last_line:
+                    cmd_sock.sendto((line + "\n").encode("ascii"), cmd_addr)
+                    last_line = line
+            sent += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if tele_pub is not None:
+            tele_pub.close()
+        if cmd_sock is not None:
+            cmd_sock.close()
+    wall = time.perf_counter() - start
+    span = float(t_rx[i0 + sent - 1]) - base if sent else 0.0
+    print(f"replayed {sent} rows ({span:.1f}s of log, {skipped:.1f}s of gaps skipped) in {wall:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AKINTAY telemetry log: record, inspect, replay")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    p = sub.add_parser("record", help="Record UDP telemetry into a log directory")
+    p.add_argument("log")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=5006)
+    p.add_argument("--forward", default=None, help="Also pass every datagram on to host:port (e.g. sim_gui)")
+    p.add_argument("--duration", type=float, default=0.0, help="Stop after N seconds (0 = until Ctrl+C)")
+    p.add_argument("--block", type=int, default=256, help="Rows buffered per column write")
+    p.set_defaults(func=record)
+
+    p = sub.add_parser("info", help="Summarize a log")
+    p.add_argument("log")
+    p.set_defaults(func=info)
+
+    p = sub.add_parser("replay", help="Replay a log as telemetry and/or sim commands")
+    p.add_argument("log")
+    p.add_argument("--speed", type=float, default=1.0, help="Playback speed factor (0 = as fast as possible)")
+    p.add_argument("--start", type=float, default=0.0, help="Seconds from the start of the log")
+    p.add_argument("--end", type=float, default=None, help="Stop at this many seconds from the start")
+    p.add_argument("--max_gap", type=float, default=2.0, help="Skip idle stretches longer than this (s) instead of waiting")
+    p.add_argument("--telemetry", default="127.0.0.1:5006", help="Re-publish telemetry to host:port ('' to disable)")
+    p.add_argument("--format", choices=FORMATS, default="binary", help="Telemetry encoding for replay")
+    p.add_argument("--commands", default=None, help="Send the logged CMD/VEL inputs to a sim at host:port")
+    p.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Host-side command links to the ESP32 (or its emulator), with write-blocking stats.
+
+Usage (send a test pattern): python transport.py --port emu --rate 200 --seconds 5 [--protocol binary]
+
+`open_transport(spec, baud)` picks the backend from the port string:
+  COM3, /dev/ttyUSB0   serial port (pyserial)
+  udp:HOST:PORT        one datagram per write (the sims, or esp32_emu.py --udp)
+  pty:PATH             raw pseudo-terminal, e.g. the link made by esp32_emu.py --link PATH
+  emu                  start esp32_emu.py on a fresh pty at `baud` and connect to it
+  none                 discard (counts only)
+
+Every backend times each write. `report()` gives the count, bytes and the
+time the caller spent blocked in write (mean/p99/max): at a low baud rate the
+serial driver's buffer fills and write() starts to stall the sender's loop.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from command_protocol import CommandEncoder, add_protocol_args
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Transport:
+    name = "link"
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+        self.errors = 0
+        self.blocked = deque(maxlen=10000)  # s spent in each write
+
+    def write(self, data):
+        t0 = time.perf_counter()
+        n = self._write(data)
+        self.blocked.append(time.perf_counter() - t0)
+        self.writes += 1
+        self.bytes += len(data)
+        return n
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def report(self):
+        if not self.blocked:
+            return f"{self.name}: no writes"
+        b = np.array(self.blocked) * 1000.0
+        return (f"{self.name}: {self.writes} writes {self.bytes} B  write blocked mean {b.mean():.3f} "
+                f"p99 {np.percentile(b, 99):.3f} max {b.max():.3f} ms  errors {self.errors}")
+
+
+class NullTransport(Transport):
+    name = "none"
+
+    def _write(self, data):
+        return len(data)
+
+
+class SerialTransport(Transport):
+    def __init__(self, port, baud=115200, timeout=0.05):
+        super().__init__()
+        import serial
+        self.name = f"serial {port}"
+        self.ser = serial.Serial(port, baud, timeout=timeout)
+
+    def _write(self, data):
+        return self.ser.write(data)
+
+    def read(self, n=1024):
+        return self.ser.read(n)
+
+    def close(self):
+        self.ser.close()
+
+
+class UdpTransport(Transport):
+    def __init__(self, host, port):
+        super().__init__()
+        self.name = f"udp {host}:{port}"
+        self.addr = (host, int(port))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _write(self, data):
+        try:
+            return self.sock.sendto(data, self.addr)
+        except OSError:
+            self.errors += 1  # e.g. ECONNREFUSED from an earlier send with nobody listening
+            return 0
+
+    def close(self):
+        self.sock.close()
+
+
+class PtyTransport(Transport):
+    """Raw blocking writes to a pseudo-terminal slave (Linux/macOS)."""
+
+    def __init__(self, path):
+        super().__init__()
+        import tty
+        self.name = f"pty {path}"
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+        return len(data)
+
+    def read(self, n=1024):
+        import select
+        if select.select([self.fd], [], [], 0)[0]:
+            return os.read(self.fd, n)
+        return b""
+
+    def close(self):
+        os.close(self.fd)
+
+
+class EmulatorTransport(PtyTransport):
+    """Starts esp32_emu.py on its own pty and writes to it; close() stops it (it prints its report)."""
+
+    def __init__(self, baud=115200, extra_args=(), timeout=5.0):
+        link = os.path.join("/tmp", f"akintay_esp32_{os.getpid()}")
+        cmd = [sys.executable, os.path.join(HERE, "esp32_emu.py"), "--link", link, "--baud", str(baud)]
+        self.proc = subprocess.Popen(cmd + list(extra_args))
+        t_end = time.monotonic() + timeout
+        while not os.path.exists(link):
+            if self.proc.poll() is not None or time.monotonic() > t_end:
+                self.proc.kill()
+                raise OSError(f"esp32_emu.py did not create {link}")
+            time.sleep(0.02)
+        super().__init__(link)
+        self.name = f"emu {baud} baud"
+
+    def close(self):
+        super().close()
+        import signal
+        self.proc.send_signal(signal.SIGINT)
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def open_transport(spec, baud=115200, timeout=0.05):
+    """Open the link named by `spec` (see module docstring)."""
+    if spec in ("none", ""):
+        return NullTransport()
+    if spec == "emu":
+        return EmulatorTransport(baud)
+    if spec.startswith("udp:"):
+        _, host, port = spec.split(":", 2)
+        return UdpTransport(host, port)
+    if spec.startswith("pty:"):
+        return PtyTransport(spec[4:])
+    return SerialTransport(spec, baud, timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a CMD/VEL test pattern over a transport and report write blocking")
+    parser.add_argument("--port", default="emu", help="Transport spec (see module docstring)")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--rate", type=float, default=200.0, help="Messages per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    add_protocol_args(parser)
+    args = parser.parse_args()
+
+    link = open_transport(args.port, args.baud)
+    encoder = CommandEncoder(args.protocol)
+    period = 1.0 / args.rate
+    t0 = time.perf_counter()
+    k = 0
+    try:
+        while time.perf_counter() - t0 < args.seconds:
+            s = int(100 * np.sin(k * 0.05))
+            link.write(encoder.encode(f"VEL:{s},0,{-s // 2},{s // 3}"))
+            k += 1
+            delay = t0 + k * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.perf_counter() - t0
+        print(f"sent {k} messages in {elapsed:.2f} s ({k / elapsed:.1f}/s)")
+        print(link.report())
+        link.close()
+
+
+if __name__ == "__main__":
+    main()
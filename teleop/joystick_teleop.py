@@ -1,24 +1,211 @@
+"""Joystick/gamepad teleop → ESP32 (serial, pty, emulator or the sims over UDP).
+
+Usage:
+  python joystick_teleop.py --port COM3 --mode VEL                  # fixed 15 Hz polling (original)
+  python joystick_teleop.py --port COM3 --event [--min_interval_ms 10] [--keepalive_ms 200] [--expo 0.3,0,0,0.5]
+
+--event wakes on JOYAXISMOTION/button events instead of polling: a significant
+change (--threshold, or an axis returning to 0) is written at once, at most
+every --min_interval_ms; while the sticks are still the last command is
+repeated every --keepalive_ms to hold off the firmware's 800 ms failsafe.
+
+Both loops record input-to-write latency: from the moment a significant change
+is seen (event pickup, or the poll that saw it) until its write returns.
+The stats are printed with the link report at exit (and every --stats s).
+"""
 import argparse
+import os
+import sys
 import time
-import serial
+from collections import deque
+
+import numpy as np
 import pygame
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sim"))
+from command_protocol import CommandEncoder, add_protocol_args  # noqa: E402
+from transport import open_transport  # noqa: E402
+
 
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
 
+def expo(v, k):
+    """RC-style expo curve: (1 - k)·v + k·v³; same endpoints, finer control around centre for k > 0."""
+    return (1.0 - k) * v + k * v * v * v
+
+
+def parse_expo(text):
+    vals = [float(v) for v in text.split(",")]
+    if len(vals) == 1:
+        vals *= 4
+    if len(vals) != 4 or not all(0.0 <= v <= 1.0 for v in vals):
+        raise argparse.ArgumentTypeError("--expo takes one value or four (surge,sway,heave,yaw), each 0..1")
+    return vals
+
+
+def read_command(js, args):
+    """(line, values) for the current stick positions; `values` is what change detection compares."""
+    # Typical gamepad: left stick (axes 0,1), right stick (axes 2,3), triggers vary
+    ax0 = js.get_axis(0)  # left X (sway/yaw)
+    ax1 = js.get_axis(1)  # left Y (surge)
+    ax2 = js.get_axis(2)  # right X (yaw)
+    ax3 = js.get_axis(3)  # right Y (heave)
+
+    def dz(v):
+        return 0.0 if abs(v) < args.dead else v
+
+    ax0, ax1, ax2, ax3 = dz(ax0), dz(ax1), dz(ax2), dz(ax3)
+
+    if args.mode == "CMD":
+        # Map to discrete commands
+        cmd = 'S'
+        spd = int(60 * args.scale)
+        if ax1 < -args.dead:
+            cmd = 'F'
+        elif ax0 < -args.dead:
+            cmd = 'L'
+        elif ax0 > args.dead:
+            cmd = 'R'
+        return f"CMD:{cmd};SPEED:{spd}", (cmd,)
+
+    # VEL: surge,sway,heave,yaw in -100..100
+    e = args.expo
+    surge = int(clamp(expo(-ax1, e[0]) * 100 * args.scale, -100, 100))
+    sway  = int(clamp(expo(ax0, e[1]) * 100 * args.scale, -100, 100))
+    heave = int(clamp(expo(-ax3, e[2]) * 100 * args.scale, -100, 100))
+    yaw   = int(clamp(expo(ax2, e[3]) * 100 * args.scale, -100, 100))
+    return f"VEL:{surge},{sway},{heave},{yaw}", (surge, sway, heave, yaw)
+
+
+def significant(new, old, threshold):
+    """True if `new` differs enough from the last written values to send now."""
+    if old is None:
+        return True
+    for a, b in zip(new, old):
+        # CMD letters always count; an axis coming back to 0 counts so stops are never held back
+        if a != b and (isinstance(a, str) or abs(a - b) >= threshold or a == 0):
+            return True
+    return False
+
+
+class Sender:
+    """Writes command lines and times each significant change from first seen to written."""
+
+    def __init__(self, link, encoder, threshold=2):
+        self.link = link
+        self.encoder = encoder
+        self.threshold = threshold
+        self.last = None  # values last written
+        self.last_send = 0.0
+        self.pending_since = None  # when a not yet written significant change was first seen
+        self.latency = deque(maxlen=10000)  # s, change seen -> write returned
+        self.changes = 0
+        self.keepalives = 0
+        self.t_start = time.monotonic()
+
+    def observe(self, values, now):
+        if self.pending_since is None and significant(values, self.last, self.threshold):
+            self.pending_since = now
+
+    def write(self, line, values, now):
+        self.link.write(self.encoder.encode(line))
+        if self.pending_since is not None:
+            self.latency.append(time.monotonic() - self.pending_since)
+            self.pending_since = None
+            self.changes += 1
+        else:
+            self.keepalives += 1
+        self.last = values
+        self.last_send = now
+
+    def report(self):
+        el = max(time.monotonic() - self.t_start, 1e-9)
+        sent = self.changes + self.keepalives
+        if not self.latency:
+            return f"teleop: {sent} writes ({sent / el:.1f}/s), no changes"
+        lat = np.array(self.latency) * 1000.0
+        return (f"teleop: {sent} writes ({sent / el:.1f}/s)  changes {self.changes}  keepalives {self.keepalives}  "
+                f"input->write p50 {np.percentile(lat, 50):.2f} p99 {np.percentile(lat, 99):.2f} "
+                f"max {lat.max():.2f} ms")
+
+
+def run_poll(js, sender, args):
+    last_send = 0
+    send_hz = 15.0
+    next_stats = time.monotonic() + args.stats if args.stats > 0 else None
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+
+        line, values = read_command(js, args)
+        now = time.monotonic()
+        sender.observe(values, now)
+        if now - last_send > 1.0 / send_hz:
+            sender.write(line, values, now)
+            last_send = now
+
+        if next_stats is not None and now >= next_stats:
+            print(sender.report(), flush=True)
+            next_stats += args.stats
+        time.sleep(0.005)
+
+
+def run_event(js, sender, args):
+    min_interval = args.min_interval_ms / 1000.0
+    keepalive = args.keepalive_ms / 1000.0
+    next_stats = time.monotonic() + args.stats if args.stats > 0 else None
+
+    while True:
+        now = time.monotonic()
+        if sender.pending_since is not None:
+            due = sender.last_send + min_interval  # a change is waiting out the minimum spacing
+        else:
+            due = sender.last_send + keepalive
+        if next_stats is not None:
+            due = min(due, next_stats)
+        # pygame treats a 0 ms timeout as "wait forever"
+        events = [pygame.event.wait(max(1, int((due - now) * 1000.0)))]
+        events += pygame.event.get()  # coalesce a burst of axis events into one read
+        if any(e.type == pygame.QUIT for e in events):
+            return
+
+        now = time.monotonic()
+        line, values = read_command(js, args)
+        sender.observe(values, now)
+        since = now - sender.last_send
+        if (sender.pending_since is not None and since >= min_interval) or since >= keepalive:
+            sender.write(line, values, now)
+
+        if next_stats is not None and now >= next_stats:
+            print(sender.report(), flush=True)
+            next_stats += args.stats
+
+
 def main():
     p = argparse.ArgumentParser(description="AKINTAY joystick teleop → ESP32 serial")
-    p.add_argument("--port", default="COM3")
+    p.add_argument("--port", default="COM3", help="COM3, /dev/ttyUSB0, udp:HOST:PORT, pty:PATH, emu or none")
     p.add_argument("--baud", type=int, default=115200)
     p.add_argument("--mode", choices=["CMD", "VEL"], default="VEL")
     p.add_argument("--dead", type=float, default=0.15, help="Axis deadzone (0..1)")
     p.add_argument("--scale", type=float, default=1.0, help="Overall scale multiplier")
+    p.add_argument("--expo", type=parse_expo, default=[0.0] * 4,
+                   help="VEL expo curve per axis: one value or surge,sway,heave,yaw (0 = linear .. 1 = cubic)")
+    p.add_argument("--event", action="store_true", help="Send on stick events instead of polling at 15 Hz")
+    p.add_argument("--threshold", type=int, default=2, help="VEL change (of -100..100) that is sent right away")
+    p.add_argument("--min_interval_ms", type=float, default=10.0, help="--event: minimum spacing between writes")
+    p.add_argument("--keepalive_ms", type=float, default=200.0,
+                   help="--event: repeat the last command this often while idle (keep below the 800 ms failsafe)")
+    p.add_argument("--stats", type=float, default=0.0, help="Print send/latency stats every N seconds (0 = only at exit)")
+    add_protocol_args(p)
     args = p.parse_args()
 
-    ser = serial.Serial(args.port, args.baud, timeout=0.01)
+    ser = open_transport(args.port, args.baud, timeout=0.01)
     time.sleep(1.0)
+    sender = Sender(ser, CommandEncoder(args.protocol), args.threshold)
 
     pygame.init()
     pygame.joystick.init()
@@ -29,57 +216,19 @@ def main():
     js.init()
     print(f"Using joystick: {js.get_name()}")
 
-    last_send = 0
-    send_hz = 15.0
-
     try:
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    return
-
-            # Typical gamepad: left stick (axes 0,1), right stick (axes 2,3), triggers vary
-            ax0 = js.get_axis(0)  # left X (sway/yaw)
-            ax1 = js.get_axis(1)  # left Y (surge)
-            ax2 = js.get_axis(2)  # right X (yaw)
-            ax3 = js.get_axis(3)  # right Y (heave)
-
-            def dz(v):
-                return 0.0 if abs(v) < args.dead else v
-
-            ax0, ax1, ax2, ax3 = dz(ax0), dz(ax1), dz(ax2), dz(ax3)
-
-            now = time.time()
-            if now - last_send > 1.0 / send_hz:
-                if args.mode == "CMD":
-                    # Map to discrete commands
-                    cmd = 'S'
-                    spd = int(60 * args.scale)
-                    if ax1 < -args.dead:
-                        cmd = 'F'
-                    elif ax0 < -args.dead:
-                        cmd = 'L'
-                    elif ax0 > args.dead:
-                        cmd = 'R'
-                    ser.write(f"CMD:{cmd};SPEED:{spd}\n".encode("ascii"))
-                else:
-                    # VEL: surge,sway,heave,yaw in -100..100
-                    surge = int(clamp(-ax1 * 100 * args.scale, -100, 100))
-                    sway  = int(clamp(ax0 * 100 * args.scale, -100, 100))
-                    heave = int(clamp(-ax3 * 100 * args.scale, -100, 100))
-                    yaw   = int(clamp(ax2 * 100 * args.scale, -100, 100))
-                    ser.write(f"VEL:{surge},{sway},{heave},{yaw}\n".encode("ascii"))
-
-                last_send = now
-
-            time.sleep(0.005)
-
+        if args.event:
+            run_event(js, sender, args)
+        else:
+            run_poll(js, sender, args)
+    except KeyboardInterrupt:
+        pass
     finally:
+        print(sender.report())
+        print(ser.report())
         ser.close()
         pygame.quit()
 
 
 if __name__ == "__main__":
     main()
-
-